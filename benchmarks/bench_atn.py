@@ -0,0 +1,105 @@
+# Copyright (c) 2025 Renata Hodovan, Akos Kiss.
+#
+# Licensed under the BSD 3-Clause License
+# <LICENSE.rst or https://opensource.org/licenses/BSD-3-Clause>.
+# This file may not be copied, modified, or distributed except
+# according to those terms.
+
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+from setuptools.dist import Distribution
+
+pytest.importorskip('pytest_benchmark')
+pytest.importorskip('antlr4')
+
+from antlr4.atn.ATNDeserializer import ATNDeserializer  # noqa: E402  pylint: disable=wrong-import-position
+from antlr4.xpath import XPathLexer  # noqa: E402  pylint: disable=wrong-import-position
+
+from antlerinator import resolve_antlr_jar  # noqa: E402  pylint: disable=wrong-import-position
+from antlerinator.atn import load_atn, precompute_atn  # noqa: E402  pylint: disable=wrong-import-position
+
+
+rule_count = int(os.environ.get('ANTLERINATOR_BENCH_RULES', '500'))
+tested_antlr_version = '4.13.2'
+
+
+def xpath_lexer(path, precomputed):
+    """
+    Copy the lexer module generated by the ANTLR v4 tool that is shipped with
+    the antlr4 runtime.
+
+    :return: The statement that tokenizes an input with the lexer.
+    """
+    shutil.copyfile(XPathLexer.__file__, path / 'XPathLexer.py')
+    if precomputed:
+        precompute_atn(str(path / 'XPathLexer.py'))
+    return 'from XPathLexer import XPathLexer; XPathLexer(InputStream("//a/b/*[@x]")).getAllTokens()'
+
+
+def generated_parser(path, precomputed):
+    """
+    Generate the lexer and parser of a large synthetic grammar with the real
+    ANTLR tool (with ``build_antlr``).
+
+    :return: The statement that parses an input with the parser.
+    """
+    if not shutil.which('java'):
+        pytest.skip('no java to run the ANTLR tool')
+    try:
+        jar = resolve_antlr_jar(tested_antlr_version)
+    except OSError as e:
+        pytest.skip(f'cannot resolve the ANTLR tool jar ({e})')
+
+    rules = '\n'.join(f'r{i}: \'k{i}\' (r{i + 1} | ID \'(\' r{i + 1}* \')\')?;' for i in range(rule_count))
+    (path / 'G.g4').write_text(f'grammar G;\nstart: r0 EOF;\n{rules}\nr{rule_count}: ID;\nID: [a-z]+;\nWS: [ \\t\\n]+ -> skip;\n')
+    cwd = os.getcwd()
+    os.chdir(path)
+    try:
+        dist = Distribution({
+            'name': 'pkg',
+            'packages': [],
+            'script_name': 'setup.py',
+            'script_args': ['build_antlr'] + (['--atn-cache'] if precomputed else []),
+            'options': {'build_antlr': {'commands': f'file:{jar} -Dlanguage=Python3 G.g4'}},
+        })
+        dist.parse_command_line()
+        dist.run_commands()
+    finally:
+        os.chdir(cwd)
+    return ('from GLexer import GLexer; from GParser import GParser; '
+            'GParser(CommonTokenStream(GLexer(InputStream("k0 k1 x ( k2 ) k3")))).start()')
+
+
+@pytest.mark.parametrize('precomputed', [False, True], ids=['deserialized', 'precomputed'])
+@pytest.mark.parametrize('grammar', [xpath_lexer, generated_parser], ids=['xpath', 'generated'])
+def bench_import_to_first_parse(benchmark, tmp_path, grammar, precomputed):
+    """
+    Time from the start of a fresh interpreter to the first parse with a
+    generated lexer/parser, with the ATNs deserialized on import or
+    precomputed by ``build_antlr --atn-cache``.
+    """
+    stmt = grammar(tmp_path, precomputed)
+    cmd = [sys.executable, '-c', f'import sys; sys.path.insert(0, {str(tmp_path)!r}); from antlr4 import *; {stmt}']
+    subprocess.run(cmd, check=True)  # warm up bytecode caches
+    benchmark.pedantic(subprocess.run, args=(cmd,), kwargs={'check': True}, rounds=20)
+
+
+@pytest.mark.parametrize('precomputed', [False, True], ids=['deserialized', 'precomputed'])
+def bench_load_atn(benchmark, tmp_path, precomputed):
+    """
+    Time of getting the ATN of a generated lexer in-process.
+    """
+    xpath_lexer(tmp_path, precomputed)
+    if not precomputed:
+        benchmark(lambda: ATNDeserializer().deserialize(XPathLexer.serializedATN()))
+        return
+
+    path = str(tmp_path / 'XPathLexer.py')
+    with open(path) as f:
+        atn_hash = f.read().split("serializedATN, '", 1)[1].split("'", 1)[0]
+    benchmark(load_atn, path, XPathLexer.serializedATN, atn_hash)
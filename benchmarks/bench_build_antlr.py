@@ -0,0 +1,125 @@
+# Copyright (c) 2025 Renata Hodovan, Akos Kiss.
+#
+# Licensed under the BSD 3-Clause License
+# <LICENSE.rst or https://opensource.org/licenses/BSD-3-Clause>.
+# This file may not be copied, modified, or distributed except
+# according to those terms.
+
+import os
+import shutil
+
+import pytest
+
+from setuptools.dist import Distribution
+
+import antlerinator
+
+from antlerinator.build_antlr import build_antlr
+
+pytest.importorskip('pytest_benchmark')
+
+
+grammar_count = int(os.environ.get('ANTLERINATOR_BENCH_GRAMMARS', '50'))
+tested_antlr_version = '4.13.2'
+
+
+def write_grammars(path, count):
+    """
+    Write a synthetic set of combined grammars.
+    """
+    for i in range(count):
+        rules = '\n'.join(f'r{j}: \'k{i}_{j}\' r{j + 1}?;' for j in range(20))
+        (path / f'G{i}.g4').write_text(f'grammar G{i};\nstart: r0 EOF;\n{rules}\nr20: ID;\nID: [a-z]+;\nWS: [ \\t\\n]+ -> skip;\n')
+
+
+def make_dist(commands, java, args):
+    dist = Distribution({
+        'name': 'pkg',
+        'packages': [],
+        'script_name': 'setup.py',
+        'script_args': ['build_antlr', *args],
+        'options': {
+            'build_antlr': {
+                'commands': commands,
+                'java': java,
+            },
+        },
+    })
+    dist.parse_command_line()
+    return dist
+
+
+def bench_finalize_options(benchmark):
+    """
+    Time of parsing and validating hundreds of command strings.
+    """
+    commands = '\n'.join(f'antlerinator:{tested_antlr_version} grammars/G{i}.g4 -Dlanguage=Python3 -o pkg/parser{i} -Xexact-output-dir -visitor'
+                         for i in range(500))
+    dist = make_dist(commands, 'java', [])
+
+    def finalize():
+        cmd = build_antlr(dist)
+        for name, (_, value) in dist.get_option_dict('build_antlr').items():
+            setattr(cmd, name, value)
+        cmd.ensure_finalized()
+
+    benchmark(finalize)
+
+
+build_modes = {
+    # one tool run per grammar, all writing to the same directory
+    'sequential': ('-o gen', ['--jobs=1', '--no-batch', '--force']),
+    # one tool run per grammar, writing to separate directories
+    'parallel': ('-o gen{i}', ['--no-batch', '--force']),
+    # a single tool run for all grammars
+    'batch': ('-o gen', ['--force']),
+    # all outputs are up to date
+    'up-to-date': ('-o gen', []),
+}
+
+
+def setup_build(path, jar, java, mode, count):
+    """
+    Write the grammars of a benchmark and do an initial build.
+
+    :return: A function that re-runs the build in the selected mode.
+    """
+    output, args = build_modes[mode]
+    write_grammars(path, count)
+    commands = '\n'.join(f'file:{jar} G{i}.g4 {output.format(i=i)}' for i in range(count))
+
+    def build(args):
+        cwd = os.getcwd()
+        os.chdir(path)
+        try:
+            make_dist(commands, java, args).run_commands()
+        finally:
+            os.chdir(cwd)
+
+    build([])
+    return lambda: build(args)
+
+
+@pytest.mark.parametrize('mode', list(build_modes))
+def bench_build_antlr_mock(benchmark, tmp_path, mock_java, mode):
+    """
+    End-to-end ``build_antlr`` over a synthetic set of grammars with the mock
+    ANTLR tool (measuring the overhead of ``build_antlr`` itself and of process
+    spawning).
+    """
+    benchmark.pedantic(setup_build(tmp_path, 'antlr.jar', mock_java, mode, grammar_count), rounds=5)
+
+
+@pytest.mark.parametrize('mode', list(build_modes))
+def bench_build_antlr_java(benchmark, tmp_path, mode):
+    """
+    End-to-end ``build_antlr`` over a synthetic set of grammars with the real
+    ANTLR tool.
+    """
+    if not shutil.which('java'):
+        pytest.skip('java unavailable')
+    try:
+        jar = antlerinator.download(tested_antlr_version, lazy=True)
+    except OSError as e:
+        pytest.skip(f'ANTLR tool jar unavailable ({e})')
+    benchmark.pedantic(setup_build(tmp_path, jar, 'java', mode, min(grammar_count, 10)), rounds=3)
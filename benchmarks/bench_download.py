@@ -0,0 +1,41 @@
+# Copyright (c) 2025 Renata Hodovan, Akos Kiss.
+#
+# Licensed under the BSD 3-Clause License
+# <LICENSE.rst or https://opensource.org/licenses/BSD-3-Clause>.
+# This file may not be copied, modified, or distributed except
+# according to those terms.
+
+import os
+
+import pytest
+
+import antlerinator
+
+pytest.importorskip('pytest_benchmark')
+
+
+def bench_download_lazy(benchmark, jar_server, tmp_path):
+    """
+    Latency of ``download(lazy=True)`` when the jar is already available (the
+    hot path of every ``antlerinator:`` provider resolution).
+    """
+    path = str(tmp_path / 'antlr.jar')
+    antlerinator.download('4.0-bench', path, mirrors=[jar_server.url], offline=False)
+    benchmark(antlerinator.download, '4.0-bench', path, lazy=True, mirrors=[jar_server.url], offline=False)
+
+
+def bench_download_cold(benchmark, jar_server, tmp_path):
+    """
+    Throughput of downloading (and verifying) a jar from a local HTTP server.
+    """
+    path = str(tmp_path / 'antlr.jar')
+
+    def setup():
+        for f in (path, f'{path}.sha256'):
+            if os.path.exists(f):
+                os.remove(f)
+
+    benchmark.pedantic(antlerinator.download, args=('4.0-bench', path), kwargs={'mirrors': [jar_server.url], 'offline': False},
+                       setup=setup, rounds=10)
+    if benchmark.stats:  # None with --benchmark-disable
+        benchmark.extra_info['MB/s'] = os.path.getsize(path) / benchmark.stats.stats.mean / 1e6
@@ -0,0 +1,45 @@
+# Copyright (c) 2025 Renata Hodovan, Akos Kiss.
+#
+# Licensed under the BSD 3-Clause License
+# <LICENSE.rst or https://opensource.org/licenses/BSD-3-Clause>.
+# This file may not be copied, modified, or distributed except
+# according to those terms.
+
+import pytest
+
+from antlerinator.grammar import GrammarGraph, scan_grammar
+
+pytest.importorskip('pytest_benchmark')
+
+
+@pytest.mark.parametrize('rules', [10, 100_000])
+def bench_scan_grammar(benchmark, tmp_path, rules):
+    """
+    Time of scanning the header of a small and of a huge grammar (which should
+    be about the same).
+    """
+    path = tmp_path / 'G.g4'
+    header = 'parser grammar G;\noptions { tokenVocab = L; }\nimport A, B;\n@header { import sys }\n'
+    path.write_text(header + ''.join(f'r{i}: \'k{i}\' r{i + 1}?;\n' for i in range(rules)))
+    benchmark(scan_grammar, str(path))
+
+
+def bench_grammar_graph(benchmark, tmp_path):
+    """
+    Time of building the dependency graph of a chain of lexer/parser pairs
+    (each parser importing the previous one) and ordering it topologically.
+    """
+    count = 200
+    for i in range(count):
+        (tmp_path / f'L{i}.g4').write_text(f'lexer grammar L{i};\nA: \'a\';\n')
+        imports = f'import P{i - 1};\n' if i else ''
+        (tmp_path / f'P{i}.g4').write_text(f'parser grammar P{i};\noptions {{ tokenVocab = L{i}; }}\n{imports}p{i}: A;\n')
+
+    def build():
+        graph = GrammarGraph()
+        for i in reversed(range(count)):
+            graph.add(str(tmp_path / f'P{i}.g4'))
+            graph.add(str(tmp_path / f'L{i}.g4'))
+        return graph.topological_order()
+
+    benchmark(build)
@@ -0,0 +1,28 @@
+# Copyright (c) 2025 Renata Hodovan, Akos Kiss.
+#
+# Licensed under the BSD 3-Clause License
+# <LICENSE.rst or https://opensource.org/licenses/BSD-3-Clause>.
+# This file may not be copied, modified, or distributed except
+# according to those terms.
+
+import subprocess
+import sys
+
+import pytest
+
+pytest.importorskip('pytest_benchmark')
+
+
+@pytest.mark.parametrize('stmt', [
+    'pass',
+    'import antlerinator',
+    'import setuptools',
+    'import setuptools; import antlerinator.build_antlr',
+], ids=['interpreter', 'antlerinator', 'setuptools', 'setuptools-hook'])
+def bench_import(benchmark, stmt):
+    """
+    Start-up time of a fresh interpreter importing antlerinator (compared to
+    the bare interpreter and to setuptools alone).
+    """
+    subprocess.run([sys.executable, '-c', stmt], check=True)  # warm up bytecode caches
+    benchmark.pedantic(subprocess.run, args=([sys.executable, '-c', stmt],), kwargs={'check': True}, rounds=20)
@@ -0,0 +1,37 @@
+# Copyright (c) 2025 Renata Hodovan, Akos Kiss.
+#
+# Licensed under the BSD 3-Clause License
+# <LICENSE.rst or https://opensource.org/licenses/BSD-3-Clause>.
+# This file may not be copied, modified, or distributed except
+# according to those terms.
+
+import sys
+
+from os.path import abspath, dirname, join
+
+import pytest
+
+# the stand-ins of the download site and of the java VM are shared with the
+# tests
+sys.path.insert(0, join(dirname(dirname(abspath(__file__))), 'tests'))
+
+from fake_antlr import JarServer, mock_antlr_java  # noqa: E402 pylint: disable=wrong-import-position
+
+
+@pytest.fixture(scope='session')
+def jar_server():
+    """
+    Local stand-in of the ANTLR download site serving fake tool jars of 8 MB.
+    """
+    server = JarServer(jar_size=8 * 1024 * 1024).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def mock_java(tmp_path):
+    """
+    Script that acts as the java VM but runs the mock ANTLR tool of the tests
+    with the current Python interpreter.
+    """
+    return mock_antlr_java(tmp_path)
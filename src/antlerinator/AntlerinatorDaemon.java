@@ -0,0 +1,101 @@
+/*
+ * Copyright (c) 2025 Renata Hodovan, Akos Kiss.
+ *
+ * Licensed under the BSD 3-Clause License
+ * <LICENSE.rst or https://opensource.org/licenses/BSD-3-Clause>.
+ * This file may not be copied, modified, or distributed except
+ * according to those terms.
+ */
+
+import java.io.BufferedReader;
+import java.io.ByteArrayOutputStream;
+import java.io.IOException;
+import java.io.InputStreamReader;
+import java.io.OutputStream;
+import java.io.PrintStream;
+import java.net.InetAddress;
+import java.net.ServerSocket;
+import java.net.Socket;
+import java.net.SocketTimeoutException;
+import java.nio.charset.StandardCharsets;
+
+import org.antlr.v4.Tool;
+
+/**
+ * Resident driver of the ANTLR v4 tool.
+ *
+ * Usage: java -cp antlr-complete.jar AntlerinatorDaemon.java IDLE_TIMEOUT
+ *
+ * Reads an authentication token from the first line of stdin, listens on a
+ * loopback port, and prints the port number to stdout. Every connection sends
+ * the token, the number of tool arguments, and the arguments, each on its own
+ * line. The daemon runs the tool with the arguments and responds with the exit
+ * status on the first line, followed by the diagnostics of the tool. The daemon
+ * exits if no connection arrives for IDLE_TIMEOUT seconds.
+ */
+public class AntlerinatorDaemon {
+
+    public static void main(String[] args) throws IOException {
+        int idleTimeout = Integer.parseInt(args[0]);
+        String token = new BufferedReader(new InputStreamReader(System.in, StandardCharsets.UTF_8)).readLine();
+
+        try (ServerSocket server = new ServerSocket(0, 50, InetAddress.getLoopbackAddress())) {
+            server.setSoTimeout(idleTimeout * 1000);
+            System.out.println(server.getLocalPort());
+            System.out.flush();
+
+            while (true) {
+                Socket socket;
+                try {
+                    socket = server.accept();
+                } catch (SocketTimeoutException e) {
+                    break;
+                }
+                try (Socket s = socket) {
+                    serve(s, token);
+                } catch (IOException | RuntimeException e) {
+                    // a broken connection must not bring the daemon down
+                }
+            }
+        }
+    }
+
+    private static void serve(Socket socket, String token) throws IOException {
+        BufferedReader in = new BufferedReader(new InputStreamReader(socket.getInputStream(), StandardCharsets.UTF_8));
+        if (token == null || !token.equals(in.readLine())) {
+            return;
+        }
+        String[] toolArgs = new String[Integer.parseInt(in.readLine())];
+        for (int i = 0; i < toolArgs.length; i++) {
+            toolArgs[i] = in.readLine();
+        }
+
+        ByteArrayOutputStream buffer = new ByteArrayOutputStream();
+        PrintStream capture = new PrintStream(buffer, true, "UTF-8");
+        PrintStream out = System.out;
+        PrintStream err = System.err;
+        int status;
+        System.setOut(capture);
+        System.setErr(capture);
+        try {
+            Tool tool = new Tool(toolArgs);
+            if (toolArgs.length == 0) {
+                tool.help();
+            } else {
+                tool.processGrammarsOnCommandLine();
+            }
+            status = tool.getNumErrors() > 0 ? 1 : 0;
+        } catch (Throwable t) {
+            t.printStackTrace(capture);
+            status = 1;
+        } finally {
+            System.setOut(out);
+            System.setErr(err);
+        }
+
+        OutputStream response = socket.getOutputStream();
+        response.write((status + "\n").getBytes(StandardCharsets.UTF_8));
+        buffer.writeTo(response);
+        response.flush();
+    }
+}
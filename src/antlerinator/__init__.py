@@ -5,5 +5,44 @@
 # This file may not be copied, modified, or distributed except
 # according to those terms.
 
-from .arg import add_antlr_argument, process_antlr_argument
-from .download import __antlr_version__, __version__, default_antlr_jar_path, download
+# NOTE: This package is imported whenever setuptools loads the build_antlr
+#   extension, so importing it must stay cheap. The CLI argument helpers and
+#   the version attributes are resolved lazily on first access.
+
+from .download import default_antlr_jar_path, download, download_all, download_async, invalidate_resolved_antlr_jars, resolve_antlr_jar
+
+# pylint: disable=undefined-all-variable
+__all__ = [
+    '__antlr_version__',
+    '__version__',
+    'add_antlr_argument',
+    'default_antlr_jar_path',
+    'download',
+    'download_all',
+    'download_async',
+    'invalidate_resolved_antlr_jars',
+    'process_antlr_argument',
+    'resolve_antlr_jar',
+]
+# pylint: enable=undefined-all-variable
+
+_lazy_attributes = {
+    '__antlr_version__': '.download',
+    '__version__': '.download',
+    'add_antlr_argument': '.arg',
+    'process_antlr_argument': '.arg',
+}
+
+
+def __getattr__(name):
+    if name not in _lazy_attributes:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    from importlib import import_module  # pylint: disable=import-outside-toplevel
+    value = getattr(import_module(_lazy_attributes[name], __name__), name)
+    if not name.startswith('__'):
+        globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
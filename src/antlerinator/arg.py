@@ -5,9 +5,9 @@
 # This file may not be copied, modified, or distributed except
 # according to those terms.
 
-from inators.arg import add_argument
+import threading
 
-from .download import __antlr_version__, default_antlr_jar_path, download
+from .download import _antlr_version, _validate_jar, default_antlr_jar_path, resolve_antlr_jar
 
 
 def add_antlr_argument(
@@ -16,7 +16,7 @@ def add_antlr_argument(
         long_alias=(),
         *,
         metavar='FILE',
-        help=f'path of the ANTLR v4 tool jar file (default: {default_antlr_jar_path(__antlr_version__ or "VERSION")})'
+        help=None
 ):
     """
     add_antlr_argument(parser, short_alias=(), long_alias=(), *, metavar='FILE', help='path of the ANTLR v4 tool jar file (default:  ~/.antlerinator/antlr-VERSION-complete.jar)')
@@ -38,25 +38,78 @@ def add_antlr_argument(
     """
     # NOTE: The first line of the docstring (i.e., the documented signature)
     #   must be kept in sync with the actual signature of the function!
+    #   (The default of help is None in the code only to defer the lookup of
+    #   the runtime version until the function is called.)
+    from inators.arg import add_argument  # pylint: disable=import-outside-toplevel
+
+    if help is None:
+        help = f'path of the ANTLR v4 tool jar file (default: {default_antlr_jar_path(_antlr_version() or "VERSION")})'
 
     add_argument(parser, short_alias, '--antlr', long_alias,
                  metavar=metavar, default=None, help=help)
 
 
-def process_antlr_argument(args):
+def _in_background(func, *args, **kwargs):
+    """
+    Call a function in a (daemon) worker thread.
+
+    :return: The future of the result of the call.
+    :rtype: ~concurrent.futures.Future
+    """
+    from concurrent.futures import Future  # pylint: disable=import-outside-toplevel
+
+    future = Future()
+
+    def run():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(func(*args, **kwargs))
+        except BaseException as e:  # pylint: disable=broad-exception-caught
+            future.set_exception(e)
+
+    threading.Thread(target=run, name='antlerinator-resolve', daemon=True).start()
+    return future
+
+
+def process_antlr_argument(args, *, validate=False, background=False):
     """
     Lazily download the ANTLR v4 tool jar to the default path if ``--antlr`` was
     *not* given on the command line. I.e., download and copy the jar to the
     default path if it is not already there (using
-    :func:`antlerinator.download`). Also set ``args.antlr`` to the path to the
-    jar. No-op if ``--antlr`` was specified on the command line.
+    :func:`antlerinator.resolve_antlr_jar`, thus the ``ANTLERINATOR_JAR``
+    environment variable can point to the jar, and repeated calls in a process
+    are cheap). Also set ``args.antlr`` to the path to the jar. No-op if
+    ``--antlr`` was specified on the command line (unless ``validate`` is
+    ``True``).
 
     This implements the default processing of the ``--antlr`` command-line
     argument added by :func:`add_antlr_argument`.
 
     :param args: A namespace object populated by
         :meth:`argparse.ArgumentParser.parse_args`.
+    :param bool validate: Check that the version of the jar matches the
+        version of the installed antlr4 runtime (and raise :exc:`ValueError`
+        if not).
+    :param bool background: Resolve (and download) the jar in a worker thread
+        and return immediately. ``args.antlr`` is set when the jar is
+        resolved.
+    :return: If ``background`` is ``True``, the future of the path to the jar
+        (to be waited for with :meth:`~concurrent.futures.Future.result`, or
+        awaited in asyncio code after wrapping with
+        :func:`asyncio.wrap_future`). Errors of the resolution are raised when
+        the result is requested.
+    :rtype: ~concurrent.futures.Future
     """
 
-    if not args.antlr:
-        args.antlr = download(lazy=True)
+    def process():
+        if not args.antlr:
+            args.antlr = resolve_antlr_jar(validate=validate)
+        elif validate:
+            _validate_jar(args.antlr)
+        return args.antlr
+
+    if background:
+        return _in_background(process)
+    process()
+    return None
@@ -0,0 +1,215 @@
+# Copyright (c) 2025 Renata Hodovan, Akos Kiss.
+#
+# Licensed under the BSD 3-Clause License
+# <LICENSE.rst or https://opensource.org/licenses/BSD-3-Clause>.
+# This file may not be copied, modified, or distributed except
+# according to those terms.
+
+# NOTE: load_atn is called by generated lexers/parsers on import, so this
+#   module must stay cheap to import. The build-time functions import what
+#   they need lazily.
+
+import copyreg
+import functools
+import os
+import pickle
+import sys
+
+from os.path import basename, dirname, splitext
+
+
+_format = 'antlerinator-atn/1'
+
+# the line of generated Python lexers/parsers that deserializes the ATN, and
+# the import line after which the loader is injected
+_deserialize_pattern = r'^(?P<assign>[ \t]+atn[ \t]*=[ \t]*)ATNDeserializer\(\)\.deserialize\(serializedATN\(\)\)(?=[ \t]*\r?$)'
+_import_pattern = r'^from antlr4 import \*[ \t]*\r?\n'
+
+_loader = '''\
+try:
+    from antlerinator.atn import load_atn as _load_atn
+except ImportError:
+    def _load_atn(path, serialized_atn, atn_hash):
+        return ATNDeserializer().deserialize(serialized_atn())
+'''
+
+
+def atn_path(module_path):
+    """
+    Get the path of the precomputed ATN of a generated lexer/parser module.
+    """
+    return splitext(module_path)[0] + '.atn'
+
+
+@functools.lru_cache(maxsize=None)
+def _runtime_version():
+    """
+    Get the version of the installed antlr4 runtime. The metadata of the
+    distribution is looked up next to the ``antlr4`` package first, as
+    :mod:`importlib.metadata` would scan all of ``sys.path`` (which can take
+    longer than deserializing a small ATN).
+    """
+    import antlr4  # pylint: disable=import-outside-toplevel
+
+    site_dir = dirname(dirname(antlr4.__file__))
+    prefix = 'antlr4_python3_runtime-'
+    try:
+        for name in os.listdir(site_dir):
+            if name.startswith(prefix) and name.endswith(('.dist-info', '.egg-info')):
+                return splitext(name)[0][len(prefix):]
+    except OSError:
+        pass
+
+    from importlib import metadata  # pylint: disable=import-outside-toplevel
+    try:
+        return metadata.version('antlr4-python3-runtime')
+    except metadata.PackageNotFoundError:
+        return None
+
+
+def _identity(obj):
+    return obj
+
+
+@functools.lru_cache(maxsize=None)
+def _slots(cls):
+    names = []
+    for c in reversed(cls.__mro__):
+        slots = c.__dict__.get('__slots__', ())
+        names.extend([slots] if isinstance(slots, str) else slots)
+    return names
+
+
+class _Fill:
+    """
+    Marker of the attributes of an ATN state in the pickled stream.
+    """
+
+    __slots__ = ('state',)
+
+    def __init__(self, state):
+        self.state = state
+
+
+class _ATNPickler(pickle.Pickler):
+    """
+    Pickler of ATNs that keeps the recursion shallow. The states of an ATN
+    reference each other via their transitions, so pickling the first state
+    naively would recurse along the longest path of the ATN. Instead, all
+    states are pickled as empty objects first, and their attributes are
+    filled in afterwards (when all states they can reference are pickled
+    already).
+    """
+
+    def __init__(self, file, states):
+        super().__init__(file, pickle.HIGHEST_PROTOCOL)
+        self._states = {id(s) for s in states if s is not None}
+
+    def reducer_override(self, obj):
+        if isinstance(obj, _Fill):
+            state = obj.state
+            return _identity, (state,), (None, {name: getattr(state, name) for name in _slots(type(state)) if hasattr(state, name)})
+        if id(obj) in self._states:
+            return copyreg.__newobj__, (type(obj),)
+        return NotImplemented
+
+
+def dump_atn(atn, path, atn_hash):
+    """
+    Write a deserialized ATN to a file (atomically), keyed by the hash of its
+    serialized form and by the version of the antlr4 runtime.
+
+    :param atn: The ATN to write.
+    :param str path: Path of the file.
+    :param str atn_hash: Hash of the serialized ATN.
+    """
+    tmp = f'{path}.{os.getpid()}.tmp'
+    try:
+        with open(tmp, 'wb') as f:
+            pickle.dump((_format, _runtime_version(), atn_hash), f, pickle.HIGHEST_PROTOCOL)
+            _ATNPickler(f, atn.states).dump((atn.states, [_Fill(s) for s in atn.states if s is not None], atn))
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def load_atn(path, serialized_atn, atn_hash):
+    """
+    Load the precomputed ATN of a generated lexer/parser module. Fall back to
+    deserializing the ATN embedded in the module if the precomputed ATN is
+    missing, was computed from a different grammar, or with a different
+    version of the antlr4 runtime.
+
+    Generated modules processed by :func:`precompute_atn` call this function
+    on import.
+
+    :param str path: Path of the module (its ``__file__``).
+    :param serialized_atn: The ``serializedATN`` function of the module.
+    :param str atn_hash: Hash of the serialized ATN.
+    :return: The ATN.
+    """
+    try:
+        with open(atn_path(path), 'rb') as f:
+            # the header is checked before the classes of the runtime are
+            # looked up by the payload
+            if pickle.load(f) == (_format, _runtime_version(), atn_hash):
+                return pickle.load(f)[2]
+    except Exception:  # pylint: disable=broad-exception-caught
+        pass
+
+    from antlr4.atn.ATNDeserializer import ATNDeserializer  # pylint: disable=import-outside-toplevel
+    return ATNDeserializer().deserialize(serialized_atn())
+
+
+def precompute_atn(module_path, *, search_path=()):
+    """
+    Precompute the ATN of a generated Python lexer/parser module: load the
+    module once, write its deserialized ATN next to it (with an ``.atn``
+    extension), and rewrite the module to load the ATN with
+    :func:`load_atn`. Modules that do not deserialize an ATN (e.g., listeners
+    and visitors) or that are rewritten already are left untouched.
+
+    :param str module_path: Path of the module.
+    :param search_path: Further directories to import the neighbours of the
+        module from (e.g., a lexer superclass), besides its own directory.
+    :type search_path: list(str)
+    :return: The path of the precomputed ATN, or ``None`` if the module was
+        left untouched.
+    """
+    import hashlib  # pylint: disable=import-outside-toplevel
+    import importlib.util  # pylint: disable=import-outside-toplevel
+    import re  # pylint: disable=import-outside-toplevel
+
+    deserialize_re = re.compile(_deserialize_pattern, re.MULTILINE)
+    import_re = re.compile(_import_pattern, re.MULTILINE)
+    with open(module_path, encoding='utf-8', newline='') as f:
+        src = f.read()
+    if not deserialize_re.search(src) or not import_re.search(src):
+        return None
+
+    name = f'_antlerinator_atn_{splitext(basename(module_path))[0]}'
+    spec = importlib.util.spec_from_file_location(name, module_path)
+    module = importlib.util.module_from_spec(spec)
+    # let the module import its neighbours (e.g., a lexer superclass)
+    sys.path[:0] = [dirname(os.path.abspath(module_path)), *search_path]
+    try:
+        spec.loader.exec_module(module)
+    finally:
+        del sys.path[:1 + len(search_path)]
+
+    recognizers = [obj for obj in vars(module).values()
+                   if isinstance(obj, type) and obj.__module__ == name and 'atn' in vars(obj)]
+    if len(recognizers) != 1:
+        return None
+
+    atn_hash = hashlib.sha256(repr(module.serializedATN()).encode()).hexdigest()
+    path = atn_path(module_path)
+    dump_atn(recognizers[0].atn, path, atn_hash)
+
+    src = deserialize_re.sub(lambda m: f"{m.group('assign')}_load_atn(__file__, serializedATN, '{atn_hash}')", src, count=1)
+    src = import_re.sub(lambda m: m.group() + _loader, src, count=1)
+    with open(module_path, 'w', encoding='utf-8', newline='') as f:
+        f.write(src)
+    return path
@@ -5,19 +5,693 @@
 # This file may not be copied, modified, or distributed except
 # according to those terms.
 
+# pylint: disable=too-many-lines
+
+import configparser
+import contextlib
+import functools
 import glob
+import hashlib
+import importlib
+import importlib.util
+import json
 import os
 import re
 import shlex
+import shutil
+import subprocess
 import sys
+import threading
+import time
+
+from os.path import abspath, dirname, isabs, isfile, join
 
 from setuptools import Command
-from setuptools.errors import ModuleError, OptionError
+from setuptools.errors import ExecError, ModuleError, OptionError
+
+from .cache import _parse_size
+from .download import _cds_archive_prefix, _file_stamp, _read_stamp, download, download_all
+from .grammar import GrammarGraph, _norm_path
+
+
+# ANTLR v4 tool options that take a value as the next argument
+_antlr_value_options = ('-o', '-lib', '-encoding', '-message-format', '-package')
+
+# predefined sets of Java VM options
+_jvm_profiles = {
+    'default': (),
+    # the tool runs for a short time, so stop at the C1 JIT compiler, skip
+    # setting up a parallel garbage collector and the performance data file,
+    # and give the deep recursions of the tool on large grammars enough stack
+    'fast-startup': ('-XX:TieredStopAtLevel=1', '-XX:+UseSerialGC', '-XX:-UsePerfData', '-Xss16m'),
+}
+
+# invalidation modes of byte-compiled files (cf. py_compile.PycInvalidationMode)
+_invalidation_modes = ('timestamp', 'checked-hash', 'unchecked-hash')
+
+# the path of the grammar in the header comment of generated files
+_header_re = re.compile(rb'Generated from (?P<path>.+?) by ANTLR ')
+
+
+def _split_antlr_args(antlr_args):
+    """
+    Split the command line arguments of the ANTLR v4 tool into grammar files
+    and options (keeping the values of options together with their names).
+    """
+    grammars, options = [], []
+    args = iter(antlr_args)
+    for arg in args:
+        if arg in _antlr_value_options:
+            options.append((arg, next(args, '')))
+        elif arg.startswith('-'):
+            options.append((arg,))
+        else:
+            grammars.append(arg)
+    return grammars, options
+
+
+def _option_value(options, name):
+    for opt in options:
+        if opt[0] == name and len(opt) == 2:
+            return opt[1]
+    return None
+
+
+def _file_digest(path):
+    h = hashlib.sha256()
+    try:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(64 * 1024), b''):
+                h.update(chunk)
+    except OSError:
+        return None
+    return h.hexdigest()
+
+
+def _relpath(path):
+    """
+    Make a path relative to the working directory (with forward slashes).
+
+    :return: The relative path, or ``None`` if the path is outside the working
+        directory.
+    """
+    try:
+        rel = os.path.relpath(abspath(path))
+    except ValueError:
+        # on a different drive
+        return None
+    if rel == os.pardir or rel.startswith(os.pardir + os.sep):
+        return None
+    return rel.replace(os.sep, '/')
+
+
+def _relative_header(data):
+    """
+    Rewrite the absolute grammar path in the header comment of a generated
+    file to a path relative to the working directory (if the grammar is below
+    the working directory).
+    """
+    m = _header_re.search(data, 0, 1024)
+    if not m or not isabs(os.fsdecode(m.group('path'))):
+        return data
+    path = _relpath(os.fsdecode(m.group('path')))
+    if path is None:
+        return data
+    return data[:m.start('path')] + os.fsencode(path) + data[m.end('path'):]
+
+
+def _write_if_changed(path, data):
+    """
+    Write a file (atomically) unless it exists with the same content.
+
+    :return: Whether the file was written.
+    """
+    try:
+        with open(path, 'rb') as f:
+            if f.read() == data:
+                return False
+    except OSError:
+        pass
+    os.makedirs(dirname(path) or os.curdir, exist_ok=True)
+    tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(tmp)
+        raise
+    return True
+
+
+def _bytecode_files(path):
+    """
+    Find the byte-compiled files of a Python source file in its
+    ``__pycache__`` directory (of any interpreter and optimization level).
+    """
+    cache_dir = join(dirname(path), '__pycache__')
+    name_re = re.compile(re.escape(os.path.splitext(os.path.basename(path))[0]) + r'\.[^.]+(\.opt-\d+)?\.pyc')
+    try:
+        return sorted(join(cache_dir, name) for name in os.listdir(cache_dir) if name_re.fullmatch(name))
+    except OSError:
+        return []
+
+
+def _is_compiled(path, invalidation_mode):
+    """
+    Decide whether a Python source file has up-to-date bytecode for the
+    current interpreter, written with the given invalidation mode.
+    """
+    try:
+        with open(importlib.util.cache_from_source(path), 'rb') as f:
+            header = f.read(16)
+        if len(header) < 16 or header[:4] != importlib.util.MAGIC_NUMBER:
+            return False
+        flags = int.from_bytes(header[4:8], 'little')
+        if invalidation_mode == 'timestamp':
+            st = os.stat(path)
+            return flags == 0 and header[8:16] == (int(st.st_mtime) & 0xFFFFFFFF).to_bytes(4, 'little') + (st.st_size & 0xFFFFFFFF).to_bytes(4, 'little')
+        with open(path, 'rb') as f:
+            source_hash = importlib.util.source_hash(f.read())
+    except OSError:
+        return False
+    return flags == (0b11 if invalidation_mode == 'checked-hash' else 0b01) and header[8:16] == source_hash
+
+
+def _byte_compile(path, invalidation_mode):
+    """
+    Byte-compile a Python source file (in the current process).
+
+    :return: The error message if the compilation failed, ``None`` otherwise.
+    """
+    import py_compile  # pylint: disable=import-outside-toplevel
+
+    try:
+        py_compile.compile(path, doraise=True, invalidation_mode=py_compile.PycInvalidationMode[invalidation_mode.upper().replace('-', '_')])
+    except (py_compile.PyCompileError, OSError) as e:
+        return str(e).strip()
+    return None
+
+
+@functools.lru_cache(maxsize=None)
+def _java_version(java):
+    """
+    Identify the java VM by its version information (or by its resolved path,
+    if it cannot report its version).
+    """
+    try:
+        proc = subprocess.run([java, '-version'], stdout=subprocess.PIPE, stderr=subprocess.STDOUT, check=True)
+        return proc.stdout.decode(errors='replace').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return os.path.realpath(shutil.which(java) or java)
+
+
+def _java_feature_version(java):
+    """
+    Get the feature release number of the java VM (e.g., 8 or 17), or ``None``
+    if it cannot be determined.
+    """
+    m = re.search(r'version "(\d+)(?:\.(\d+))?', _java_version(java))
+    if not m:
+        return None
+    major = int(m.group(1))
+    return int(m.group(2) or 0) if major == 1 else major
+
+
+# digests of the tool jars, keyed by path and file stamp
+_jar_digests = {}
+
+
+def _jar_digest(jar):
+    """
+    Compute the SHA-256 digest of a tool jar (trusting the stamp of jars
+    downloaded by antlerinator). Digests are remembered as long as the size
+    and modification time of the jar do not change.
+    """
+    key = (abspath(jar), str(_file_stamp(jar)))
+    if key not in _jar_digests:
+        _jar_digests[key] = _read_stamp(jar) or _file_digest(jar)
+    return _jar_digests[key]
+
+
+def _cds_archive(inv):
+    """
+    Path of the AppCDS archive of the tool jar of an invocation (specific to
+    the content of the jar, and to the java VM and its options), or ``None`` if
+    the jar cannot be read.
+    """
+    jar_digest = _jar_digest(inv.jar)
+    if not jar_digest:
+        return None
+    vm_key = hashlib.sha256(json.dumps([_java_version(inv.java), inv.jvm_args]).encode()).hexdigest()[:16]
+    return f'{_cds_archive_prefix(jar_digest)}.{vm_key}.jsa'
+
+
+def _writable_dir(path):
+    """
+    Create a directory (if needed) and check whether it is writable.
+    """
+    try:
+        os.makedirs(path, exist_ok=True)
+    except OSError:
+        return False
+    return os.access(path, os.W_OK)
+
+
+class _Invocation:  # pylint: disable=too-many-instance-attributes
+    """
+    A single execution of the ANTLR v4 tool (and the knowledge about its
+    inputs and outputs needed to schedule it).
+    """
+
+    def __init__(self, java, jar, antlr_args, jvm_args=(), graph=None):  # pylint: disable=too-many-arguments
+        self.java = java
+        self.jar = jar
+        # arguments with a -J prefix are options of the Java VM (as for javac)
+        self.jvm_args = tuple(jvm_args) + tuple(arg[2:] for arg in antlr_args if arg.startswith('-J'))
+        self.antlr_args = tuple(arg for arg in antlr_args if not arg.startswith('-J'))
+        # further Java VM options that do not affect the output of the tool
+        self.extra_jvm_args = ()
+        self.grammars, self.options = _split_antlr_args(self.antlr_args)
+
+        # directories the tool writes the generated files of the grammars to
+        output_dir = _option_value(self.options, '-o')
+        if output_dir is None:
+            self.output_dirs = {_norm_path(dirname(g) or os.curdir) for g in self.grammars}
+        elif ('-Xexact-output-dir',) in self.options:
+            self.output_dirs = {_norm_path(output_dir)}
+        else:
+            self.output_dirs = {_norm_path(output_dir if isabs(g) else join(output_dir, dirname(g))) for g in self.grammars}
+        self.lib_dir = _option_value(self.options, '-lib')
+
+        # the dependency graph of the grammars (shared by the invocations of a
+        # build, so that every grammar header is scanned only once)
+        self.graph = graph if graph is not None else GrammarGraph()
+        self.infos = [info for info in (self.graph.add(g, self.lib_dir) for g in self.grammars) if info]
+
+    @property
+    def cmd(self):
+        return [self.java, *self.jvm_args, *self.extra_jvm_args, '-jar', self.jar, *self.antlr_args]
+
+    def needs_tokens_of(self, other):
+        """
+        Decide whether this invocation needs a tokens file generated by
+        ``other``.
+        """
+        token_vocabs = {info.token_vocab for info in self.infos if info.token_vocab}
+        return any(info.name in token_vocabs for info in other.infos)
+
+    def depends_on(self, other):
+        """
+        Decide whether this invocation must run after ``other``, i.e., whether
+        they write to the same directory or whether this invocation needs a
+        tokens file generated by ``other``.
+        """
+        return bool(self.output_dirs & other.output_dirs) or self.needs_tokens_of(other)
+
+    @property
+    def batch_key(self):
+        """
+        Invocations with equal batch keys differ in their grammar files only and
+        can be merged into a single invocation.
+        """
+        return self.java, self.jar, self.jvm_args, tuple(self.options)
+
+    def absolute_args(self):
+        """
+        Rewrite the arguments of the tool to use absolute paths (for a tool
+        running in a different working directory).
+
+        :return: The rewritten arguments, or ``None`` if the output locations
+            of the tool cannot be preserved with absolute paths.
+        """
+        output_dir = _option_value(self.options, '-o')
+        if output_dir is not None and ('-Xexact-output-dir',) not in self.options:
+            # the tool appends the directory of relative grammar paths to the
+            # output directory, but not that of absolute ones
+            if len({dirname(g) for g in self.grammars if not isabs(g)}) > 1:
+                return None
+            output_dir = next((join(output_dir, dirname(g)) for g in self.grammars if not isabs(g)), output_dir)
+
+        args = []
+        it = iter(self.antlr_args)
+        for arg in it:
+            if arg == '-o':
+                args += [arg, abspath(output_dir)]
+                next(it, None)
+            elif arg == '-lib':
+                args += [arg, abspath(next(it, ''))]
+            elif arg in _antlr_value_options:
+                args += [arg, next(it, '')]
+            elif arg.startswith('-'):
+                args.append(arg)
+            else:
+                args.append(abspath(arg))
+        return args
+
+    def staged(self, staging_dir):
+        """
+        Derive an invocation that writes the generated files to a staging
+        directory instead of the output directory (but otherwise behaves the
+        same, as the tool looks up tokens files in the base output directory,
+        which the staging directory replaces).
+
+        :return: The staged invocation, or ``None`` if the invocation cannot be
+            staged (because it writes to more than one directory, or would
+            write outside the staging directory).
+        """
+        if len(self.output_dirs) != 1:
+            return None
+        args = []
+        it = iter(self.antlr_args)
+        for arg in it:
+            if arg in _antlr_value_options:
+                value = next(it, '')
+                args += [arg, staging_dir if arg == '-o' else value]
+            else:
+                args.append(arg)
+        if _option_value(self.options, '-o') is None:
+            args += ['-o', staging_dir]
+
+        staged = _Invocation(self.java, self.jar, args, self.jvm_args, self.graph)
+        staged.staging_dir = _norm_path(staging_dir)
+        if len(staged.output_dirs) != 1 or os.path.commonpath([staged.staging_dir, next(iter(staged.output_dirs))]) != staged.staging_dir:
+            return None
+        return staged
+
+    @property
+    def key(self):
+        """
+        Identifier of the invocation in the build state.
+        """
+        key = [self.java, self.jar, self.antlr_args] + ([self.jvm_args] if self.jvm_args else [])
+        return hashlib.sha256(json.dumps(key).encode()).hexdigest()
+
+    def input_files(self):
+        """
+        Collect the files the output of the invocation depends on: the grammar
+        files, the grammars imported by them (transitively), and the tokens
+        files referenced by their ``tokenVocab`` options.
+        """
+        imports = self.graph.imports(self.grammars)
+        files = list(self.grammars) + imports
+        seen = {_norm_path(f) for f in files}
+        for info in self.infos + [self.graph.info(path) for path in imports]:
+            if not info or not info.token_vocab:
+                continue
+            search_dirs = [dirname(info.path) or os.curdir] + ([self.lib_dir] if self.lib_dir else []) + sorted(self.output_dirs)
+            for d in search_dirs:
+                path = join(d, f'{info.token_vocab}.tokens')
+                if _norm_path(path) not in seen and isfile(path):
+                    seen.add(_norm_path(path))
+                    files.append(path)
+                    break
+        return files
+
+    def digest(self):
+        """
+        Compute a digest of everything that determines the output of the
+        invocation: the java VM, the tool jar, the arguments, and the contents
+        of the input files.
+        """
+        h = hashlib.sha256()
+        h.update(json.dumps([shutil.which(self.java) or self.java, self.jar, _file_stamp(self.jar), self.antlr_args, self.jvm_args]).encode())
+        for path in self.input_files():
+            h.update(json.dumps([path, _file_digest(path)]).encode())
+        return h.hexdigest()
+
+    def snapshot(self):
+        """
+        Take a snapshot of the files in the output directories (to find out
+        which files were written by the invocation).
+        """
+        files = {}
+        for d in self.output_dirs:
+            try:
+                with os.scandir(d) as it:
+                    for entry in it:
+                        if entry.is_file():
+                            st = entry.stat()
+                            files[entry.path] = (st.st_size, st.st_mtime_ns)
+            except OSError:
+                pass
+        return files
+
+    def outputs(self, before):
+        """
+        Find the files written by the invocation since the ``before`` snapshot,
+        i.e., the files that are new or whose size or modification time has
+        changed. The input files of the invocation and the grammars known to
+        the dependency graph are never considered written, even if they were
+        edited while the tool was running.
+        """
+        inputs = {_norm_path(f) for f in self.input_files()} | set(self.graph)
+        return sorted(f for f, stamp in self.snapshot().items()
+                      if before.get(f) != stamp and _norm_path(f) not in inputs)
+
+    def cache_key(self, java_version, jar_digest):
+        """
+        Compute the key of the invocation in the artifact cache. Unlike
+        :meth:`digest`, the key does not depend on the location of the
+        project: it is computed from the version of the java VM, the digest of
+        the tool jar, the arguments (with paths relative to the working
+        directory), and the contents of the input files.
+
+        :return: The key, or ``None`` if the invocation reads or writes files
+            outside the working directory.
+        """
+        args = []
+        it = iter(self.antlr_args)
+        for arg in it:
+            if arg in ('-o', '-lib'):
+                args += [arg, _relpath(next(it, ''))]
+            elif arg in _antlr_value_options:
+                args += [arg, next(it, '')]
+            elif arg.startswith('-'):
+                args.append(arg)
+            else:
+                args.append(_relpath(arg))
+        if any(arg is None for arg in args) or any(_relpath(d) is None for d in self.output_dirs):
+            return None
+
+        h = hashlib.sha256()
+        h.update(json.dumps([java_version, jar_digest, args, self.jvm_args]).encode())
+        for path in self.input_files():
+            h.update(json.dumps([_relpath(path), _file_digest(path)]).encode())
+        return h.hexdigest()
+
+
+class _BuildState:
+    """
+    Persistent record of the previous invocations of the ANTLR v4 tool: the
+    digest of their inputs and the manifest of the files they produced (with
+    their size and modification time).
+    """
+
+    # NOTE: Version 2 state files may list files that were only touched
+    #   during a build (even grammars) among the outputs, and so they are
+    #   discarded.
+    version = 3
+
+    def __init__(self, path):
+        self.path = path
+        self.commands = {}
+        try:
+            with open(path, 'r') as f:
+                state = json.load(f)
+            if state.get('version') == self.version:
+                self.commands = state['commands']
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def up_to_date(self, inv, digest):
+        entry = self.commands.get(inv.key)
+        if entry is None or entry['digest'] != digest:
+            return False
+        return all(_file_stamp(f) == stamp for f, stamp in entry['outputs'].items())
+
+    def record(self, inv, digest, outputs):
+        self.commands[inv.key] = {'digest': digest, 'outputs': {f: _file_stamp(f) for f in sorted(outputs)}}
+
+    def outputs(self):
+        """
+        Collect the files produced by all recorded invocations.
+        """
+        return sorted({f for entry in self.commands.values() for f in entry['outputs']})
+
+    def save(self):
+        os.makedirs(dirname(self.path), exist_ok=True)
+        with open(self.path, 'w') as f:
+            json.dump({'version': self.version, 'commands': self.commands}, f, indent=1)
+
+
+def _coalesce(invocations):
+    """
+    Merge invocations that use the same java VM, tool jar, and options (i.e.,
+    differ in their grammar files only) into a single invocation of the tool.
+
+    An invocation is not merged into an earlier one if it needs the tokens file
+    of an invocation scheduled in between.
+    """
+    batches = []
+    for inv in invocations:
+        for i, batch in enumerate(batches):
+            if batch[0].batch_key == inv.batch_key and not any(inv.needs_tokens_of(other)
+                                                               for later in batches[i + 1:] for other in later):
+                batch.append(inv)
+                break
+        else:
+            batches.append([inv])
+
+    return [batch[0] if len(batch) == 1 else
+            _Invocation(batch[0].java, batch[0].jar,
+                        batch[0].antlr_args + tuple(g for inv in batch[1:] for g in inv.grammars),
+                        batch[0].jvm_args, batch[0].graph)
+            for batch in batches]
+
+
+def _chains(invocations):
+    """
+    Partition invocations into chains that must run sequentially (in their
+    original order), while different chains may run in parallel.
+    """
+    parent = list(range(len(invocations)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i, inv in enumerate(invocations):
+        for j in range(i):
+            if inv.depends_on(invocations[j]) or invocations[j].depends_on(inv):
+                parent[find(i)] = find(j)
+
+    chains = {}
+    for i in range(len(invocations)):
+        chains.setdefault(find(i), []).append(i)
+    return list(chains.values())
+
+
+def _affected(invocations, changed):
+    """
+    Select the invocations that are affected by the ``changed`` files (given
+    as normalized absolute paths): the invocations of the grammars that depend
+    on the changed files (via imports or ``tokenVocab`` options, transitively,
+    according to the dependency graph of the grammars), and the invocations
+    that have any of the changed files (e.g., hand-written tokens files) among
+    their inputs.
+    """
+    if not invocations:
+        return []
+    dirty = invocations[0].graph.dependents(changed)
+    return [inv for inv in invocations
+            if any(_norm_path(g) in dirty for g in inv.grammars) or any(_norm_path(f) in changed for f in inv.input_files())]
+
+
+class _Profiler:
+    """
+    Collector of the timing of the phases of ``build_antlr`` and of the
+    resource usage of the tool invocations.
+    """
+
+    def __init__(self):
+        self.events = []
+        self.commands = {}
+        self.downloaded = 0
+        self._progress = {}
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def phase(self, name, **args):
+        """
+        Time a phase. The yielded dictionary can be used to attach further
+        information to the phase.
+        """
+        start = time.perf_counter_ns()
+        try:
+            yield args
+        finally:
+            self.add(name, start, time.perf_counter_ns() - start, **args)
 
-from .download import download
+    def add(self, name, start, duration, **args):
+        with self._lock:
+            self.events.append({'name': name, 'start': start, 'duration': duration,
+                                'thread': threading.get_ident(), 'args': args})
 
+    def command(self, inv):
+        """
+        Get the statistics of an invocation (created on first access).
+        """
+        with self._lock:
+            return self.commands.setdefault(inv.key, {'command': subprocess.list2cmdline(inv.cmd), 'grammars': list(inv.grammars)})
 
-class build_antlr(Command):
+    def download_progress(self, downloaded, total):  # pylint: disable=unused-argument
+        """
+        Progress callback of :func:`download` that counts the downloaded bytes
+        (of downloads running in parallel threads, and without counting resumed
+        parts twice).
+        """
+        tid = threading.get_ident()
+        with self._lock:
+            last = self._progress.get(tid)
+            if last is not None and downloaded >= last:
+                self.downloaded += downloaded - last
+            self._progress[tid] = downloaded
+
+    def reset_progress(self):
+        with self._lock:
+            self._progress.pop(threading.get_ident(), None)
+
+    def summary(self):
+        """
+        Format the collected data as a human-readable table.
+
+        :return: The lines of the table.
+        """
+        phases = {}
+        for event in self.events:
+            phases[event['name']] = phases.get(event['name'], 0) + event['duration']
+        lines = [f'{"phase":<40} {"wall [s]":>9}']
+        lines += [f'{name:<40} {duration / 1e9:>9.3f}' for name, duration in phases.items()]
+        lines.append(f'{"downloaded [bytes]":<40} {self.downloaded:>9}')
+        lines.append('')
+        lines.append(f'{"grammars":<40} {"status":<12} {"wall [s]":>9} {"user [s]":>9} {"sys [s]":>9} {"RSS [MB]":>9}')
+        for stats in sorted(self.commands.values(), key=lambda stats: -stats.get('wall', 0)):
+            values = ''.join(f' {stats[key]:>9.3f}' if key in stats else f' {"-":>9}' for key in ('wall', 'user', 'sys', 'maxrss'))
+            lines.append(f'{" ".join(stats["grammars"]):<40.40} {stats.get("status", "-"):<12}{values}')
+        return lines
+
+    def to_json(self):
+        """
+        Convert the collected data to a JSON-serializable object (with times
+        in seconds, relative to the first event).
+        """
+        origin = min((event['start'] for event in self.events), default=0)
+        return {
+            'events': [dict(event, start=(event['start'] - origin) / 1e9, duration=event['duration'] / 1e9) for event in self.events],
+            'commands': list(self.commands.values()),
+            'downloaded': self.downloaded,
+        }
+
+    def to_chrome_trace(self):
+        """
+        Convert the collected data to the Trace Event Format of Chrome's
+        ``about:tracing`` (and of Perfetto).
+        """
+        origin = min((event['start'] for event in self.events), default=0)
+        pid = os.getpid()
+        return {
+            'traceEvents': [{'name': event['name'], 'cat': 'build_antlr', 'ph': 'X', 'pid': pid, 'tid': event['thread'],
+                             'ts': (event['start'] - origin) / 1e3, 'dur': event['duration'] / 1e3, 'args': event['args']}
+                            for event in self.events],
+            'displayTimeUnit': 'ms',
+        }
+
+
+class build_antlr(Command):  # pylint: disable=too-many-instance-attributes
 
     description = 'build (generate) parsers/lexers from ANTLR v4 grammar files'
 
@@ -25,14 +699,75 @@ class build_antlr(Command):
         ('commands=', None, 'list of antlr4 invocations'),
         ('output=', None, 'list of file names or glob patterns that are the result of commands'),
         ('java=', None, 'path to java'),
+        ('jobs=', 'j', 'number of antlr4 invocations to run in parallel (default: number of CPUs)'),
+        ('build-base=', 'b', 'base directory for build state (default: build command\'s build-base)'),
+        ('force', 'f', 'run all antlr4 invocations, even if their inputs have not changed'),
+        ('batch', None, 'merge antlr4 invocations that differ in their grammar files only (default)'),
+        ('no-batch', None, 'run every antlr4 invocation separately'),
+        ('daemon', None, 'run antlr4 invocations in a resident Java VM (requires Java 11+; default when watching)'),
+        ('no-daemon', None, 'run every antlr4 invocation in a new Java VM'),
+        ('daemon-idle-timeout=', None, 'seconds of inactivity after which the resident Java VM exits (default: 600)'),
+        ('mirrors=', None, 'list of mirrors to download antlr4 tool jars from (default: $ANTLERINATOR_MIRRORS or the ANTLR download site)'),
+        ('offline', None, 'download antlr4 tool jars from local (file:) mirrors only (default: $ANTLERINATOR_OFFLINE)'),
+        ('prefetch', None, 'download all antlr4 tool jars concurrently before running any antlr4 invocation'),
+        ('cache-dir=', None, 'directory to cache generated files in (default: $ANTLERINATOR_ARTIFACT_CACHE, no caching if unset)'),
+        ('cache-size=', None, 'maximum size of the cache, in bytes or with a K, M, or G suffix (default: 1G)'),
+        ('cache-backend=', None, 'cache implementation as module:ClassName (default: antlerinator.cache:LocalArtifactCache)'),
+        ('cache-link', None, 'hard-link files from the cache instead of copying them'),
+        ('jvm-args=', None, 'options of the Java VM running antlr4 (commands may add further options with a -J prefix)'),
+        ('jvm-profile=', None, f'predefined set of Java VM options ({", ".join(_jvm_profiles)}; default: default)'),
+        ('cds', None, 'create and use AppCDS archives (in the cds directory of the antlerinator cache, keyed by the digest of the tool jar) to speed up Java VM startup (requires Java 13+)'),
+        ('profile', None, 'print a summary of the time spent in the phases of the build and in antlr4 invocations'),
+        ('profile-output=', None, 'write profiling data to a file'),
+        ('profile-format=', None, 'format of the profiling data file: json or chrome (trace event format; default: json)'),
+        ('watch', None, 'keep running and re-run the antlr4 invocations affected by changes of their grammar files'),
+        ('watch-debounce=', None, 'seconds to wait for further changes before re-running antlr4 invocations (default: 0.2)'),
+        ('atn-cache', None, 'precompute the ATNs of generated Python lexers/parsers into .atn files loaded on import (requires the antlr4 runtime at build time)'),
+        ('compile', None, 'byte-compile the generated Python files (in parallel, as many processes as jobs)'),
+        ('invalidation-mode=', None, f'invalidation mode of byte-compiled files ({", ".join(_invalidation_modes)}; default: checked-hash if $SOURCE_DATE_EPOCH is set, timestamp otherwise)'),
+        ('staging', None, 'generate files into a staging directory and replace only the files whose content changed (default)'),
+        ('no-staging', None, 'let antlr4 write the generated files directly'),
+        ('relative-headers', None, 'rewrite absolute grammar paths in the header comments of generated files to paths relative to the project'),
     ]
 
+    boolean_options = ['force', 'batch', 'daemon', 'offline', 'prefetch', 'cache-link', 'cds', 'profile', 'watch', 'atn-cache', 'compile', 'staging', 'relative-headers']
+    negative_opt = {'no-batch': 'batch', 'no-daemon': 'daemon', 'no-staging': 'staging'}
+
     def initialize_options(self):
         self.commands = None
         self.output = None
         self.java = None
+        self.jobs = None
+        self.build_base = None
+        self.force = None
+        self.batch = None
+        self.daemon = None
+        self.daemon_idle_timeout = None
+        self.mirrors = None
+        self.offline = None
+        self.prefetch = None
+        self.cache_dir = None
+        self.cache_size = None
+        self.cache_backend = None
+        self.cache_link = None
+        self.jvm_args = None
+        self.jvm_profile = None
+        self.cds = None
+        self.profile = None
+        self.profile_output = None
+        self.profile_format = None
+        self.watch = None
+        self.watch_debounce = None
+        self.atn_cache = None
+        self.compile = None
+        self.invalidation_mode = None
+        self.staging = None
+        self.relative_headers = None
+
+    def finalize_options(self):  # pylint: disable=too-many-statements,too-many-locals
+        self._profiler = _Profiler()
+        start = time.perf_counter_ns()
 
-    def finalize_options(self):
         # parse 'commands' option
         commands = self.commands or []
 
@@ -49,8 +784,10 @@ class build_antlr(Command):
         cmd_re = re.compile('^(?P<provider>^[^\\d\\W]\\w*):(?P<provider_arg>\\S*)\\s+(?P<antlr_args>.*)$')
         providers = {
             'file': lambda arg: arg,
-            'antlerinator': lambda arg: download(arg, lazy=True),
+            'antlerinator': lambda arg: download(arg, lazy=True, mirrors=self.mirrors, offline=self.offline,
+                                                 progress=self._profiler.download_progress),
         }
+        self._antlerinator_provider = providers['antlerinator']
         posix = sys.platform != 'win32'
 
         for i, cmd in enumerate(commands):
@@ -82,19 +819,667 @@ class build_antlr(Command):
         if self.output is None:
             self.output = []
 
+        # process 'mirrors' option
+        self.ensure_string_list('mirrors')
+
         # ensure default for 'java' option
         if not self.java:
             self.java = 'java'
 
+        # process 'jobs' option
+        if self.jobs is None:
+            self.jobs = os.cpu_count() or 1
+        try:
+            self.jobs = int(self.jobs)
+        except ValueError as e:
+            raise OptionError(f"'jobs' must be a positive integer (got {self.jobs!r})") from e
+        if self.jobs < 1:
+            raise OptionError(f"'jobs' must be a positive integer (got {self.jobs!r})")
+
+        # ensure defaults for 'build_base' and 'force' options (taken from the
+        # 'build' command, but without finalizing it, as that would trigger
+        # package discovery)
+        build = self.distribution.get_command_obj('build')
+        if self.build_base is None:
+            self.build_base = build.build_base or 'build'
+        if self.force is None:
+            self.force = build.force or 0
+
+        # ensure defaults for 'batch' and 'staging' options
+        if self.batch is None:
+            self.batch = 1
+        if self.staging is None:
+            self.staging = 1
+
+        # process 'daemon_idle_timeout' option
+        if self.daemon_idle_timeout is None:
+            self.daemon_idle_timeout = 600
+        try:
+            self.daemon_idle_timeout = int(self.daemon_idle_timeout)
+        except ValueError as e:
+            raise OptionError(f"'daemon_idle_timeout' must be an integer (got {self.daemon_idle_timeout!r})") from e
+
+        # process artifact cache options
+        if self.cache_dir is None:
+            self.cache_dir = os.environ.get('ANTLERINATOR_ARTIFACT_CACHE') or None
+
+        if self.cache_size is None:
+            self.cache_size = '1G'
+        try:
+            self.cache_size = _parse_size(str(self.cache_size))
+        except ValueError as e:
+            raise OptionError(f"'cache_size' must be a size in bytes, optionally with a K, M, or G suffix (got {self.cache_size!r})") from e
+
+        if self.cache_backend is None:
+            self.cache_backend = 'antlerinator.cache:LocalArtifactCache'
+        if not isinstance(self.cache_backend, str):
+            self.cache_backend = f'{self.cache_backend.__module__}:{self.cache_backend.__qualname__}'
+        if not re.fullmatch(r'[\w.]+:[\w.]+', self.cache_backend):
+            raise OptionError(f"'cache_backend' must be in module:ClassName format (got {self.cache_backend!r})")
+
+        # process Java VM options
+        if self.jvm_profile is None:
+            self.jvm_profile = 'default'
+        if self.jvm_profile not in _jvm_profiles:
+            raise OptionError(f"unknown 'jvm_profile' (options: {', '.join(_jvm_profiles)}; got: {self.jvm_profile!r})")
+        jvm_args = self.jvm_args or []
+        if isinstance(jvm_args, str):
+            jvm_args = shlex.split(jvm_args, posix=posix)
+        self.jvm_args = _jvm_profiles[self.jvm_profile] + tuple(jvm_args)
+        self._cds_pending = set()
+        self._cds_unsupported = set()
+        self._cds_lock = threading.Lock()
+
+        # process profiling options
+        if self.profile_format is None:
+            self.profile_format = 'json'
+        if self.profile_format not in ('json', 'chrome'):
+            raise OptionError(f"'profile_format' must be 'json' or 'chrome' (got {self.profile_format!r})")
+
+        # process watch options (and keep the Java VM warm between rebuilds)
+        if self.watch_debounce is None:
+            self.watch_debounce = 0.2
+        try:
+            self.watch_debounce = float(self.watch_debounce)
+        except ValueError as e:
+            raise OptionError(f"'watch_debounce' must be a number (got {self.watch_debounce!r})") from e
+        if self.watch and self.daemon is None:
+            self.daemon = 1
+
+        # process 'atn_cache' option
+        if self.atn_cache:
+            if importlib.util.find_spec('antlr4') is None:
+                self.warn('cannot precompute ATNs without the antlr4 runtime (antlr4-python3-runtime), skipping')
+                self.atn_cache = 0
+        self._atn_lock = threading.Lock()
+
+        # process 'invalidation_mode' option (defaulting like py_compile)
+        if self.invalidation_mode is None:
+            self.invalidation_mode = 'checked-hash' if os.environ.get('SOURCE_DATE_EPOCH') else 'timestamp'
+        if self.invalidation_mode not in _invalidation_modes:
+            raise OptionError(f"unknown 'invalidation_mode' (options: {', '.join(_invalidation_modes)}; got: {self.invalidation_mode!r})")
+
+        self._profiler.add('finalize_options', start, time.perf_counter_ns() - start)
+
     def run(self):
-        for provider, provider_arg, antlr_args in self.commands:
-            self.spawn([self.java, '-jar', provider(provider_arg)] + list(antlr_args))
+        if not self.commands:
+            return
+
+        profiler = self._profiler
+
+        if self.prefetch:
+            versions = [provider_arg for provider, provider_arg, _ in self.commands if provider is self._antlerinator_provider]
+            if versions:
+                with profiler.phase('prefetch', versions=versions):
+                    download_all(versions, lazy=True, mirrors=self.mirrors, offline=self.offline,
+                                 progress=profiler.download_progress)
+
+        jars = []
+        for provider, provider_arg, _ in self.commands:
+            downloaded = profiler.downloaded
+            profiler.reset_progress()
+            with profiler.phase('resolve', arg=provider_arg) as args:
+                jars.append(provider(provider_arg))
+                args['downloaded'] = profiler.downloaded - downloaded
+
+        with profiler.phase('analyze'):
+            invocations = self._invocations(jars)
+            chains = _chains(invocations)
+            state = _BuildState(join(self.build_base, 'antlr', 'state.json'))
+            self._cache = self._load_cache_backend() if self.cache_dir and not self.dry_run else None
+            self._cache_grown = False
+
+        if not self.watch:
+            self._build_all(invocations, chains, state)
+            return
+
+        try:
+            self._build_all(invocations, chains, state)
+        except ExecError as e:
+            self.warn(str(e))
+        self._watch(jars, state)
+
+    def _invocations(self, jars):
+        graph = GrammarGraph()
+        invocations = [_Invocation(self.java, jar, antlr_args, self.jvm_args, graph)
+                       for jar, (_, _, antlr_args) in zip(jars, self.commands)]
+        # every invocation runs after the invocations generating the tokens
+        # files it needs, i.e., in the topological order of its grammars
+        # (independent invocations keep their original order)
+        rank = {key: i for i, key in enumerate(graph.topological_order())}
+        invocations.sort(key=lambda inv: max((rank[_norm_path(g)] for g in inv.grammars), default=-1))
+        return _coalesce(invocations) if self.batch else invocations
+
+    def _build_all(self, invocations, chains, state):
+        profiler = self._profiler
+        try:
+            self._run_invocations(invocations, chains, state)
+            if self.compile and not self.dry_run:
+                with profiler.phase('compile'):
+                    self._compile_outputs(state)
+        finally:
+            if not self.dry_run:
+                with profiler.phase('save'):
+                    state.save()
+            # NOTE: eviction walks the whole cache, so it is done only if the
+            #   cache may have grown
+            if self._cache and self._cache_grown:
+                self._cache_grown = False
+                with profiler.phase('evict'):
+                    self._cache.evict(self.cache_size)
+            if self._profiling:
+                self._report_profile()
+
+    def _watch(self, jars, state):
+        """
+        Watch the input files of the invocations and re-run the invocations
+        affected by their changes, until interrupted.
+        """
+        from .watch import watch  # pylint: disable=import-outside-toplevel
+
+        def watched_files(invocations):
+            # the tokens files generated by the invocations themselves are not
+            # watched, as they change with every rebuild
+            return sorted({_norm_path(f) for inv in invocations for f in inv.input_files()} - set(state.outputs()))
+
+        def rebuild(changed):
+            # rescan the grammars, as their imports may have changed
+            invocations = self._invocations(jars)
+            affected = _affected(invocations, changed)
+            if affected:
+                self.announce(f'changed: {", ".join(sorted(_relpath(f) or f for f in changed))}', level=2)
+                try:
+                    self._build_all(affected, _chains(affected), state)
+                except ExecError as e:
+                    self.warn(str(e))
+            return watched_files(invocations)
+
+        self.announce('watching grammar files for changes (press Ctrl+C to stop)', level=2)
+        watch(watched_files(self._invocations(jars)), rebuild, debounce=self.watch_debounce)
+
+    def _compile_outputs(self, state):
+        """
+        Byte-compile the generated Python files (the ones recorded in the
+        build state and the ones matching the 'output' patterns) that have no
+        up-to-date bytecode yet, in subprocesses (if multiple jobs are allowed).
+        """
+        files = {abspath(f) for f in state.outputs()} | {abspath(f) for o in self.output for f in glob.glob(o, recursive=True)}
+        files = sorted(f for f in files if f.endswith('.py') and isfile(f) and not _is_compiled(f, self.invalidation_mode))
+        if not files:
+            return
+
+        self.announce(f'byte-compiling {len(files)} generated file(s)', level=2)
+        jobs = min(self.jobs, len(files))
+        if jobs == 1:
+            errors = [_byte_compile(f, self.invalidation_mode) for f in files]
+        else:
+            # NOTE: The files are compiled by compileall subprocesses instead of
+            #   a process pool, as the workers of a pool would re-import the
+            #   __main__ module (e.g., an unguarded setup.py) under the spawn
+            #   and forkserver start methods.
+            def compile_files(chunk):
+                proc = subprocess.run([sys.executable, '-m', 'compileall', '-q', f'--invalidation-mode={self.invalidation_mode}', '-i', '-'],
+                                      input='\n'.join(chunk).encode(), stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                      env=dict(os.environ, PYTHONIOENCODING='utf-8'), check=False)
+                if proc.returncode == 0:
+                    return None
+                return proc.stdout.decode(errors='replace').strip() or f'byte-compilation failed (exit code {proc.returncode})'
+
+            from concurrent.futures import ThreadPoolExecutor  # pylint: disable=import-outside-toplevel
+
+            with ThreadPoolExecutor(max_workers=jobs) as executor:
+                errors = list(executor.map(compile_files, [files[i::jobs] for i in range(jobs)]))
+        errors = [error for error in errors if error]
+        if errors:
+            raise ExecError('\n'.join(errors))
+
+    @property
+    def _profiling(self):
+        return self.profile or self.profile_output
+
+    def _report_profile(self):
+        """
+        Print the profiling summary and write the profiling data file, as
+        requested.
+        """
+        if self.profile:
+            for line in self._profiler.summary():
+                self.announce(line, level=2)
+        if self.profile_output:
+            data = self._profiler.to_chrome_trace() if self.profile_format == 'chrome' else self._profiler.to_json()
+            os.makedirs(dirname(abspath(self.profile_output)), exist_ok=True)
+            with open(self.profile_output, 'w') as f:
+                json.dump(data, f, indent=1)
+
+    def _load_cache_backend(self):
+        module_name, class_name = self.cache_backend.split(':')
+        try:
+            cls = importlib.import_module(module_name)
+            for name in class_name.split('.'):
+                cls = getattr(cls, name)
+        except (ImportError, AttributeError) as e:
+            raise OptionError(f"cannot load cache backend {self.cache_backend!r}: {e}") from e
+        return cls(self.cache_dir)
+
+    def _cache_key(self, inv):
+        """
+        Compute the key of an invocation in the artifact cache (or ``None`` if
+        the invocation cannot be cached).
+        """
+        if not self._cache:
+            return None
+        return inv.cache_key(_java_version(inv.java), _jar_digest(inv.jar))
+
+    def _restore(self, inv, digest, cache_key, state):
+        """
+        Materialize the output of an invocation from the artifact cache.
+
+        :return: Whether the output was found in the cache.
+        """
+        if not cache_key or self.force:
+            return False
+        files = self._cache.get(cache_key, os.curdir, link=self.cache_link)
+        if files is None:
+            return False
+        state.record(inv, digest, [abspath(f) for f in files])
+        return True
+
+    def _record(self, inv, digest, cache_key, outputs, state):
+        """
+        Record the output of a successful invocation in the build state and in
+        the artifact cache.
+
+        :param outputs: The paths of the generated files, and the paths of the
+            files to store in the artifact cache (cf. :meth:`_outputs`).
+        """
+        outputs, cached_outputs = outputs
+        state.record(inv, digest, outputs)
+        if cache_key:
+            cached_outputs = [_relpath(f) for f in cached_outputs]
+            if None not in cached_outputs:
+                self._cache.put(cache_key, os.curdir, cached_outputs)
+                self._cache_grown = True
+
+    def _precompute_atns(self, files, search_path=()):
+        """
+        Precompute the ATNs of generated Python lexers/parsers (before the
+        outputs of their invocation are recorded, so that the ATNs and the
+        rewritten modules get recorded and cached).
+        """
+        from .atn import precompute_atn  # pylint: disable=import-outside-toplevel
+
+        for f in files:
+            if not f.endswith('.py'):
+                continue
+            # loading the generated modules touches sys.path and sys.modules
+            with self._atn_lock:
+                try:
+                    path = precompute_atn(f, search_path=search_path)
+                except Exception as e:  # pylint: disable=broad-exception-caught
+                    self.warn(f'cannot precompute the ATN of {f!r} ({e})')
+                    continue
+            if path:
+                self.announce(f'precomputed the ATN of {f!r} into {path!r}', level=2)
+
+    def _stage(self, inv):
+        """
+        Prepare an invocation for writing its output to a staging directory
+        (below the build base): derive the staged invocation and copy the
+        tokens files the tool would look up in the base output directory to
+        the staging directory. The copies get a zero modification time, to
+        tell them apart from regenerated tokens files.
+
+        :return: The staged invocation, or ``None`` if the invocation cannot be
+            staged.
+        """
+        staging_dir = abspath(join(self.build_base, 'antlr', 'staging', f'{inv.key[:16]}.{os.getpid()}'))
+        staged = inv.staged(staging_dir)
+        if not staged:
+            return None
+
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        os.makedirs(staging_dir)
+        base_dir = _option_value(inv.options, '-o') or os.curdir
+        for vocab in sorted({info.token_vocab for info in inv.infos if info.token_vocab}):
+            src = join(base_dir, f'{vocab}.tokens')
+            if isfile(src):
+                dst = join(staging_dir, f'{vocab}.tokens')
+                shutil.copyfile(src, dst)
+                os.utime(dst, ns=(0, 0))
+        return staged
+
+    def _install(self, inv, staged):
+        """
+        Move the files generated by a staged invocation to the output directory
+        of the invocation, replacing only the files whose (normalized) content
+        changed. Files with unchanged content are left untouched (keeping their
+        modification time).
+
+        :return: The paths of the generated files in the output directory.
+        """
+        staged_dir = next(iter(staged.output_dirs))
+        output_dir = next(iter(inv.output_dirs))
+        outputs = []
+        for root, dirs, names in os.walk(staged_dir):
+            dirs.sort()
+            for name in sorted(names):
+                src = join(root, name)
+                if os.stat(src).st_mtime_ns == 0:
+                    # a tokens file copied for the lookups of the tool
+                    continue
+                with open(src, 'rb') as f:
+                    data = f.read()
+                if self.relative_headers:
+                    data = _relative_header(data)
+                dst = join(output_dir, os.path.relpath(src, staged_dir))
+                _write_if_changed(dst, data)
+                outputs.append(dst)
+        return outputs
+
+    def _outputs(self, inv, staged, before, stats):
+        """
+        Post-process the files generated by a successful invocation (precompute
+        ATNs, install staged files, normalize headers).
+
+        :return: The paths of the generated files, and the paths of the files
+            to store in the artifact cache.
+        """
+        if self.atn_cache:
+            with self._profiler.phase('atn', command=stats['command']):
+                self._precompute_atns((staged or inv).outputs(before), search_path=list(inv.output_dirs))
+
+        if staged:
+            with self._profiler.phase('install', command=stats['command']):
+                outputs = self._install(inv, staged)
+            return outputs, outputs
+
+        outputs = inv.outputs(before)
+        if self.relative_headers:
+            for f in outputs:
+                with open(f, 'rb') as fp:
+                    data = fp.read()
+                _write_if_changed(f, _relative_header(data))
+        return outputs, outputs
+
+    def _unlink_cached(self, inv, state):
+        """
+        Remove the outputs of an invocation that are hard-linked from the
+        artifact cache, lest the tool overwrite the cached files in place.
+        """
+        entry = state.commands.get(inv.key)
+        for f in entry['outputs'] if self.cache_link and entry else []:
+            try:
+                if os.stat(f).st_nlink > 1:
+                    os.unlink(f)
+            except OSError:
+                pass
+
+    def _is_up_to_date(self, inv, state):
+        """
+        Decide whether an invocation can be skipped.
+
+        :return: Whether the invocation is up to date, and the digest of its
+            inputs.
+        """
+        digest = inv.digest()
+        return not self.force and state.up_to_date(inv, digest), digest
+
+    def _build(self, inv, state, execute):
+        """
+        Bring the output of an invocation up to date: skip it, restore its
+        output from the artifact cache, or run it with ``execute``.
+
+        :return: The reason for skipping the invocation, or the result of
+            ``execute``.
+        """
+        stats = self._profiler.command(inv)
+        with self._profiler.phase('check', command=stats['command']):
+            up_to_date, digest = self._is_up_to_date(inv, state)
+        if up_to_date:
+            stats['status'] = 'up-to-date'
+            return 'up-to-date'
+
+        cache_key = self._cache_key(inv)
+        if cache_key:
+            with self._profiler.phase('cache', command=stats['command']) as args:
+                args['hit'] = self._restore(inv, digest, cache_key, state)
+            if args['hit']:
+                stats['status'] = 'cached'
+                return 'restored from cache'
+
+        # the tool writes to a staging directory (if possible), or directly to
+        # the output directory (in which case it must not overwrite cached
+        # files in place)
+        staged = self._stage(inv) if self.staging and not self.dry_run else None
+        if not staged:
+            self._unlink_cached(inv, state)
+        before = (staged or inv).snapshot()
+        stats['status'] = 'failed'
+        cds_dump = self._use_cds(staged or inv)
+        result = None
+        try:
+            with self._profiler.phase('execute', command=stats['command']):
+                start = time.perf_counter_ns()
+                try:
+                    result = execute(staged or inv, stats)
+                finally:
+                    stats['wall'] = (time.perf_counter_ns() - start) / 1e9
+                    if cds_dump:
+                        self._finish_cds(cds_dump, result is not None and result[0] == 0)
+            if result[0] == 0:
+                stats['status'] = 'ran'
+                if not self.dry_run:
+                    outputs = self._outputs(inv, staged, before, stats)
+                    with self._profiler.phase('record', command=stats['command']):
+                        self._record(inv, digest, cache_key, outputs, state)
+        finally:
+            if staged:
+                shutil.rmtree(staged.staging_dir, ignore_errors=True)
+        return result
+
+    def _use_cds(self, inv):
+        """
+        Set up the AppCDS archive of the tool jar of an invocation: use the
+        archive if it exists, or make the invocation dump the classes it loads
+        into a new archive (if no other invocation is doing so already). The
+        archive is kept in the cache directory and is specific to the content
+        of the jar, and to the java VM and its options.
+
+        :return: The path of the temporary dump and of the archive, if the
+            invocation creates the archive.
+        """
+        inv.extra_jvm_args = ()
+        if not self.cds or self.dry_run or (self.daemon and inv.absolute_args() is not None):
+            return None
+
+        version = _java_feature_version(inv.java)
+        if version is None or version < 13:
+            with self._cds_lock:
+                if inv.java not in self._cds_unsupported:
+                    self._cds_unsupported.add(inv.java)
+                    self.warn(f'cannot use AppCDS with {inv.java!r} (requires Java 13+)')
+            return None
+
+        archive = _cds_archive(inv)
+        if not archive:
+            return None
+        if isfile(archive):
+            inv.extra_jvm_args = (f'-XX:SharedArchiveFile={archive}',)
+            return None
+
+        with self._cds_lock:
+            if archive in self._cds_pending or not _writable_dir(dirname(archive)):
+                return None
+            self._cds_pending.add(archive)
+        dump = f'{archive}.{os.getpid()}.{threading.get_ident()}.tmp'
+        inv.extra_jvm_args = (f'-XX:ArchiveClassesAtExit={dump}',)
+        return dump, archive
+
+    def _finish_cds(self, cds_dump, success):
+        """
+        Publish the AppCDS archive dumped by an invocation (if it succeeded).
+        """
+        dump, archive = cds_dump
+        try:
+            if success and isfile(dump):
+                os.replace(dump, archive)
+            elif isfile(dump):
+                os.remove(dump)
+        except OSError as e:
+            self.warn(f'cannot create AppCDS archive {archive!r} ({e})')
+        with self._cds_lock:
+            self._cds_pending.discard(archive)
+
+    def _run_invocations(self, invocations, chains, state):
+        if self.jobs == 1 or len(chains) < 2:
+            for inv in invocations:
+                result = self._build(inv, state, self._spawn)
+                if isinstance(result, str):
+                    self.announce(f'skipping {subprocess.list2cmdline(inv.cmd)} ({result})', level=2)
+            return
+
+        results = [None] * len(invocations)
+        failed = threading.Event()
+
+        def run_chain(chain):
+            for i in chain:
+                if failed.is_set():
+                    return
+                results[i] = self._build(invocations[i], state, self._execute)
+                if not isinstance(results[i], str) and results[i][0] != 0:
+                    failed.set()
+
+        from concurrent.futures import ThreadPoolExecutor  # pylint: disable=import-outside-toplevel
+
+        with ThreadPoolExecutor(max_workers=min(self.jobs, len(chains))) as executor:
+            for future in [executor.submit(run_chain, chain) for chain in chains]:
+                future.result()
+
+        # report the output of the invocations in their original order
+        errors = []
+        for inv, result in zip(invocations, results):
+            if result is None:
+                continue
+            if isinstance(result, str):
+                self.announce(f'skipping {subprocess.list2cmdline(inv.cmd)} ({result})', level=2)
+                continue
+            self.announce(subprocess.list2cmdline(inv.cmd), level=2)
+            error = self._report(inv, result)
+            if error:
+                errors.append(error)
+        if errors:
+            raise ExecError('\n'.join(errors))
+
+    def _spawn(self, inv, stats=None):
+        """
+        Execute an invocation with its output not captured (unless it is run
+        by the daemon or profiled). Raise :exc:`ExecError` if the invocation
+        fails.
+
+        :return: The exit code of the invocation and its captured output.
+        """
+        if not self.daemon and not self._profiling:
+            self.spawn(inv.cmd)
+            return 0, ''
+
+        self.announce(subprocess.list2cmdline(inv.cmd), level=2)
+        result = self._execute(inv, stats)
+        error = self._report(inv, result)
+        if error:
+            raise ExecError(error)
+        return result
+
+    def _report(self, inv, result):
+        """
+        Print the captured output of an invocation.
+
+        :return: The error message if the invocation failed, ``None``
+            otherwise.
+        """
+        returncode, output = result
+        if output:
+            sys.stdout.write(output)
+            sys.stdout.flush()
+        if returncode is None:
+            return f'command {inv.cmd[0]!r} failed: {output.strip()}'
+        if returncode != 0:
+            return f'command {inv.cmd[0]!r} failed with exit code {returncode}'
+        return None
+
+    def _execute(self, inv, stats=None):
+        """
+        Execute an invocation (unless in dry-run mode) and capture its output.
+        Route the invocation to the daemon if requested and possible. If
+        ``stats`` is given, the resource usage of the java process is stored in
+        it (where available).
+
+        :return: The exit code of the invocation (``None`` if it could not be
+            started) and its (combined stdout and stderr) output.
+        """
+        if self.dry_run:
+            return 0, ''
+
+        if self.daemon:
+            from .daemon import run_tool  # pylint: disable=import-outside-toplevel
+
+            args = inv.absolute_args()
+            if args is not None:
+                try:
+                    return run_tool(inv.java, inv.jar, args, idle_timeout=self.daemon_idle_timeout, jvm_args=inv.jvm_args)
+                except OSError as e:
+                    self.warn(f'cannot use ANTLR tool daemon ({e}), running java directly')
+                    # do not retry starting the daemon for every invocation
+                    self.daemon = 0
+
+        if stats is None or not hasattr(os, 'wait4'):
+            try:
+                proc = subprocess.run(inv.cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, check=False)
+            except OSError as e:
+                return None, f'{e}\n'
+            return proc.returncode, proc.stdout.decode(errors='replace')
+
+        # reap the process with wait4 to get its own resource usage (instead
+        # of the cumulative usage of all children of all threads)
+        try:
+            proc = subprocess.Popen(inv.cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        except OSError as e:
+            return None, f'{e}\n'
+        with proc:
+            output = proc.stdout.read()
+            _, status, rusage = os.wait4(proc.pid, 0)
+            proc.returncode = os.waitstatus_to_exitcode(status)
+        stats['user'] = rusage.ru_utime
+        stats['sys'] = rusage.ru_stime
+        stats['maxrss'] = rusage.ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+        return proc.returncode, output.decode(errors='replace')
 
 
 class clean_antlr(Command):
 
     description = 'clean parsers/lexers generated from ANTLR v4 grammar files'
 
+    user_options = []
+
     def initialize_options(self):
         pass
 
@@ -102,13 +1487,82 @@ class clean_antlr(Command):
         pass
 
     def run(self):
-        output = self.get_finalized_command('build_antlr').output
-        files = [f for o in output for f in glob.glob(o, recursive=True)]
+        build_cmd = self.get_finalized_command('build_antlr')
+        state = _BuildState(join(build_cmd.build_base, 'antlr', 'state.json'))
+
+        # remove the files recorded in the manifest of the build state, and
+        # fall back to the 'output' patterns only if nothing is recorded
+        if state.commands:
+            files = [f for f in state.outputs() if isfile(f)]
+        else:
+            files = [f for o in build_cmd.output for f in glob.glob(o, recursive=True)]
         for f in files:
             self.execute(os.unlink, (f,))
+            # remove the bytecode of generated Python files, too
+            for pyc in _bytecode_files(f) if f.endswith('.py') else []:
+                self.execute(os.unlink, (pyc,))
+        for d in sorted({join(dirname(f), '__pycache__') for f in files if f.endswith('.py')}):
+            with contextlib.suppress(OSError):
+                if not self.dry_run and not os.listdir(d):
+                    os.rmdir(d)
+        if isfile(state.path):
+            self.execute(os.unlink, (state.path,))
+
+
+def _is_configured(dist):  # pylint: disable=too-many-return-statements
+    """
+    Decide whether a distribution has a ``build_antlr`` configuration, either
+    passed to ``setup()``, in the distutils/setuptools configuration files
+    (e.g., ``setup.cfg``), or in ``pyproject.toml`` (as
+    ``[tool.distutils.build_antlr]``).
+
+    NOTE: The configuration files are not parsed yet when the
+    ``finalize_distribution_options`` hook is called, so they are looked at
+    directly (but cheaply, without parsing files that do not mention
+    ``build_antlr`` at all).
+    """
+    if 'build_antlr' in dist.command_options:
+        return True
+
+    def read(path):
+        try:
+            with open(path, encoding='utf-8') as f:
+                return f.read()
+        except (OSError, UnicodeDecodeError):
+            return ''
+
+    for path in dist.find_config_files():
+        src = read(path)
+        if 'build_antlr' in src:
+            parser = configparser.ConfigParser(interpolation=None)
+            try:
+                parser.read_string(src, source=path)
+            except configparser.Error:
+                return True
+            if parser.has_section('build_antlr'):
+                return True
+
+    src = read(join(dist.src_root or os.curdir, 'pyproject.toml'))
+    if 'build_antlr' in src:
+        try:
+            import tomllib  # pylint: disable=import-outside-toplevel
+        except ImportError:
+            # without a TOML parser, err on the safe side
+            return True
+        try:
+            pyproject = tomllib.loads(src)
+        except tomllib.TOMLDecodeError:
+            return True
+        if 'build_antlr' in pyproject.get('tool', {}).get('distutils', {}):
+            return True
+
+    return False
 
 
 def register(dist):
+    # leave the distribution untouched if it does not use antlerinator
+    if not _is_configured(dist):
+        return
 
     build = dist.get_command_class('build')
     develop = dist.get_command_class('develop')
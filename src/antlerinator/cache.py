@@ -0,0 +1,425 @@
+# Copyright (c) 2025 Renata Hodovan, Akos Kiss.
+#
+# Licensed under the BSD 3-Clause License
+# <LICENSE.rst or https://opensource.org/licenses/BSD-3-Clause>.
+# This file may not be copied, modified, or distributed except
+# according to those terms.
+
+import contextlib
+import glob
+import json
+import os
+import re
+import shutil
+import sys
+import threading
+import time
+import uuid
+
+from os.path import basename, dirname, isdir, join
+
+from .download import _cache_dir, _cds_archive_prefix, _file_lock, _read_index, _read_stamp, _update_index, _version
+
+
+class ArtifactCache:
+    """
+    Interface of the content-addressed caches of the files generated by the
+    ANTLR v4 tool. A cache maps keys (hexadecimal digests of everything that
+    determines the output of a tool invocation) to sets of files (identified
+    by relative paths).
+
+    Custom backends (e.g., for remote storage) can be used by ``build_antlr``
+    by subclassing this class and setting the ``cache_backend`` option to
+    ``module:ClassName``. Backends are constructed with the cache location as
+    their only argument and must be safe to use from multiple threads.
+    """
+
+    def __init__(self, location):
+        self.location = location
+
+    def get(self, key, dst_dir, *, link=False):
+        """
+        Materialize the files of a cache entry.
+
+        :param str key: Key of the entry.
+        :param str dst_dir: Directory the relative paths of the files are
+            resolved against.
+        :param bool link: Whether the files may be hard-linked from the cache
+            instead of copied.
+        :return: The paths of the materialized files, or ``None`` on cache
+            miss.
+        :rtype: list(str)
+        """
+        raise NotImplementedError()
+
+    def put(self, key, src_dir, files):
+        """
+        Store files in a cache entry.
+
+        :param str key: Key of the entry.
+        :param str src_dir: Directory the relative paths of the files are
+            resolved against.
+        :param list(str) files: Relative paths of the files.
+        """
+        raise NotImplementedError()
+
+    def evict(self, max_size):  # pylint: disable=unused-argument
+        """
+        Shrink the cache to at most ``max_size`` bytes (if the backend supports
+        size limits).
+
+        :return: The keys of the removed entries.
+        :rtype: list(str)
+        """
+        return []
+
+
+class LocalArtifactCache(ArtifactCache):
+    """
+    Artifact cache in a (possibly shared network) directory. Every entry is a
+    subdirectory holding the cached files and a ``manifest.json`` listing
+    them. Entries are published atomically (by renaming), so concurrent
+    writers are safe. The modification time of the manifest tracks the last
+    use of the entry, and the least recently used entries are evicted when the
+    total size of the cache exceeds the limit.
+    """
+
+    def __init__(self, location):
+        super().__init__(location)
+        self._lock = threading.Lock()
+
+    def _entry_dir(self, key):
+        return join(self.location, key[:2], key)
+
+    def get(self, key, dst_dir, *, link=False):
+        entry_dir = self._entry_dir(key)
+        try:
+            with open(join(entry_dir, 'manifest.json'), 'r') as f:
+                files = json.load(f)['files']
+        except (OSError, ValueError, KeyError):
+            return None
+        # the time of last use is informational only (e.g., a shared cache may
+        # be read-only)
+        with contextlib.suppress(OSError):
+            os.utime(join(entry_dir, 'manifest.json'))
+
+        paths = []
+        for rel in files:
+            src, dst = join(entry_dir, 'files', rel), join(dst_dir, rel)
+            os.makedirs(dirname(dst) or os.curdir, exist_ok=True)
+            if os.path.lexists(dst):
+                os.unlink(dst)
+            if link:
+                try:
+                    os.link(src, dst)
+                    paths.append(dst)
+                    continue
+                except OSError:
+                    pass
+            # NOTE: shutil.copyfile uses copy_file_range/sendfile where
+            #   available, which lets the kernel clone (reflink) the data on
+            #   file systems supporting it.
+            shutil.copyfile(src, dst)
+            paths.append(dst)
+        return paths
+
+    def put(self, key, src_dir, files):
+        entry_dir = self._entry_dir(key)
+        if isdir(entry_dir):
+            return
+
+        tmp_dir = join(self.location, 'tmp', uuid.uuid4().hex)
+        try:
+            for rel in files:
+                dst = join(tmp_dir, 'files', rel)
+                os.makedirs(dirname(dst), exist_ok=True)
+                shutil.copyfile(join(src_dir, rel), dst)
+            os.makedirs(tmp_dir, exist_ok=True)
+            with open(join(tmp_dir, 'manifest.json'), 'w') as f:
+                json.dump({'files': sorted(files)}, f, indent=1)
+
+            os.makedirs(dirname(entry_dir), exist_ok=True)
+            try:
+                os.rename(tmp_dir, entry_dir)
+            except OSError:
+                # another process has published the same entry in the meantime
+                if not isdir(entry_dir):
+                    raise
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def entries(self):
+        """
+        List the entries of the cache.
+
+        :return: Key, size in bytes, and time of last use (in nanoseconds) of
+            every entry.
+        :rtype: list(tuple(str, int, int))
+        """
+        result = []
+        try:
+            with os.scandir(self.location) as it:
+                prefixes = [p for p in it if p.is_dir() and len(p.name) == 2]
+        except OSError:
+            return result
+        for prefix in prefixes:
+            with os.scandir(prefix.path) as it:
+                for entry in it:
+                    try:
+                        atime = os.stat(join(entry.path, 'manifest.json')).st_mtime_ns
+                    except OSError:
+                        continue
+                    size = 0
+                    for root, _, names in os.walk(entry.path):
+                        for name in names:
+                            try:
+                                size += os.stat(join(root, name)).st_size
+                            except OSError:
+                                pass
+                    result.append((entry.name, size, atime))
+        return result
+
+    def evict(self, max_size):
+        """
+        Remove the least recently used entries until the total size of the
+        cache is at most ``max_size`` bytes.
+        """
+        return self.prune(max_size=max_size)
+
+    def prune(self, *, max_size=None, older_than=None, dry_run=False):
+        """
+        Remove the entries last used before ``older_than`` (a timestamp in
+        nanoseconds), and then the least recently used entries until the total
+        size of the cache is at most ``max_size`` bytes.
+
+        :return: The keys of the removed entries.
+        :rtype: list(str)
+        """
+        with self._lock:
+            entries = sorted(self.entries(), key=lambda entry: entry[2])
+            total = sum(size for _, size, _ in entries)
+            removed = []
+            for key, size, atime in entries:
+                if (older_than is None or atime >= older_than) and (max_size is None or total <= max_size):
+                    continue
+                if not dry_run:
+                    shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+                    try:
+                        os.rmdir(dirname(self._entry_dir(key)))
+                    except OSError:
+                        pass
+                total -= size
+                removed.append(key)
+            return removed
+
+
+_jar_re = re.compile(r'antlr-(.+)-complete\.jar')
+
+
+def jar_entries(cache_dir=None):
+    """
+    List the ANTLR v4 tool jars in the cache directory (``~/.antlerinator``
+    or ``$ANTLERINATOR_HOME``), with the files belonging to them (digest
+    stamps, partial downloads, and AppCDS archives). The versions and times of
+    last use are taken from the index of the directory (without opening the
+    jars), falling back to the file name and modification time of jars not in
+    the index.
+
+    :return: Version, path, total size in bytes, time of last use (in seconds
+        since the epoch), and the paths of all files of every jar (the least
+        recently used first).
+    :rtype: list(tuple(str, str, int, float, list(str)))
+    """
+    cache_dir = cache_dir or _cache_dir()
+    index = _read_index(cache_dir)['jars']
+    try:
+        names = sorted(os.listdir(cache_dir))
+    except OSError:
+        return []
+
+    entries = []
+    for name in names:
+        m = _jar_re.fullmatch(name)
+        if not m:
+            continue
+        files = [join(cache_dir, f) for f in names
+                 if f == name or (f.startswith(f'{name}.') and not f.endswith('.lock'))]
+        digest = _read_stamp(join(cache_dir, name))
+        if digest:
+            files += sorted(glob.glob(f'{glob.escape(_cds_archive_prefix(digest, cache_dir))}.*.jsa'))
+        size = 0
+        for f in files:
+            try:
+                size += os.stat(f).st_size
+            except OSError:
+                pass
+        path = join(cache_dir, name)
+        entry = index.get(name) or {}
+        try:
+            last_used = entry.get('last_used') or os.stat(path).st_mtime
+        except OSError:
+            continue
+        entries.append((entry.get('version') or m.group(1), path, size, last_used, files))
+    return sorted(entries, key=lambda entry: entry[3])
+
+
+def prune_jars(*, max_size=None, older_than=None, dry_run=False, cache_dir=None):
+    """
+    Remove the tool jars (with their files) from the cache directory that were
+    last used before ``older_than`` (a timestamp in seconds), and then the least
+    recently used jars until the total size of the jars is at most ``max_size``
+    bytes.
+
+    :return: The entries of the removed jars (see :func:`jar_entries`).
+    """
+    cache_dir = cache_dir or _cache_dir()
+    entries = jar_entries(cache_dir)
+    total = sum(entry[2] for entry in entries)
+    removed = []
+    for entry in entries:
+        _, _, size, last_used, _ = entry
+        if (older_than is None or last_used >= older_than) and (max_size is None or total <= max_size):
+            continue
+        total -= size
+        removed.append(entry)
+
+    if not dry_run:
+        _remove_jars(removed, cache_dir)
+    return removed
+
+
+def _remove_jars(entries, cache_dir):
+    """
+    Remove jars (with their files) from the cache directory and from its
+    index.
+    """
+    for _, path, _, _, files in entries:
+        # lest a concurrent download be disturbed
+        with _file_lock(path):
+            for f in files:
+                with contextlib.suppress(OSError):
+                    os.remove(f)
+    if entries:
+        with _update_index(cache_dir) as index:
+            for _, path, _, _, _ in entries:
+                index['jars'].pop(basename(path), None)
+
+
+def _verify_jar_content(path):
+    """
+    Check a jar against the digest recorded in its stamp (if any), or for
+    intact zip members.
+    Unlike the lazy check of :func:`~antlerinator.download`, the content of
+    the jar is always read.
+    """
+    import hashlib  # pylint: disable=import-outside-toplevel
+    import zipfile  # pylint: disable=import-outside-toplevel
+
+    expected = _read_stamp(path)
+    if expected:
+        hasher = hashlib.sha256()
+        with open(path, mode='rb') as f:
+            for chunk in iter(lambda: f.read(64 * 1024), b''):
+                hasher.update(chunk)
+        return hasher.hexdigest() == expected.lower()
+    try:
+        with zipfile.ZipFile(path) as jar:
+            return jar.testzip() is None
+    except (OSError, zipfile.BadZipFile):
+        return False
+
+
+def _parse_size(value):
+    """
+    Parse a size in bytes, optionally with a K, M, or G suffix (e.g., ``1G``).
+    Raise :exc:`ValueError` if the size is malformed.
+    """
+    m = re.fullmatch(r'\s*(\d+)\s*([KMG]?)\s*', value, re.IGNORECASE)
+    if not m:
+        raise ValueError(f'invalid size: {value!r}')
+    return int(m.group(1)) * 1024 ** ' KMG'.index(m.group(2).upper() or ' ')
+
+
+def _format_size(size):
+    for unit in ('B', 'KB', 'MB'):
+        if size < 1024:
+            return f'{size:.0f} {unit}' if unit == 'B' else f'{size:.1f} {unit}'
+        size /= 1024
+    return f'{size:.1f} GB'
+
+
+def _format_time(timestamp):
+    return time.strftime('%Y-%m-%d %H:%M', time.localtime(timestamp))
+
+
+def execute():  # pylint: disable=too-many-locals
+    """
+    Entry point of the cache management tool of the ANTLR v4 tool jars (and of
+    the artifact cache of ``build_antlr``).
+    """
+    from argparse import ArgumentParser  # pylint: disable=import-outside-toplevel
+
+    import inators.arg  # pylint: disable=import-outside-toplevel
+
+    arg_parser = ArgumentParser(description='Cache management tool of the ANTLR v4 tool jars downloaded by ANTLeRinator.')
+    arg_parser.add_argument('--cache-dir', metavar='DIR', default=None,
+                            help='directory of the downloaded jars (default: $ANTLERINATOR_HOME or ~/.antlerinator)')
+    arg_parser.add_argument('--artifact-cache', metavar='DIR', default=os.environ.get('ANTLERINATOR_ARTIFACT_CACHE') or None,
+                            help='directory of the artifact cache of build_antlr to report on and prune, too (default: $ANTLERINATOR_ARTIFACT_CACHE)')
+    inators.arg.add_version_argument(arg_parser, version=_version())
+
+    subparsers = arg_parser.add_subparsers(dest='action', required=True, metavar='ACTION')
+    subparsers.add_parser('list', help='list the downloaded jars (the most recently used first)')
+    subparsers.add_parser('stats', help='show the number and total size of the cached files')
+    verify_parser = subparsers.add_parser('verify', help='check the integrity of the downloaded jars')
+    verify_parser.add_argument('--remove', action='store_true', default=False,
+                               help='remove the corrupted jars')
+    prune_parser = subparsers.add_parser('prune', help='remove the least recently used jars (and artifacts)')
+    prune_parser.add_argument('--max-size', metavar='SIZE', type=_parse_size, default=None,
+                              help='keep the total size of the jars (and of the artifacts) at most SIZE (in bytes or with a K, M, or G suffix)')
+    prune_parser.add_argument('--older-than', metavar='DAYS', type=float, default=None,
+                              help='remove the jars (and artifacts) not used in the last DAYS days')
+    prune_parser.add_argument('--dry-run', action='store_true', default=False,
+                              help='only list what would be removed')
+
+    args = arg_parser.parse_args()
+    cache_dir = args.cache_dir or _cache_dir()
+    artifact_cache = LocalArtifactCache(args.artifact_cache) if args.artifact_cache else None
+
+    if args.action == 'list':
+        for version, path, size, last_used, _ in reversed(jar_entries(cache_dir)):
+            print(f'{version:<12} {_format_size(size):>10}  {_format_time(last_used)}  {path}')
+
+    elif args.action == 'stats':
+        entries = jar_entries(cache_dir)
+        print(f'jars: {len(entries)}, {_format_size(sum(entry[2] for entry in entries))} in {cache_dir}')
+        if artifact_cache:
+            entries = artifact_cache.entries()
+            print(f'artifacts: {len(entries)} entries, {_format_size(sum(entry[1] for entry in entries))} in {artifact_cache.location}')
+
+    elif args.action == 'verify':
+        corrupted = []
+        for entry in jar_entries(cache_dir):
+            ok = _verify_jar_content(entry[1])
+            print(f'{"OK" if ok else "CORRUPTED":<10} {entry[1]}')
+            if not ok:
+                corrupted.append(entry)
+        if args.remove:
+            _remove_jars(corrupted, cache_dir)
+        elif corrupted:
+            sys.exit(1)
+
+    elif args.action == 'prune':
+        if args.max_size is None and args.older_than is None:
+            arg_parser.error('prune requires --max-size and/or --older-than')
+        older_than = time.time() - args.older_than * 24 * 3600 if args.older_than is not None else None
+        for _, path, size, _, _ in prune_jars(max_size=args.max_size, older_than=older_than, dry_run=args.dry_run, cache_dir=cache_dir):
+            print(f'{"would remove" if args.dry_run else "removed"} {path} ({_format_size(size)})')
+        if artifact_cache:
+            removed = artifact_cache.prune(max_size=args.max_size, older_than=int(older_than * 1e9) if older_than is not None else None,
+                                           dry_run=args.dry_run)
+            print(f'{"would remove" if args.dry_run else "removed"} {len(removed)} artifact cache entries')
+
+
+if __name__ == '__main__':
+    execute()
@@ -0,0 +1,153 @@
+# Copyright (c) 2025 Renata Hodovan, Akos Kiss.
+#
+# Licensed under the BSD 3-Clause License
+# <LICENSE.rst or https://opensource.org/licenses/BSD-3-Clause>.
+# This file may not be copied, modified, or distributed except
+# according to those terms.
+
+import hashlib
+import json
+import os
+import secrets
+import socket
+import subprocess
+import sys
+import threading
+
+from os.path import dirname, join
+
+from .download import _cache_dir, _file_stamp
+
+
+daemon_source = join(dirname(__file__), 'AntlerinatorDaemon.java')
+
+# seconds to wait for a new daemon to report its port (launching the Java
+# source of the daemon includes compiling it), and for a connection to it
+_start_timeout = 60
+_connect_timeout = 10
+
+_lock = threading.Lock()
+_daemons = []
+
+
+def _state_path(java, jar, jvm_args):
+    # NOTE: the stamp of the jar is part of the key, so that a daemon which
+    #   has loaded an older version of the jar is not reused
+    key = hashlib.sha256(json.dumps([java, os.path.abspath(jar), _file_stamp(jar)] + ([list(jvm_args)] if jvm_args else [])).encode()).hexdigest()[:16]
+    return join(_cache_dir(), 'daemon', f'{key}.json')
+
+
+def _read_state(path):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _start(java, jar, jvm_args, idle_timeout, state_path):  # pylint: disable=too-many-locals
+    state_dir = dirname(state_path)
+    os.makedirs(state_dir, exist_ok=True)
+
+    if sys.platform == 'win32':
+        detach = {'creationflags': subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP}
+    else:
+        detach = {'start_new_session': True}
+
+    token = secrets.token_hex(16)
+    # NOTE: not using Popen as a context manager, as that would wait for the
+    #   daemon to exit
+    proc = subprocess.Popen([java, *jvm_args, '-cp', jar, daemon_source, str(int(idle_timeout))],  # pylint: disable=consider-using-with
+                            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                            cwd=state_dir, **detach)
+    proc.stdin.write(f'{token}\n'.encode())
+    proc.stdin.close()
+    # NOTE: reading the port in a thread, as pipes cannot be read with a
+    #   timeout portably
+    lines = []
+    reader = threading.Thread(target=lambda: lines.append(proc.stdout.readline()), daemon=True)
+    reader.start()
+    reader.join(_start_timeout)
+    if reader.is_alive():
+        # the reader thread ends (and the pipe is closed) when the last
+        # process holding the pipe exits
+        proc.kill()
+        proc.wait()
+        raise TimeoutError(f'ANTLR tool daemon did not start in {_start_timeout} seconds with {java!r}')
+    proc.stdout.close()
+    try:
+        port = int(lines[0])
+    except ValueError as e:
+        proc.kill()
+        proc.wait()
+        raise OSError(f'failed to start ANTLR tool daemon with {java!r}') from e
+
+    # keep the Popen object alive, the daemon is meant to outlive this process
+    _daemons.append(proc)
+    state = {'pid': proc.pid, 'port': port, 'token': token}
+
+    tmp_path = f'{state_path}.{os.getpid()}.tmp'
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, state_path)
+    return state
+
+
+def _request(state, antlr_args, timeout):
+    request = '\n'.join([state['token'], str(len(antlr_args))] + list(antlr_args)) + '\n'
+    with socket.create_connection(('127.0.0.1', state['port']), timeout=_connect_timeout) as sock:
+        sock.settimeout(timeout)
+        sock.sendall(request.encode('utf-8'))
+        sock.shutdown(socket.SHUT_WR)
+        response = b''.join(iter(lambda: sock.recv(64 * 1024), b''))
+
+    status, newline, output = response.partition(b'\n')
+    if not newline or not status.isdigit():
+        raise ConnectionError('ANTLR tool daemon closed the connection without response')
+    return int(status), output.decode('utf-8', errors='replace')
+
+
+def run_tool(java, jar, antlr_args, *, idle_timeout=600, jvm_args=(), timeout=600):  # pylint: disable=too-many-arguments
+    """
+    Run the ANTLR v4 tool in a resident Java VM. The VM is started on first use
+    (for every java VM and tool jar combination) and is reused by subsequent
+    calls, even across processes, until it stays idle for ``idle_timeout``
+    seconds. The daemon runs one tool invocation at a time.
+
+    Requires Java 11 or later (to launch the Java source of the daemon
+    directly).
+
+    :param str java: Path to java.
+    :param str jar: Path to the ANTLR v4 tool jar.
+    :param antlr_args: Command line arguments of the tool. Since the daemon
+        does not share the working directory of the caller, all paths in the
+        arguments should be absolute.
+    :type antlr_args: list(str) or tuple(str)
+    :param int idle_timeout: Seconds of inactivity after which a newly started
+        daemon exits.
+    :param jvm_args: Options of the Java VM of the daemon (daemons with
+        different options are separate).
+    :type jvm_args: list(str) or tuple(str)
+    :param float timeout: Seconds to wait for the response of the daemon
+        (``None`` for no timeout). An :exc:`OSError` is raised on timeout, as
+        well as if the daemon cannot be started (in time).
+    :return: The exit status of the tool and its diagnostic output.
+    :rtype: tuple(int, str)
+    """
+    state_path = _state_path(java, jar, jvm_args)
+    failed_state = None
+    while True:
+        with _lock:
+            state = _read_state(state_path)
+            if state is None or state == failed_state:
+                state = _start(java, jar, jvm_args, idle_timeout, state_path)
+        try:
+            return _request(state, antlr_args, timeout)
+        except socket.timeout:
+            # the daemon is busy or hung, starting another one would not help
+            raise
+        except OSError:
+            if failed_state is not None:
+                raise
+            failed_state = state
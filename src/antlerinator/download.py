@@ -5,25 +5,72 @@
 # This file may not be copied, modified, or distributed except
 # according to those terms.
 
+# NOTE: This module is imported whenever setuptools loads the build_antlr
+#   extension, i.e., by every setuptools build on a machine where antlerinator
+#   is installed. Thus, expensive modules (network stack, archive handling,
+#   CLI) and package metadata lookups are deferred until they are needed.
+# pylint: disable=import-outside-toplevel
+
 import contextlib
 import errno
-import ssl
+import functools
+import os
+import sys
+import threading
+import time
 
-from argparse import ArgumentParser
-from importlib import metadata
 from os import makedirs
-from os.path import basename, dirname, exists, expanduser, join
-from urllib.request import urlopen
+from os.path import abspath, basename, dirname, exists, expanduser, getsize, isfile, join
+
+
+@functools.lru_cache(maxsize=None)
+def _version():
+    from importlib import metadata
+    return metadata.version(__package__)
+
+
+@functools.lru_cache(maxsize=None)
+def _antlr_version():
+    from importlib import metadata
+    try:
+        return metadata.version('antlr4-python3-runtime')
+    except metadata.PackageNotFoundError:
+        return None
+
 
-import inators
+def __getattr__(name):
+    # lazily computed module attributes
+    if name == '__version__':
+        return _version()
+    if name == '__antlr_version__':
+        return _antlr_version()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def _cache_dir():
+    return os.environ.get('ANTLERINATOR_HOME') or join(expanduser('~'), '.antlerinator')
+
+
+def _cds_archive_prefix(digest, cache_dir=None):
+    """
+    Path prefix of the AppCDS archives of a tool jar (one per java VM
+    configuration). The archives are kept in the cache directory and are keyed
+    by the content of the jar (not by its path).
 
+    :param str digest: SHA-256 digest of the jar.
+    """
+    return join(cache_dir or _cache_dir(), 'cds', digest[:16])
 
-__version__ = metadata.version(__package__)
 
-try:
-    __antlr_version__ = metadata.version('antlr4-python3-runtime')
-except metadata.PackageNotFoundError:
-    __antlr_version__ = None
+def _required_version(version):
+    """
+    Default the version to that of the installed antlr4 runtime package, and
+    raise :exc:`ValueError` if it is still unknown.
+    """
+    version = version or _antlr_version()
+    if not version:
+        raise ValueError('version must be specified if antlr4 runtime is not installed')
+    return version
 
 
 def default_antlr_jar_path(version=None):
@@ -35,17 +82,500 @@ def default_antlr_jar_path(version=None):
         not installed, in which case a :exc:`ValueError` is raised).
     :return: The version-specific default path.
     """
-    version = version or __antlr_version__
-    if not version:
-        raise ValueError('version must be specified if antlr4 runtime is not installed')
-    return join(expanduser('~'), '.antlerinator', f'antlr-{version}-complete.jar')
+    return join(_cache_dir(), f'antlr-{_required_version(version)}-complete.jar')
+
+
+# paths of the tool jars resolved by resolve_antlr_jar, keyed by version (None
+# for the version of the runtime), and the paths of the jars whose versions
+# have been validated
+_resolved_jars = {}
+_validated_jars = set()
+
+
+def _jar_version(path):
+    """
+    Determine the version of an ANTLR v4 tool jar from its manifest (or, if
+    that fails, from its file name).
+
+    :return: The version, or ``None`` if it cannot be determined.
+    """
+    import re
+    import zipfile
+
+    try:
+        with zipfile.ZipFile(path) as jar:
+            manifest = jar.read('META-INF/MANIFEST.MF').decode('utf-8', errors='replace')
+        m = re.search(r'^Implementation-Version:\s*(\S+)', manifest, re.MULTILINE)
+        if m:
+            return m.group(1)
+    except (OSError, KeyError, zipfile.BadZipFile):
+        pass
+    m = re.search(r'antlr4?-(\d+(?:\.\d+)+)(?:-complete)?\.jar$', path)
+    return m.group(1) if m else None
+
+
+def _validate_jar(path, version=None):
+    """
+    Check that a tool jar is of the given version (or of the version of the
+    installed runtime, if not given). Raise :exc:`ValueError` if it is not (or
+    if its version cannot be determined). No-op if no version is given and the
+    runtime is not installed.
+    """
+    version = version or _antlr_version()
+    if not version or (path, version) in _validated_jars:
+        return
+    jar_version = _jar_version(path)
+    if jar_version != version:
+        raise ValueError(f'ANTLR v4 tool jar {path!r} is of version {jar_version or "unknown"}, expected {version}')
+    _validated_jars.add((path, version))
+
+
+def resolve_antlr_jar(version=None, *, validate=False, **kwargs):
+    """
+    Get the path to the ANTLR v4 tool jar, doing as little work as possible.
+    If the ``ANTLERINATOR_JAR`` environment variable is set, its value is used
+    without touching the file system. Otherwise, the jar is looked up (and
+    downloaded if necessary) with :func:`download` in lazy mode, and the
+    resolved path is remembered, so subsequent calls in the process cost a
+    single file stat only. The remembered paths can be forgotten with
+    :func:`invalidate_resolved_antlr_jars`.
+
+    :param str version: The version of ANTLR v4 tool jar. If ``None``, it
+        defaults to the version of the installed antlr4 runtime package.
+    :param bool validate: Check that the version of the jar (as recorded in its
+        manifest) is ``version`` (or the version of the installed runtime),
+        and raise :exc:`ValueError` if not. The result of the check is
+        remembered, too.
+    :param kwargs: Further keyword arguments of :func:`download` (except for
+        ``path`` and ``lazy``), used when the jar is downloaded.
+    :return: Path to the jar.
+    """
+    path = os.environ.get('ANTLERINATOR_JAR')
+    if not path:
+        path = _resolved_jars.get(version)
+        if path is None or not isfile(path):
+            path = _resolved_jars[version] = download(version, lazy=True, **kwargs)
+    if validate:
+        _validate_jar(path, version)
+    return path
+
+
+def invalidate_resolved_antlr_jars():
+    """
+    Forget the paths (and validation results) remembered by
+    :func:`resolve_antlr_jar`, e.g., after jars have been replaced or the
+    cache directory has changed.
+    """
+    _resolved_jars.clear()
+    _validated_jars.clear()
+
+
+# Maven Central comes first, as it publishes the digests of the jars (so that
+# downloads can be verified even if no digest is given)
+default_antlr_mirrors = ('maven+https://repo1.maven.org/maven2/', 'https://www.antlr.org/download/')
+
+# hash algorithms of published digests (in order of preference), and the
+# number of hexadecimal digits of their digests
+_digest_algorithms = {'sha256': 64, 'sha1': 40}
+
+_buffer_size = 64 * 1024
 
 
-def download(version=None, path=None, *, force=False, lazy=False):
+def _copy_stream(src, dst, *, progress=None, hashers=(), offset=0):
+    """
+    Copy the content of a (HTTP response) stream to a file using a fixed-size
+    buffer (and feed it to hash objects on the fly). If the stream is the
+    continuation of a partial download, ``offset`` is the size of the part
+    already downloaded (for progress reporting).
+
+    :return: The number of bytes copied.
+    """
+    length = getattr(src, 'length', None)
+    total = offset + length if length is not None else None
+    buffer = bytearray(_buffer_size)
+    view = memoryview(buffer)
+    copied = 0
+    if progress:
+        progress(offset, total)
+    while True:
+        n = src.readinto(buffer)
+        if not n:
+            break
+        dst.write(view[:n])
+        for hasher in hashers:
+            hasher.update(view[:n])
+        copied += n
+        if progress:
+            progress(offset + copied, total)
+    return copied
+
+
+def _fetch(url, part_path, *, progress=None, timeout=None):  # pylint: disable=too-many-locals
+    """
+    Download a file into ``part_path``. If ``part_path`` already holds the
+    beginning of the file (from an interrupted download), continue with a HTTP
+    range request (unless the server does not support it).
+
+    :return: The SHA-256 and SHA-1 hash objects of the complete file, keyed by
+        algorithm name.
+    """
+    import hashlib
+    import ssl
+    from urllib.error import HTTPError
+    from urllib.request import Request, urlopen
+
+    hashers = {name: hashlib.new(name) for name in _digest_algorithms}
+    offset = 0
+    with contextlib.suppress(OSError), open(part_path, mode='rb') as part_file:
+        for chunk in iter(lambda: part_file.read(_buffer_size), b''):
+            for hasher in hashers.values():
+                hasher.update(chunk)
+            offset += len(chunk)
+
+    request = Request(url, headers={'Range': f'bytes={offset}-'} if offset else {})
+    ssl_context = ssl.create_default_context(purpose=ssl.Purpose.SERVER_AUTH)
+    try:
+        response = urlopen(request, context=ssl_context, timeout=timeout)  # pylint: disable=consider-using-with
+    except HTTPError as e:
+        if e.code == 416 and offset:
+            # the partial download is not a prefix of the file, start over
+            os.remove(part_path)
+        raise
+
+    with contextlib.closing(response):
+        if offset and getattr(response, 'status', None) != 206:
+            hashers = {name: hashlib.new(name) for name in _digest_algorithms}
+            offset = 0
+        length = getattr(response, 'length', None)
+        with open(part_path, mode='ab' if offset else 'wb') as part_file:
+            copied = _copy_stream(response, part_file, progress=progress, hashers=hashers.values(), offset=offset)
+        if length is not None and copied < length:
+            raise ConnectionError(f'connection closed after {offset + copied} of {offset + length} bytes of {url}')
+    return hashers
+
+
+def _published_digest(mirror, url, *, timeout=None):
+    """
+    Get the digest of a jar published next to it on a Maven repository mirror
+    (in a ``.sha256`` or ``.sha1`` file).
+
+    :return: The name of the hash algorithm and the digest, or ``None`` if the
+        mirror is not a Maven repository or if it publishes no digest.
+    """
+    if not mirror.startswith('maven+'):
+        return None
+
+    import re
+    import ssl
+    from urllib.request import urlopen
+
+    ssl_context = ssl.create_default_context(purpose=ssl.Purpose.SERVER_AUTH)
+    for name, digits in _digest_algorithms.items():
+        try:
+            with urlopen(f'{url}.{name}', context=ssl_context, timeout=timeout) as response:
+                content = response.read(1024).decode('ascii', errors='replace').split()
+        except OSError:
+            continue
+        # the digest may be followed by the file name
+        if content and re.fullmatch(f'[0-9a-fA-F]{{{digits}}}', content[0]):
+            return name, content[0].lower()
+    return None
+
+
+def _part_path(path, url):
+    """
+    Get the path of the partial download of a jar from a given URL. Partial
+    downloads are keyed by their URL, so that a partial file left behind by the
+    download of a different version or from a different mirror is never
+    continued.
+    """
+    import hashlib
+
+    return f'{path}.{hashlib.sha1(url.encode()).hexdigest()[:8]}.part'
+
+
+def _check_part(part_path, url, hashers, expected):
+    """
+    Verify a completely downloaded partial file against the expected digest,
+    or (if no digest is available) for a valid zip structure. The file is
+    removed if found invalid.
+
+    :param str part_path: Path of the partial file.
+    :param str url: URL the file was downloaded from (for error reporting).
+    :param dict hashers: Hash objects of the downloaded content, keyed by
+        algorithm name.
+    :param tuple expected: Algorithm name and expected hexadecimal digest (or
+        ``None`` if no digest is available).
+    """
+    import zipfile
+
+    if expected:
+        name, digest = expected
+        actual = hashers[name].hexdigest()
+        if actual != digest:
+            os.remove(part_path)
+            raise OSError(errno.EIO, f'{name.upper().replace("SHA", "SHA-")} digest mismatch (expected {digest}, got {actual})', url)
+    elif not zipfile.is_zipfile(part_path):
+        os.remove(part_path)
+        raise OSError(errno.EIO, 'downloaded file is not a valid jar', url)
+
+
+def _mirrors(mirrors=None):
+    """
+    Determine the mirrors to download from: the explicitly given ones, or the
+    ones listed in the ``ANTLERINATOR_MIRRORS`` environment variable
+    (whitespace-separated), or Maven Central and the official ANTLR download
+    site.
+    """
+    if mirrors is None:
+        mirrors = os.environ.get('ANTLERINATOR_MIRRORS', '').split() or default_antlr_mirrors
+    elif isinstance(mirrors, str):
+        mirrors = mirrors.split()
+    return list(mirrors)
+
+
+def _is_offline(offline=None):
+    if offline is None:
+        offline = os.environ.get('ANTLERINATOR_OFFLINE', '').lower() not in ('', '0', 'false', 'no')
+    return offline
+
+
+def _mirror_url(mirror, version):
+    """
+    Compose the URL of the tool jar of a given version on a mirror.
+
+    A mirror can be a URL prefix to append the file name of the jar to (e.g.,
+    ``https://www.antlr.org/download/`` or ``file:///path/to/jars/``), a URL
+    template with ``{version}`` and/or ``{file}`` placeholders, an absolute
+    directory path, or a Maven repository URL prefixed with ``maven+`` (e.g.,
+    ``maven+https://repo1.maven.org/maven2/``) to download the
+    ``org.antlr:antlr4:VERSION:complete`` artifact from.
+    """
+    if mirror.startswith('maven+'):
+        return f'{mirror[len("maven+"):].rstrip("/")}/org/antlr/antlr4/{version}/antlr4-{version}-complete.jar'
+    if os.path.isabs(mirror):
+        import pathlib
+        mirror = pathlib.Path(mirror).as_uri()
+    if '{' in mirror:
+        return mirror.format(version=version, file=f'antlr-{version}-complete.jar')
+    return f'{mirror.rstrip("/")}/antlr-{version}-complete.jar'
+
+
+def _is_transient(e):
+    """
+    Decide whether a download error is worth retrying.
+    """
+    import http.client
+    from urllib.error import HTTPError
+
+    if isinstance(e, HTTPError):
+        return e.code >= 500 or e.code in (408, 416, 429)
+    return isinstance(e, (OSError, http.client.HTTPException))
+
+
+def _file_stamp(path):
+    """
+    Get the size and modification time of a file (or ``None`` if it does not
+    exist), to detect its changes cheaply.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+
+def _write_stamp(path, digest):
+    """
+    Record the digest of a verified jar together with its size and
+    modification time in a ``.sha256`` sidecar file. The stamp is an
+    optimization only, so failing to write it (e.g., next to a jar in a
+    read-only directory) is not an error.
+    """
+    tmp_path = f'{path}.sha256.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        st = os.stat(path)
+        with open(tmp_path, mode='w') as f:
+            f.write(f'{digest} {st.st_size} {st.st_mtime_ns}\n')
+        os.replace(tmp_path, f'{path}.sha256')
+    except OSError:
+        with contextlib.suppress(OSError):
+            os.remove(tmp_path)
+
+
+def _read_stamp(path):
+    """
+    Get the digest recorded in the ``.sha256`` sidecar file of a jar.
+
+    :return: The digest, or ``None`` if there is no stamp or it does not match
+        the size and modification time of the jar.
+    """
+    try:
+        st = os.stat(path)
+        with open(f'{path}.sha256', mode='r') as f:
+            digest, size, mtime_ns = f.read().split()
+        if int(size) == st.st_size and int(mtime_ns) == st.st_mtime_ns:
+            return digest
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def _verify_jar(path, sha256=None):
+    """
+    Check the integrity of a jar. If the sidecar stamp of the jar matches its
+    size and modification time, the recorded digest is trusted. Otherwise, the
+    jar is hashed (and checked against ``sha256``, if given, or for a valid
+    zip structure, if not), and the stamp is updated.
+
+    :return: Whether the jar is intact.
+    """
+    if not isfile(path):
+        return False
+
+    digest = _read_stamp(path)
+    if digest:
+        return not sha256 or digest == sha256.lower()
+
+    import hashlib
+    import zipfile
+
+    hasher = hashlib.sha256()
+    with open(path, mode='rb') as f:
+        for chunk in iter(lambda: f.read(_buffer_size), b''):
+            hasher.update(chunk)
+    digest = hasher.hexdigest()
+    if (digest != sha256.lower()) if sha256 else not zipfile.is_zipfile(path):
+        return False
+    _write_stamp(path, digest)
+    return True
+
+
+@contextlib.contextmanager
+def _file_lock(path):
+    """
+    Hold an exclusive inter-process lock associated with ``path`` (using a
+    ``.lock`` file next to it).
+    """
+    with open(f'{path}.lock', mode='a+b') as lock_file:
+        if sys.platform == 'win32':
+            import msvcrt  # pylint: disable=import-error
+
+            lock_file.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:  # LK_LOCK gives up after 10 seconds
+                    pass
+            try:
+                yield
+            finally:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+# the index of the cache directory records the version, size, and time of last
+# use of the downloaded jars (the latter is updated on download, and then at
+# most once per process and once per day per jar)
+_index_version = 1
+_index_resolution = 24 * 3600
+_recorded_uses = set()
+
+
+def _read_index(cache_dir=None):
+    """
+    Read the index of the cache directory.
+
+    :return: The index (empty if missing or unreadable).
+    """
+    try:
+        with open(join(cache_dir or _cache_dir(), 'index.json'), mode='r') as f:
+            import json
+
+            index = json.load(f)
+        if index.get('version') == _index_version and isinstance(index.get('jars'), dict):
+            return index
+    except (OSError, ValueError, AttributeError):
+        pass
+    return {'version': _index_version, 'jars': {}}
+
+
+@contextlib.contextmanager
+def _update_index(cache_dir=None):
+    """
+    Update the index of the cache directory (while holding its lock). The
+    index is written when the context exits without an exception.
+    """
+    import json
+
+    path = join(cache_dir or _cache_dir(), 'index.json')
+    makedirs(dirname(path), exist_ok=True)
+    with _file_lock(path):
+        index = _read_index(dirname(path))
+        yield index
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, mode='w') as f:
+            json.dump(index, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, path)
+
+
+def _record_use(path, version, *, downloaded=False):
+    """
+    Record the use of a jar in the index of the cache directory (if the jar is
+    in there). Uses of jars already available are recorded at most once a day,
+    judged by the modification time of the stamp of the jar (which is touched
+    when the use is recorded), so that lazy lookups cost a file stat only.
+    Failures are ignored, as the index is informational only.
+    """
+    if path in _recorded_uses and not downloaded:
+        return
+    _recorded_uses.add(path)
+    cache_dir = _cache_dir()
+    if dirname(abspath(path)) != abspath(cache_dir):
+        return
+
+    now = time.time()
+    try:
+        if not downloaded:
+            stamp_path = f'{path}.sha256'
+            if now - os.stat(stamp_path).st_mtime < _index_resolution:
+                return
+            os.utime(stamp_path)
+        with _update_index(cache_dir) as index:
+            index['jars'][basename(path)] = {'version': version, 'size': getsize(path), 'last_used': now}
+    except OSError:
+        pass
+
+
+def download(version=None, path=None, *, force=False, lazy=False, progress=None, sha256=None,  # pylint: disable=too-many-arguments,too-many-locals
+             retries=3, backoff=1.0, timeout=60, mirrors=None, offline=None):
     """
     Download the ANTLR v4 tool jar. (Raises :exc:`OSError` if jar is already
     available, unless ``lazy`` is ``True``.)
 
+    Downloaded jars are verified against ``sha256``, if given, or against the
+    digest published by the (Maven repository) mirror, if any (raising
+    :exc:`OSError` on mismatch), or for a valid zip structure, otherwise. Jars
+    already available at path are verified in lazy mode, and are downloaded
+    again if found corrupted. Verification results are cached in a
+    ``.sha256`` sidecar file, thus checking an unchanged jar costs a file stat
+    only.
+
+    The jar is downloaded from the first mirror that can serve it (in the
+    order given). Failed transfers are retried with exponential backoff.
+    Interrupted transfers are kept in a ``.part`` file next to the jar
+    (specific to the URL of the transfer) and are continued with HTTP range
+    requests, by retries and by later calls alike.
+
     :param str version: The version of ANTLR v4 tool jar to download. If
         ``None``, it defaults to the version of the installed antlr4 runtime
         package (unless the package is not installed, in which case a
@@ -55,44 +585,175 @@ def download(version=None, path=None, *, force=False, lazy=False):
     :param bool force: Force download even if jar already exists at path.
     :param bool lazy: Don't report an error if jar already exists at path and
         don't try to download it either.
+    :param progress: Callable to report the progress of the download to. It is
+        called with the number of bytes downloaded so far and the total size of
+        the jar (or ``None`` if unknown).
+    :param str sha256: Expected SHA-256 digest of the jar (hexadecimal).
+    :param int retries: Number of times to retry a failed transfer.
+    :param float backoff: Seconds to wait before the first retry (doubled for
+        every further retry).
+    :param float timeout: Timeout of blocking network operations in seconds
+        (``None`` for no timeout).
+    :param mirrors: Mirrors to download the jar from (see above for the
+        supported forms). If ``None``, it defaults to the mirrors listed in the
+        ``ANTLERINATOR_MIRRORS`` environment variable, or to Maven Central and
+        the official ANTLR download site.
+    :type mirrors: list(str) or str
+    :param bool offline: Use local (``file:``) mirrors only, and don't retry.
+        If ``None``, it defaults to the value of the ``ANTLERINATOR_OFFLINE``
+        environment variable.
     :return: Path to the downloaded jar.
     """
 
-    default_tool_path = default_antlr_jar_path(version)
-    tool_path = path or default_tool_path
-    tool_url = f'https://www.antlr.org/download/{basename(default_tool_path)}'
+    version = _required_version(version)
+    tool_path = path or default_antlr_jar_path(version)
 
-    if exists(tool_path):
-        if lazy:
-            return tool_path
-        if not force:
-            raise OSError(errno.EEXIST, 'file already exists', tool_path)
+    def check_exists():
+        if exists(tool_path):
+            if lazy:
+                return _verify_jar(tool_path, sha256)
+            if not force:
+                raise OSError(errno.EEXIST, 'file already exists', tool_path)
+        return False
 
-    ssl_context = ssl.create_default_context(purpose=ssl.Purpose.SERVER_AUTH)
-    with contextlib.closing(urlopen(tool_url, context=ssl_context)) as response:
-        tool_bytes = response.read()
+    # NOTE: jars are moved into place only when complete, so finding one
+    # without holding the lock is safe
+    if check_exists():
+        _record_use(tool_path, version)
+        return tool_path
 
-    tool_dir = dirname(tool_path)
+    tool_dir = dirname(tool_path) or os.curdir
     makedirs(tool_dir, exist_ok=True)
 
-    with open(tool_path, mode='wb') as tool_file:
-        tool_file.write(tool_bytes)
+    # only one process downloads at a time, the others wait and (if lazy)
+    # reuse its result
+    with _file_lock(tool_path):
+        if check_exists():
+            _record_use(tool_path, version)
+            return tool_path
+
+        import http.client
+
+        # stream the jar into a partial file next to its final path and move
+        # it into place only when complete, so that no partial jar is ever
+        # visible
+        mirrors = _mirrors(mirrors)
+        if _is_offline(offline):
+            mirrors = [m for m in mirrors if _mirror_url(m, version).startswith('file:')]
+            retries = 0
+            if not mirrors:
+                raise OSError(errno.ENETUNREACH, 'offline mode and no local mirror configured', tool_path)
+
+        hashers, published = None, None
+        for attempt in range(retries + 1):
+            errors = []
+            for mirror in mirrors:
+                tool_url = _mirror_url(mirror, version)
+                part_path = _part_path(tool_path, tool_url)
+                try:
+                    hashers = _fetch(tool_url, part_path, progress=progress, timeout=timeout)
+                except (OSError, http.client.HTTPException) as e:
+                    errors.append(e)
+                    continue
+                published = None if sha256 else _published_digest(mirror, tool_url, timeout=timeout)
+                break
+            if hashers:
+                break
+            if attempt == retries or not any(_is_transient(e) for e in errors):
+                raise errors[0]
+            time.sleep(backoff * 2 ** attempt)
 
+        _check_part(part_path, tool_url, hashers, ('sha256', sha256.lower()) if sha256 else published)
+        os.replace(part_path, tool_path)
+        _write_stamp(tool_path, hashers['sha256'].hexdigest())
+
+        # partial downloads from other URLs (other versions or mirrors) are
+        # obsolete now
+        import glob
+
+        for stale_path in glob.glob(f'{glob.escape(tool_path)}.*.part'):
+            with contextlib.suppress(OSError):
+                os.remove(stale_path)
+
+    _record_use(tool_path, version, downloaded=True)
     return tool_path
 
 
+def download_all(versions, *, jobs=None, **kwargs):
+    """
+    Download multiple versions of the ANTLR v4 tool jar concurrently (each to
+    its default path).
+
+    :param versions: The versions of ANTLR v4 tool jar to download.
+    :type versions: list(str)
+    :param int jobs: Maximum number of concurrent downloads. If ``None``, all
+        versions are downloaded concurrently.
+    :param kwargs: Further keyword arguments of :func:`download` (except for
+        ``version`` and ``path``).
+    :return: Paths to the downloaded jars (in the order of ``versions``).
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    unique_versions = list(dict.fromkeys(versions))
+    with ThreadPoolExecutor(max_workers=jobs or max(len(unique_versions), 1)) as executor:
+        paths = dict(zip(unique_versions, executor.map(lambda version: download(version, **kwargs), unique_versions)))
+    return [paths[version] for version in versions]
+
+
+async def download_async(version=None, path=None, **kwargs):
+    """
+    Coroutine variant of :func:`download` that runs the download in a worker
+    thread, so that the event loop is not blocked. Locking and caching work
+    the same as with :func:`download` (concurrent downloads of the same jar
+    are serialized, and lazy mode reuses already available jars).
+
+    :param str version: The version of ANTLR v4 tool jar to download.
+    :param str path: Path to save the downloaded jar to.
+    :param kwargs: Further keyword arguments of :func:`download`.
+    :return: Path to the downloaded jar.
+    """
+    import asyncio
+
+    return await asyncio.to_thread(download, version, path, **kwargs)
+
+
+def _progress_bar(file=None, width=40):
+    """
+    Create a progress callback for :func:`download` that draws a textual
+    progress bar (to stderr by default).
+    """
+    file = file or sys.stderr
+
+    def progress(downloaded, total):
+        if total:
+            done = width * downloaded // total
+            file.write(f'\r[{"#" * done}{" " * (width - done)}] {100 * downloaded // total:3d}% {downloaded / 1e6:.1f}/{total / 1e6:.1f} MB')
+        else:
+            file.write(f'\r{downloaded / 1e6:.1f} MB')
+        if total is not None and downloaded >= total:
+            file.write('\n')
+        file.flush()
+
+    return progress
+
+
 def execute():
     """
     Entry point of the download helper tool that eases getting the right
     version of the ANTLR v4 tool jar.
     """
+    from argparse import ArgumentParser, BooleanOptionalAction
+
+    import inators.arg
+
+    antlr_version = _antlr_version()
 
     arg_parser = ArgumentParser(description='Download helper tool to get the right version of the ANTLR v4 tool jar.')
 
-    arg_parser.add_argument('--antlr-version', metavar='VERSION', default=__antlr_version__,
-                            help='version of ANTLR v4 tool jar to download (default: %(default)s)')
+    arg_parser.add_argument('--antlr-version', metavar='VERSION', nargs='+', default=[antlr_version],
+                            help=f'version(s) of ANTLR v4 tool jar to download, multiple versions are downloaded concurrently (default: {antlr_version})')
     arg_parser.add_argument('--output', metavar='FILE', default=None,
-                            help=f'path to save the downloaded jar to (default: {default_antlr_jar_path("VERSION").replace(expanduser("~"), "~")})')
+                            help=f'path to save the downloaded jar to, if a single version is downloaded (default: {default_antlr_jar_path("VERSION").replace(expanduser("~"), "~")})')
 
     mode_group = arg_parser.add_mutually_exclusive_group()
     mode_group.add_argument('--force', action='store_true', default=False,
@@ -100,8 +761,39 @@ def execute():
     mode_group.add_argument('--lazy', action='store_true', default=False,
                             help='don\'t report an error if jar already exists at the output path and don\'t try to download it either')
 
-    inators.arg.add_version_argument(arg_parser, version=__version__)
+    arg_parser.add_argument('--sha256', metavar='DIGEST', default=None,
+                            help='expected SHA-256 digest of the jar (default: the digest published by the mirror, if any)')
+    arg_parser.add_argument('--retries', metavar='N', type=int, default=3,
+                            help='number of times to retry a failed transfer (default: %(default)s)')
+    arg_parser.add_argument('--backoff', metavar='SEC', type=float, default=1.0,
+                            help='seconds to wait before the first retry, doubled for every further retry (default: %(default)s)')
+    arg_parser.add_argument('--timeout', metavar='SEC', type=float, default=60,
+                            help='timeout of network operations (default: %(default)s)')
+    arg_parser.add_argument('--mirror', metavar='URL', dest='mirrors', action='append', default=None,
+                            help=f'mirror to download the jar from (may be given multiple times; default: $ANTLERINATOR_MIRRORS or {" ".join(default_antlr_mirrors)})')
+    arg_parser.add_argument('--offline', action='store_true', default=None,
+                            help='use local (file:) mirrors only (default: $ANTLERINATOR_OFFLINE)')
+    arg_parser.add_argument('--progress', action=BooleanOptionalAction, default=sys.stderr.isatty(),
+                            help='show a progress bar during download (default: if stderr is a terminal)')
+
+    inators.arg.add_version_argument(arg_parser, version=_version())
 
     args = arg_parser.parse_args()
 
-    download(version=args.antlr_version, path=args.output, force=args.force, lazy=args.lazy)
+    kwargs = {
+        'force': args.force,
+        'lazy': args.lazy,
+        'retries': args.retries,
+        'backoff': args.backoff,
+        'timeout': args.timeout,
+        'mirrors': args.mirrors,
+        'offline': args.offline,
+    }
+
+    if len(args.antlr_version) == 1:
+        download(version=args.antlr_version[0], path=args.output, progress=_progress_bar() if args.progress else None,
+                 sha256=args.sha256, **kwargs)
+    else:
+        if args.output or args.sha256:
+            arg_parser.error('--output and --sha256 cannot be used with multiple versions')
+        download_all(args.antlr_version, **kwargs)
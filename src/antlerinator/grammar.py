@@ -0,0 +1,311 @@
+# Copyright (c) 2025 Renata Hodovan, Akos Kiss.
+#
+# Licensed under the BSD 3-Clause License
+# <LICENSE.rst or https://opensource.org/licenses/BSD-3-Clause>.
+# This file may not be copied, modified, or distributed except
+# according to those terms.
+
+import heapq
+import os
+import re
+
+from os.path import abspath, dirname, isfile, join, normcase, normpath
+
+
+# tokens of grammar headers (and of the actions in them); comments, strings,
+# and identifiers running to the end of the buffer may be incomplete
+_token_re = re.compile(r'''
+    \s+
+    | //[^\n]*
+    | /\*(?:.*?\*/|.*)
+    | (?P<id>\w+)
+    | (?P<str>'(?:\\.|[^'\\\n])*'?|"(?:\\.|[^"\\\n])*"?)
+    | (?P<punct>::|.)
+''', re.VERBOSE | re.DOTALL)
+
+
+class GrammarInfo:
+    """
+    Information extracted from the header of an ANTLR v4 grammar file.
+
+    :ivar str path: Path to the grammar file.
+    :ivar str type: ``'lexer'``, ``'parser'``, or ``'combined'``.
+    :ivar str name: Name of the grammar.
+    :ivar list(str) imports: Names of the imported grammars.
+    :ivar str token_vocab: Value of the ``tokenVocab`` option (or ``None``).
+    """
+
+    def __init__(self, path, type, name, imports, token_vocab):
+        self.path = path
+        self.type = type
+        self.name = name
+        self.imports = imports
+        self.token_vocab = token_vocab
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.path!r}, {self.type!r}, {self.name!r}, {self.imports!r}, {self.token_vocab!r})'
+
+
+def _tokens(f, chunk_size=16 * 1024):
+    """
+    Split the contents of a file into tokens (skipping whitespace and
+    comments), reading the file lazily in chunks.
+
+    :return: Pairs of token kind (``'id'``, ``'str'``, or ``'punct'``) and text.
+    """
+    buf, pos, eof = '', 0, False
+    while True:
+        m = _token_re.match(buf, pos)
+        if (not m or m.end() == len(buf)) and not eof:
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buf, pos = buf[pos:] + chunk, 0
+            continue
+        if not m:
+            return
+        pos = m.end()
+        if m.lastgroup:
+            yield m.lastgroup, m.group()
+
+
+def _skip_block(tokens):
+    """
+    Skip the tokens of a block up to (and including) the closing brace
+    matching an already consumed opening brace.
+    """
+    depth = 1
+    for _, text in tokens:
+        if text == '{':
+            depth += 1
+        elif text == '}':
+            depth -= 1
+            if depth == 0:
+                return
+
+
+def _options(tokens):
+    """
+    Parse the contents of an ``options { ... }`` block (after the opening
+    brace).
+    """
+    options = {}
+    name, value = None, []
+    for kind, text in tokens:
+        if text == '}':
+            break
+        if text == '{':
+            _skip_block(tokens)
+        elif text == '=' and name is None and value:
+            name, value = value[0], []
+        elif text == ';':
+            if name is not None:
+                options[name] = ''.join(value)
+            name, value = None, []
+        else:
+            value.append(text[1:-1] if kind == 'str' else text)
+    return options
+
+
+def _scan_header(path, tokens):
+    tokens = iter(tokens)
+    _, text = next(tokens, (None, None))
+    grammar_type = 'combined'
+    if text in ('lexer', 'parser'):
+        grammar_type = text
+        _, text = next(tokens, (None, None))
+    kind, name = next(tokens, (None, None))
+    if text != 'grammar' or kind != 'id' or next(tokens, (None, None))[1] != ';':
+        return None
+
+    imports, token_vocab = [], None
+    for kind, text in tokens:
+        if text == 'options' and next(tokens, (None, None))[1] == '{':
+            token_vocab = _options(tokens).get('tokenVocab', token_vocab)
+        elif text == 'import':
+            # import A, B = C; (where B is a label of grammar C)
+            label = False
+            for kind, text in tokens:
+                if text == ';':
+                    break
+                if kind == 'id':
+                    if label:
+                        imports[-1] = text
+                    else:
+                        imports.append(text)
+                label = text == '='
+        elif text in ('tokens', 'channels') and next(tokens, (None, None))[1] == '{':
+            _skip_block(tokens)
+        elif text == '@':
+            # named action: @name { ... } or @target::name { ... }
+            for kind, text in tokens:
+                if text == '{':
+                    _skip_block(tokens)
+                    break
+        else:
+            # the first rule ends the header
+            break
+    return GrammarInfo(path=path, type=grammar_type, name=name, imports=imports, token_vocab=token_vocab)
+
+
+def scan_grammar(path):
+    """
+    Scan the header of an ANTLR v4 grammar file for its type, name, imports,
+    and ``tokenVocab`` option. The file is read lazily and scanning stops at
+    the first rule, so the size of the grammar does not matter.
+
+    :param str path: Path to the grammar file.
+    :return: The information extracted from the grammar, or ``None`` if the
+        file could not be read or does not look like a grammar.
+    :rtype: GrammarInfo
+    """
+    try:
+        with open(path, encoding='utf-8', errors='replace') as f:
+            return _scan_header(path, _tokens(f))
+    except OSError:
+        return None
+
+
+def _norm_path(path):
+    return normcase(normpath(abspath(path)))
+
+
+class GrammarGraph:
+    """
+    Dependency graph of ANTLR v4 grammar files. A grammar depends on the
+    grammars it imports and on the grammars whose tokens it uses (via the
+    ``tokenVocab`` option). Grammars are identified by their normalized
+    absolute paths.
+    """
+
+    def __init__(self):
+        self._infos = {}
+        self._imports = {}
+        self._names = None
+
+    def add(self, path, lib_dir=None):
+        """
+        Scan a grammar file and the grammars it imports (transitively), and
+        add them to the graph. Imported grammars are looked up in the directory
+        of the importing grammar and in ``lib_dir``. Grammars already in the
+        graph are not scanned again.
+
+        :param str path: Path to the grammar file.
+        :param str lib_dir: Directory of imported grammars (as given to the
+            ``-lib`` option of the tool).
+        :return: The information extracted from the grammar, or ``None`` if
+            the file could not be read or does not look like a grammar.
+        :rtype: GrammarInfo
+        """
+        key = _norm_path(path)
+        if key in self._infos:
+            return self._infos[key]
+
+        info = self._infos[key] = scan_grammar(path)
+        self._imports[key] = []
+        self._names = None
+        for name in info.imports if info else []:
+            for d in [dirname(path) or os.curdir] + ([lib_dir] if lib_dir else []):
+                imported = join(d, f'{name}.g4')
+                if isfile(imported):
+                    self._imports[key].append(_norm_path(imported))
+                    self.add(imported, lib_dir)
+                    break
+        return info
+
+    def info(self, path):
+        """
+        Get the information extracted from a grammar in the graph (or ``None``).
+        """
+        return self._infos.get(_norm_path(path))
+
+    def __iter__(self):
+        return iter(self._infos)
+
+    def __len__(self):
+        return len(self._infos)
+
+    def dependencies(self, path):
+        """
+        Get the direct dependencies of a grammar: the grammars it imports and
+        the grammars of the graph named by its ``tokenVocab`` option.
+
+        :rtype: list(str)
+        """
+        key = _norm_path(path)
+        info = self._infos.get(key)
+        if self._names is None:
+            self._names = {}
+            for k, i in self._infos.items():
+                if i:
+                    self._names.setdefault(i.name, []).append(k)
+        vocab = self._names.get(info.token_vocab, []) if info and info.token_vocab else []
+        return list(dict.fromkeys(self._imports.get(key, []) + [k for k in vocab if k != key]))
+
+    def imports(self, paths):
+        """
+        Collect the grammars imported by the given grammars, transitively (in
+        breadth-first order, excluding the given grammars themselves).
+
+        :rtype: list(str)
+        """
+        roots = [_norm_path(p) for p in paths]
+        result = {}
+        queue = list(roots)
+        while queue:
+            for key in self._imports.get(queue.pop(0), []):
+                if key not in result and key not in roots:
+                    result[key] = None
+                    queue.append(key)
+        return list(result)
+
+    def dependents(self, paths):
+        """
+        Select the grammars that (transitively) depend on any of the given
+        files, i.e., that have to be rebuilt if those files change. The
+        result contains the given files themselves, too.
+
+        :rtype: set(str)
+        """
+        reverse = {}
+        for key in self._infos:
+            for dep in self.dependencies(key):
+                reverse.setdefault(dep, []).append(key)
+
+        result = {_norm_path(p) for p in paths}
+        queue = list(result)
+        while queue:
+            for key in reverse.get(queue.pop(), []):
+                if key not in result:
+                    result.add(key)
+                    queue.append(key)
+        return result
+
+    def topological_order(self):
+        """
+        Order the grammars of the graph so that every grammar comes after its
+        dependencies. Unrelated grammars keep the order in which they were
+        added, and grammars in dependency cycles are placed at the end (in the
+        order they were added).
+
+        :rtype: list(str)
+        """
+        keys = list(self._infos)
+        index = {key: i for i, key in enumerate(keys)}
+        dependents = [[] for _ in keys]
+        indegree = [0] * len(keys)
+        for i, key in enumerate(keys):
+            for dep in self.dependencies(key):
+                dependents[index[dep]].append(i)
+                indegree[i] += 1
+
+        ready = [i for i in range(len(keys)) if indegree[i] == 0]
+        order = []
+        while ready:
+            i = heapq.heappop(ready)
+            order.append(i)
+            for j in dependents[i]:
+                indegree[j] -= 1
+                if indegree[j] == 0:
+                    heapq.heappush(ready, j)
+        ordered = set(order)
+        return [keys[i] for i in order] + [key for i, key in enumerate(keys) if i not in ordered]
@@ -0,0 +1,210 @@
+# Copyright (c) 2025 Renata Hodovan, Akos Kiss.
+#
+# Licensed under the BSD 3-Clause License
+# <LICENSE.rst or https://opensource.org/licenses/BSD-3-Clause>.
+# This file may not be copied, modified, or distributed except
+# according to those terms.
+
+import os
+import select
+import struct
+import sys
+import time
+
+from os.path import dirname
+
+from .download import _file_stamp
+from .grammar import _norm_path
+
+
+class _Inotify:
+    """
+    Minimal ctypes binding of the Linux inotify API, watching directories for
+    files being written, created, moved, or deleted.
+    """
+
+    _event = struct.Struct('iIII')
+    _mask = 0x2 | 0x8 | 0x40 | 0x80 | 0x100 | 0x200  # IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    _flags = 0o4000 | 0o2000000  # IN_NONBLOCK | IN_CLOEXEC
+
+    def __init__(self):
+        import ctypes  # pylint: disable=import-outside-toplevel
+        import ctypes.util  # pylint: disable=import-outside-toplevel
+
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._fd = self._libc.inotify_init1(self._flags)
+        if self._fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        self._dirs = {}
+
+    def add_dir(self, path):
+        """
+        Start watching a directory.
+
+        :return: Whether the directory could be watched (e.g., it exists).
+        """
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), self._mask)
+        if wd < 0:
+            return False
+        self._dirs[wd] = path
+        return True
+
+    def read(self, timeout):
+        """
+        Wait for events for at most ``timeout`` seconds.
+
+        :return: The paths of the files affected by the events.
+        """
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        paths = []
+        offset = 0
+        while offset < len(data):
+            wd, _, _, length = self._event.unpack_from(data, offset)
+            offset += self._event.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if wd in self._dirs and name:
+                paths.append(os.path.join(self._dirs[wd], os.fsdecode(name)))
+        return paths
+
+    def close(self):
+        os.close(self._fd)
+
+
+class Watcher:
+    """
+    Watcher of files for changes. On Linux, the directories of the files are
+    watched with inotify (so that files replaced by editors via renaming are
+    followed, too), elsewhere (or if inotify is unavailable) the files are
+    polled. Files in directories that cannot be watched with inotify (e.g.,
+    because they do not exist yet) are polled, too.
+
+    :param paths: The files to watch (which may not exist yet).
+    :type paths: list(str)
+    :param float poll_interval: Seconds between two checks when polling.
+    :param bool polling: Force polling even if inotify is available.
+    """
+
+    def __init__(self, paths, *, poll_interval=0.5, polling=False):
+        self.poll_interval = poll_interval
+        self._inotify = None
+        if not polling and sys.platform.startswith('linux'):
+            try:
+                self._inotify = _Inotify()
+            except (OSError, AttributeError):
+                pass
+        self._paths = set()
+        self._dirs = set()
+        self._polled = set()
+        self._stamps = {}
+        self.update(paths)
+
+    def update(self, paths):
+        """
+        Replace the set of watched files. Changes of files that remain watched
+        are not lost, even if they happened before the update.
+        """
+        self._paths = {_norm_path(p) for p in paths}
+        self._stamps = {p: self._stamps[p] if p in self._stamps else _file_stamp(p) for p in self._paths}
+        self._polled = self._paths
+        if self._inotify:
+            for d in {dirname(p) for p in self._paths} - self._dirs:
+                if self._inotify.add_dir(d):
+                    self._dirs.add(d)
+            self._polled = {p for p in self._paths if dirname(p) not in self._dirs}
+
+    def _poll(self):
+        changed = set()
+        for p in self._polled:
+            stamp = _file_stamp(p)
+            if stamp != self._stamps[p]:
+                self._stamps[p] = stamp
+                changed.add(p)
+        return changed
+
+    def _changes(self, timeout):
+        if self._inotify:
+            if self._polled and timeout:
+                timeout = min(timeout, self.poll_interval)
+            changed = {p for p in map(_norm_path, self._inotify.read(timeout)) if p in self._paths}
+            return changed | self._poll()
+        changed = self._poll()
+        if not changed and timeout:
+            time.sleep(min(timeout, self.poll_interval))
+            changed = self._poll()
+        return changed
+
+    def wait(self, *, debounce=0.2, timeout=None):
+        """
+        Wait until some of the watched files change, and then until no further
+        changes happen for ``debounce`` seconds (so that a burst of saves
+        results in a single notification).
+
+        :param float debounce: Quiet period in seconds.
+        :param float timeout: Maximum seconds to wait for the first change
+            (forever if ``None``).
+        :return: The (normalized absolute) paths of the changed files (empty if
+            timed out).
+        :rtype: set(str)
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        changed = set()
+        while not changed:
+            remaining = deadline - time.monotonic() if deadline is not None else self.poll_interval
+            if remaining <= 0:
+                return changed
+            changed = self._changes(min(remaining, self.poll_interval))
+
+        quiet_since = time.monotonic()
+        while time.monotonic() - quiet_since < debounce:
+            more = self._changes(max(debounce - (time.monotonic() - quiet_since), 0))
+            if more:
+                changed |= more
+                quiet_since = time.monotonic()
+        return changed
+
+    def close(self):
+        if self._inotify:
+            self._inotify.close()
+            self._inotify = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def watch(paths, callback, *, debounce=0.2, poll_interval=0.5, polling=False):
+    """
+    Watch files and call ``callback`` with the set of changed files after every
+    burst of changes. Runs until ``callback`` returns ``False`` or a
+    :exc:`KeyboardInterrupt` is raised. If ``callback`` returns a list of
+    paths, that becomes the new set of watched files.
+
+    :param paths: The files to watch.
+    :type paths: list(str)
+    :param callback: Function to call with the set of changed paths (as
+        normalized absolute paths).
+    :param float debounce: Seconds without changes after which a burst of
+        changes is considered finished.
+    :param float poll_interval: Seconds between two checks when polling.
+    :param bool polling: Force polling even if inotify is available.
+    """
+    with Watcher(paths, poll_interval=poll_interval, polling=polling) as watcher:
+        try:
+            while True:
+                result = callback(watcher.wait(debounce=debounce))
+                if result is False:
+                    return
+                if result is not None:
+                    watcher.update(result)
+        except KeyboardInterrupt:
+            pass
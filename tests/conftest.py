@@ -0,0 +1,42 @@
+# Copyright (c) 2025 Renata Hodovan, Akos Kiss.
+#
+# Licensed under the BSD 3-Clause License
+# <LICENSE.rst or https://opensource.org/licenses/BSD-3-Clause>.
+# This file may not be copied, modified, or distributed except
+# according to those terms.
+
+import importlib
+
+import pytest
+
+from fake_antlr import JarServer
+
+
+# NOTE: antlerinator.download is shadowed by the function of the same name
+download_module = importlib.import_module('antlerinator.download')
+
+
+@pytest.fixture
+def jar_server(monkeypatch):
+    """
+    Start a local stand-in of the ANTLR download site and make
+    :func:`antlerinator.download` use it (as the only mirror).
+    """
+    server = JarServer().start()
+    monkeypatch.setenv('ANTLERINATOR_MIRRORS', server.url)
+    monkeypatch.delenv('ANTLERINATOR_OFFLINE', raising=False)
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def lexer_module(tmpdir):
+    """
+    Copy a lexer module generated by the ANTLR v4 tool (the one shipped with
+    the antlr4 runtime) and return its path.
+    """
+    xpath_lexer = pytest.importorskip('antlr4.xpath.XPathLexer')
+    path = tmpdir.join('XPathLexer.py')
+    with open(xpath_lexer.__file__) as f:
+        path.write(f.read())
+    return str(path)
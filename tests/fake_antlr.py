@@ -0,0 +1,137 @@
+# Copyright (c) 2025 Renata Hodovan, Akos Kiss.
+#
+# Licensed under the BSD 3-Clause License
+# <LICENSE.rst or https://opensource.org/licenses/BSD-3-Clause>.
+# This file may not be copied, modified, or distributed except
+# according to those terms.
+
+# Stand-ins of the ANTLR download site, of the ANTLR tool jars, and of the java
+# VM, shared by the tests and the benchmarks.
+
+import io
+import os
+import random
+import re
+import sys
+import threading
+import time
+import zipfile
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from os.path import abspath, dirname, join
+
+
+resources_dir = join(dirname(abspath(__file__)), 'resources')
+
+
+def fake_jar(version, size=300 * 1024):
+    """
+    Create the (deterministic) content of a fake ANTLR tool jar of about
+    ``size`` bytes.
+    """
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as jar:
+        jar.writestr(zipfile.ZipInfo('META-INF/MANIFEST.MF'), f'Manifest-Version: 1.0\nImplementation-Version: {version}\n')
+        jar.writestr(zipfile.ZipInfo('payload.bin'), random.Random(version).randbytes(size))
+    return buffer.getvalue()
+
+
+class JarServer(ThreadingHTTPServer):
+    """
+    Local stand-in of the ANTLR download site serving fake tool jars.
+
+    :ivar list(str) requests: Paths of the requests received.
+    :ivar list(str) ranges: Range headers of the requests received.
+    :ivar float delay: Seconds to wait before responding.
+    :ivar list(int) drops: Number of body bytes after which to drop the
+        connection, for the next requests (one element consumed per request).
+    """
+
+    daemon_threads = True
+
+    def __init__(self, jar_size=300 * 1024):
+        super().__init__(('127.0.0.1', 0), JarRequestHandler)
+        self.jar_size = jar_size
+        self.requests = []
+        self.ranges = []
+        self.delay = 0
+        self.drops = []
+        self._jars = {}
+        self._thread = None
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}/'
+
+    def jar(self, version):
+        """
+        Get the content of the fake tool jar of a version (created only once).
+        """
+        if version not in self._jars:
+            self._jars[version] = fake_jar(version, self.jar_size)
+        return self._jars[version]
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class JarRequestHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        time.sleep(self.server.delay)
+        m = re.fullmatch(r'/antlr-(.+)-complete\.jar', self.path)
+        if not m:
+            self.send_error(404)
+            return
+
+        content = self.server.jar(m.group(1))
+        range_header = self.headers.get('Range')
+        self.server.ranges.append(range_header)
+        start = int(re.fullmatch(r'bytes=(\d+)-', range_header).group(1)) if range_header else 0
+        if start >= len(content) and start:
+            self.send_error(416)
+            return
+
+        self.send_response(206 if start else 200)
+        self.send_header('Content-Type', 'application/java-archive')
+        self.send_header('Content-Length', str(len(content) - start))
+        if start:
+            self.send_header('Content-Range', f'bytes {start}-{len(content) - 1}/{len(content)}')
+        self.end_headers()
+
+        drop = self.server.drops.pop(0) if self.server.drops else None
+        if drop is not None:
+            self.wfile.write(content[start:start + drop])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(content[start:])
+
+    def log_message(self, format, *args):
+        pass
+
+
+def mock_antlr_java(directory):
+    """
+    Create a script that can act as the java VM but runs the mock ANTLR tool
+    (``resources/mock_antlr.py``) with the current Python interpreter.
+
+    :return: The path of the script.
+    """
+    if sys.platform.startswith('win32'):
+        script = join(str(directory), 'mock_antlr.bat')
+        content = f'@"{sys.executable}" "{join(resources_dir, "mock_antlr.py")}" %*\n'
+    else:
+        script = join(str(directory), 'mock_antlr.sh')
+        content = f'#!/bin/sh\nexec "{sys.executable}" "{join(resources_dir, "mock_antlr.py")}" "$@"\n'
+    with open(script, 'w') as f:
+        f.write(content)
+    os.chmod(script, 0o755)
+    return script
@@ -0,0 +1,84 @@
+# Copyright (c) 2025 Renata Hodovan, Akos Kiss.
+#
+# Licensed under the BSD 3-Clause License
+# <LICENSE.rst or https://opensource.org/licenses/BSD-3-Clause>.
+# This file may not be copied, modified, or distributed except
+# according to those terms.
+
+# Mock of the java executable running the ANTLR v4 tool. It logs its command
+# line (and the time of its start and end) to mock_antlr_output.txt in the
+# current working directory and writes dummy lexer/parser files for every
+# grammar on the command line (or copies of the module named by the
+# MOCK_ANTLR_MODULE environment variable). Grammars named Fail* make the mock
+# fail. It also mimics 'java -version' and the creation of AppCDS archives.
+# Started in any other mode (e.g., as the ANTLR tool daemon), it fails after
+# sleeping for MOCK_ANTLR_DAEMON_SLEEP seconds.
+
+import os
+import re
+import sys
+import time
+
+args = sys.argv[1:]
+if args == ['-version']:
+    print('mock version "17.0.0"', file=sys.stderr)
+    sys.exit(0)
+if '-jar' not in args:
+    time.sleep(float(os.environ.get('MOCK_ANTLR_DAEMON_SLEEP', '0')))
+    sys.exit('mock_antlr: only -jar mode is supported')
+jvm_args = args[:args.index('-jar')]
+args = args[args.index('-jar') + 2:]
+
+start = time.time()
+time.sleep(float(os.environ.get('MOCK_ANTLR_SLEEP', '0')))
+
+output_dir = None
+grammars = []
+status = 0
+i = 0
+while i < len(args):
+    if args[i] in ('-o', '-lib', '-encoding', '-message-format', '-package'):
+        if args[i] == '-o':
+            output_dir = args[i + 1]
+        i += 2
+        continue
+    if not args[i].startswith('-'):
+        grammars.append(args[i])
+    i += 1
+
+for grammar in grammars:
+    with open(grammar) as f:
+        src = f.read()
+    m = re.search(r'^\s*(lexer\s+|parser\s+)?grammar\s+(\w+)\s*;', src, re.MULTILINE)
+    kind, name = m.group(1, 2)
+    if name.startswith('Fail'):
+        print(f'error(mock): {grammar}: failing grammar')
+        status = 1
+        continue
+    gen_dir = output_dir if output_dir is not None else os.path.dirname(grammar)
+    if gen_dir:
+        os.makedirs(gen_dir, exist_ok=True)
+    if not kind:
+        names = [f'{name}Lexer', f'{name}Parser']
+    else:
+        names = [name]
+    module = os.environ.get('MOCK_ANTLR_MODULE')
+    for gen_name in names:
+        with open(os.path.join(gen_dir, f'{gen_name}.py'), 'w') as f:
+            f.write(f'# Generated from {grammar} by ANTLR mock\n')
+            if module:
+                with open(module) as m:
+                    f.write(m.read())
+    with open(os.path.join(gen_dir, f'{names[0]}.tokens'), 'w') as f:
+        for i, token in enumerate(re.findall(r'^\s*([A-Z]\w*)\s*:', src, re.MULTILINE)):
+            f.write(f'{token}={i + 1}\n')
+
+for arg in jvm_args:
+    if arg.startswith('-XX:ArchiveClassesAtExit='):
+        with open(arg.split('=', 1)[1], 'w') as f:
+            f.write('mock archive\n')
+
+with open('mock_antlr_output.txt', 'a') as f:
+    f.write(f'{start} {time.time()} {" ".join(sys.argv[1:])}\n')
+
+sys.exit(status)
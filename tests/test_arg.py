@@ -8,6 +8,9 @@
 import argparse
 import pytest
 
+from conftest import download_module
+from fake_antlr import fake_jar
+
 import antlerinator
 
 
@@ -24,3 +27,47 @@ def test_add_antlr_argument(func_args, func_kwargs, sys_argv, exp):
     antlerinator.add_antlr_argument(parser, *func_args, **func_kwargs)
     args = parser.parse_args(sys_argv)
     assert args.antlr == exp
+
+
+def test_process_antlr_argument(tmpdir, monkeypatch):
+    jar_path = str(tmpdir.join('antlr.jar'))
+    with open(jar_path, 'wb') as f:
+        f.write(fake_jar('4.2-fake'))
+    monkeypatch.setenv('ANTLERINATOR_JAR', jar_path)
+    monkeypatch.setattr(download_module, '_antlr_version', lambda: '4.2-fake')
+
+    parser = argparse.ArgumentParser()
+    antlerinator.add_antlr_argument(parser)
+
+    args = parser.parse_args([])
+    antlerinator.process_antlr_argument(args, validate=True)
+    assert args.antlr == jar_path
+
+    args = parser.parse_args(['--antlr', './antlr.jar'])
+    antlerinator.process_antlr_argument(args)
+    assert args.antlr == './antlr.jar'
+
+    monkeypatch.setattr(download_module, '_antlr_version', lambda: '4.1-fake')
+    with pytest.raises(ValueError):
+        antlerinator.process_antlr_argument(parser.parse_args(['--antlr', jar_path]), validate=True)
+
+
+def test_process_antlr_argument_background(tmpdir, monkeypatch):
+    jar_path = str(tmpdir.join('antlr.jar'))
+    with open(jar_path, 'wb') as f:
+        f.write(fake_jar('4.2-fake'))
+    monkeypatch.setenv('ANTLERINATOR_JAR', jar_path)
+    monkeypatch.setattr(download_module, '_antlr_version', lambda: '4.2-fake')
+
+    parser = argparse.ArgumentParser()
+    antlerinator.add_antlr_argument(parser)
+
+    args = parser.parse_args([])
+    future = antlerinator.process_antlr_argument(args, validate=True, background=True)
+    assert future.result(timeout=10) == jar_path
+    assert args.antlr == jar_path
+
+    monkeypatch.setattr(download_module, '_antlr_version', lambda: '4.1-fake')
+    future = antlerinator.process_antlr_argument(parser.parse_args([]), validate=True, background=True)
+    with pytest.raises(ValueError):
+        future.result(timeout=10)
@@ -0,0 +1,84 @@
+# Copyright (c) 2025 Renata Hodovan, Akos Kiss.
+#
+# Licensed under the BSD 3-Clause License
+# <LICENSE.rst or https://opensource.org/licenses/BSD-3-Clause>.
+# This file may not be copied, modified, or distributed except
+# according to those terms.
+
+import importlib.util
+import os
+
+from os.path import isfile
+
+import pytest
+
+antlr4 = pytest.importorskip('antlr4')
+
+from antlr4.atn.ATNDeserializer import ATNDeserializer  # noqa: E402  pylint: disable=wrong-import-position
+from antlr4.xpath import XPathLexer  # noqa: E402  pylint: disable=wrong-import-position
+
+from antlerinator import atn as atn_module  # noqa: E402  pylint: disable=wrong-import-position
+
+
+def import_module(path, name):
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def tokenize(lexer_class, src):
+    return [(t.type, t.text) for t in lexer_class(antlr4.InputStream(src)).getAllTokens()]
+
+
+def test_precompute_atn(lexer_module, monkeypatch):
+    """
+    Test whether ``precompute_atn`` rewrites a generated module to load its
+    precomputed ATN (without deserializing it) and whether the module still
+    works the same.
+    """
+    atn_path = atn_module.precompute_atn(lexer_module)
+    assert atn_path == atn_module.atn_path(lexer_module)
+    assert isfile(atn_path)
+    assert atn_module.precompute_atn(lexer_module) is None
+
+    def deserialize(*args, **kwargs):
+        raise AssertionError('ATN deserialized')
+
+    with monkeypatch.context() as m:
+        m.setattr(ATNDeserializer, 'deserialize', deserialize)
+        module = import_module(lexer_module, 'precomputed_lexer')
+
+    src = '//a/b/*[@x]/!"y"'
+    assert tokenize(module.XPathLexer, src) == tokenize(XPathLexer.XPathLexer, src)
+
+
+@pytest.mark.parametrize('change', ['hash', 'runtime', 'corrupt', 'missing'])
+def test_load_atn_fallback(lexer_module, monkeypatch, change):
+    """
+    Test whether the rewritten module falls back to deserializing its ATN if
+    the precomputed ATN does not match the grammar or the runtime, or cannot
+    be read.
+    """
+    atn_path = atn_module.precompute_atn(lexer_module)
+    if change == 'hash':
+        with open(lexer_module) as f:
+            src = f.read()
+        with open(lexer_module, 'w') as f:
+            f.write(src.replace("serializedATN, '", "serializedATN, '0"))
+    elif change == 'runtime':
+        monkeypatch.setattr(atn_module, '_runtime_version', lambda: '0.0')
+    elif change == 'corrupt':
+        with open(atn_path, 'r+b') as f:
+            f.truncate(100)
+    else:
+        os.remove(atn_path)
+
+    deserialized = []
+    deserialize = ATNDeserializer.deserialize
+    monkeypatch.setattr(ATNDeserializer, 'deserialize', lambda self, data: deserialized.append(data) or deserialize(self, data))
+    module = import_module(lexer_module, f'fallback_lexer_{change}')
+    assert len(deserialized) == 1
+
+    src = '//a/b/*[@x]/!"y"'
+    assert tokenize(module.XPathLexer, src) == tokenize(XPathLexer.XPathLexer, src)
@@ -5,24 +5,36 @@
 # This file may not be copied, modified, or distributed except
 # according to those terms.
 
+# pylint: disable=too-many-lines
+
+import importlib.util
+import json
+import os
+import shutil
+import signal
+import socket
+import subprocess
 import sys
+import time
 
 from os import makedirs
-from os.path import abspath, dirname, isfile, join
+from os.path import dirname, isfile, join
 
 import pytest
 
+from fake_antlr import fake_jar, mock_antlr_java, resources_dir
+
 from setuptools.dist import Distribution
-from setuptools.errors import ModuleError
+from setuptools.errors import ExecError, ModuleError
 
 import antlerinator
+import antlerinator.daemon
 
 
 is_windows = sys.platform.startswith('win32')
 script_ext = '.bat' if is_windows else '.sh'
 
 tested_antlr_version = '4.13.2'
-resources_dir = join(dirname(abspath(__file__)), 'resources')
 
 try:
     Distribution().get_command_class('editable_wheel')
@@ -31,6 +43,17 @@ except ModuleError:
     has_editable_wheel = False
 
 
+def read_mock_antlr_output():
+    with open('mock_antlr_output.txt', 'r') as f:
+        return [line.split(' ', 2) for line in f.read().splitlines()]
+
+
+def write_grammar(path, src):
+    makedirs(dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(src)
+
+
 def test_build_antlr_providers(tmpdir):
     """
     Test whether both the ``antlerinator:`` and the ``file:`` providers work.
@@ -63,6 +86,75 @@ def test_build_antlr_providers(tmpdir):
         assert isfile('BelloParser.py')
 
 
+def test_build_antlr_mirrors(tmpdir, jar_server, monkeypatch):
+    """
+    Test whether the ``antlerinator:`` provider uses the configured mirrors.
+    """
+    monkeypatch.setenv('HOME', str(tmpdir))
+    monkeypatch.setenv('USERPROFILE', str(tmpdir))
+    with tmpdir.as_cwd():
+        write_grammar('A.g4', 'grammar A;\na: \'a\';\n')
+        jar_path = antlerinator.default_antlr_jar_path('4.0-mirror-fake')
+
+        dist = Distribution({
+            'name': 'pkg',
+            'script_name': 'setup.py',
+            'script_args': ['build_antlr'],
+            'options': {
+                'build_antlr': {
+                    'commands': 'antlerinator:4.0-mirror-fake A.g4 -o gen',
+                    'java': mock_antlr_java(tmpdir),
+                    'mirrors': f'http://127.0.0.1:1/missing/ {jar_server.url}',
+                    'staging': False,
+                },
+            },
+        })
+
+        dist.parse_command_line()
+        dist.run_commands()
+
+        assert jar_server.requests == ['/antlr-4.0-mirror-fake-complete.jar']
+        assert read_mock_antlr_output()[0][2] == f'-jar {jar_path} A.g4 -o gen'
+
+
+def test_build_antlr_prefetch(tmpdir, jar_server, monkeypatch):
+    """
+    Test whether ``build_antlr`` can download all tool jars concurrently before
+    running the tool.
+    """
+    monkeypatch.setenv('HOME', str(tmpdir))
+    monkeypatch.setenv('USERPROFILE', str(tmpdir))
+    jar_server.delay = 0.5
+    with tmpdir.as_cwd():
+        write_grammar('A.g4', 'grammar A;\na: \'a\';\n')
+        write_grammar('B.g4', 'grammar B;\nb: \'b\';\n')
+
+        dist = Distribution({
+            'name': 'pkg',
+            'packages': [],
+            'script_name': 'setup.py',
+            'script_args': ['build_antlr', '--prefetch'],
+            'options': {
+                'build_antlr': {
+                    'commands': '''
+                        antlerinator:4.1-fake A.g4 -o a
+                        antlerinator:4.2-fake B.g4 -o b
+                    ''',
+                    'java': mock_antlr_java(tmpdir),
+                },
+            },
+        })
+
+        start = time.monotonic()
+        dist.parse_command_line()
+        dist.run_commands()
+        assert time.monotonic() - start < 1.5
+
+        assert sorted(jar_server.requests) == ['/antlr-4.1-fake-complete.jar', '/antlr-4.2-fake-complete.jar']
+        assert isfile(join('a', 'AParser.py'))
+        assert isfile(join('b', 'BParser.py'))
+
+
 def test_build_antlr_java(tmpdir):
     """
     Test whether ``build_antlr`` can deal with a custom java VM.
@@ -88,6 +180,700 @@ def test_build_antlr_java(tmpdir):
         assert '-jar antlr.jar Dummy.g4' in output
 
 
+def test_build_antlr_jobs(tmpdir, monkeypatch):
+    """
+    Test whether independent commands run in parallel while commands writing to
+    the same output directory are serialized.
+    """
+    monkeypatch.setenv('MOCK_ANTLR_SLEEP', '0.5')
+    with tmpdir.as_cwd():
+        write_grammar('A.g4', 'grammar A;\na: \'a\';\n')
+        write_grammar('B.g4', 'grammar B;\nb: \'b\';\n')
+        write_grammar('C.g4', 'grammar C;\nc: \'c\';\n')
+
+        dist = Distribution({
+            'name': 'pkg',
+            'script_name': 'setup.py',
+            'script_args': ['build_antlr', '--jobs=3', '--no-batch'],
+            'options': {
+                'build_antlr': {
+                    'commands': '''
+                        file:antlr.jar A.g4 -o a
+                        file:antlr.jar B.g4 -o b
+                        file:antlr.jar C.g4 -o a
+                    ''',
+                    'java': mock_antlr_java(tmpdir),
+                },
+            },
+        })
+
+        dist.parse_command_line()
+        dist.run_commands()
+
+        assert isfile(join('a', 'ALexer.py'))
+        assert isfile(join('b', 'BParser.py'))
+        assert isfile(join('a', 'CParser.py'))
+
+        runs = {cmd.split()[2]: (float(start), float(end)) for start, end, cmd in read_mock_antlr_output()}
+        assert runs['A.g4'][0] < runs['B.g4'][1] and runs['B.g4'][0] < runs['A.g4'][1]
+        assert runs['A.g4'][1] <= runs['C.g4'][0]
+
+
+def test_build_antlr_jobs_fail(tmpdir):
+    """
+    Test whether a failing command makes parallel ``build_antlr`` fail and
+    whether commands that depend on it are not run.
+    """
+    with tmpdir.as_cwd():
+        write_grammar('FailLexer.g4', 'lexer grammar FailLexer;\nA: \'a\';\n')
+        write_grammar('FailParser.g4', 'parser grammar FailParser;\noptions { tokenVocab = FailLexer; }\na: A;\n')
+        write_grammar('B.g4', 'grammar B;\nb: \'b\';\n')
+
+        dist = Distribution({
+            'name': 'pkg',
+            'script_name': 'setup.py',
+            'script_args': ['build_antlr', '--jobs=2'],
+            'options': {
+                'build_antlr': {
+                    'commands': '''
+                        file:antlr.jar FailLexer.g4 -o lexer
+                        file:antlr.jar FailParser.g4 -o parser -lib lexer
+                        file:antlr.jar B.g4 -o b
+                    ''',
+                    'java': mock_antlr_java(tmpdir),
+                },
+            },
+        })
+
+        dist.parse_command_line()
+        with pytest.raises(ExecError):
+            dist.run_commands()
+
+        runs = [cmd.split()[2] for _, _, cmd in read_mock_antlr_output()]
+        assert 'FailLexer.g4' in runs
+        assert 'FailParser.g4' not in runs
+
+
+def test_build_antlr_batch(tmpdir):
+    """
+    Test whether commands that differ in their grammar files only are merged
+    into a single ANTLR tool invocation.
+    """
+    with tmpdir.as_cwd():
+        write_grammar('A.g4', 'grammar A;\na: \'a\';\n')
+        write_grammar('B.g4', 'grammar B;\nb: \'b\';\n')
+        write_grammar('C.g4', 'grammar C;\nc: \'c\';\n')
+
+        dist = Distribution({
+            'name': 'pkg',
+            'script_name': 'setup.py',
+            'script_args': ['build_antlr'],
+            'options': {
+                'build_antlr': {
+                    'commands': '''
+                        file:antlr.jar A.g4 -o gen -visitor
+                        file:antlr.jar B.g4 -o gen -no-visitor
+                        file:antlr.jar C.g4 -o gen -visitor
+                    ''',
+                    'java': mock_antlr_java(tmpdir),
+                    'staging': False,
+                },
+            },
+        })
+
+        dist.parse_command_line()
+        dist.run_commands()
+
+        assert sorted(cmd for _, _, cmd in read_mock_antlr_output()) == [
+            '-jar antlr.jar A.g4 -o gen -visitor C.g4',
+            '-jar antlr.jar B.g4 -o gen -no-visitor',
+        ]
+        assert isfile(join('gen', 'CParser.py'))
+
+
+def test_build_antlr_schedule(tmpdir):
+    """
+    Test whether ``build_antlr`` runs commands after the commands generating
+    the tokens files they need, even if listed in a different order.
+    """
+    with tmpdir.as_cwd():
+        write_grammar('AParser.g4', 'parser grammar AParser;\noptions { tokenVocab = ALexer; }\na: A;\n')
+        write_grammar('B.g4', 'grammar B;\nb: \'b\';\n')
+        write_grammar('ALexer.g4', 'lexer grammar ALexer;\nA: \'a\';\n')
+
+        dist = Distribution({
+            'name': 'pkg',
+            'packages': [],
+            'script_name': 'setup.py',
+            'script_args': ['build_antlr', '--jobs=1'],
+            'options': {
+                'build_antlr': {
+                    'commands': '''
+                        file:antlr.jar AParser.g4 -o parser -lib lexer
+                        file:antlr.jar B.g4 -o b
+                        file:antlr.jar ALexer.g4 -o lexer
+                    ''',
+                    'java': mock_antlr_java(tmpdir),
+                },
+            },
+        })
+        dist.parse_command_line()
+        dist.run_commands()
+
+        assert [cmd.split()[2] for _, _, cmd in read_mock_antlr_output()] == ['B.g4', 'ALexer.g4', 'AParser.g4']
+
+
+def test_build_antlr_incremental(tmpdir):
+    """
+    Test whether ``build_antlr`` skips commands whose inputs have not changed
+    and whose outputs still exist.
+    """
+    with tmpdir.as_cwd():
+        write_grammar('ALexer.g4', 'lexer grammar ALexer;\nA: \'a\';\n')
+        write_grammar('AParser.g4', 'parser grammar AParser;\noptions { tokenVocab = ALexer; }\na: A;\n')
+        java = mock_antlr_java(tmpdir)
+
+        def build(*args):
+            dist = Distribution({
+                'name': 'pkg',
+                'packages': [],
+                'script_name': 'setup.py',
+                'script_args': ['build_antlr', *args],
+                'options': {
+                    'build_antlr': {
+                        'commands': '''
+                            file:antlr.jar ALexer.g4 -o lexer
+                            file:antlr.jar AParser.g4 -o parser -lib lexer
+                        ''',
+                        'java': java,
+                    },
+                },
+            })
+            dist.parse_command_line()
+            dist.run_commands()
+            return [cmd.split()[2] for _, _, cmd in read_mock_antlr_output()]
+
+        assert build() == ['ALexer.g4', 'AParser.g4']
+        assert build() == ['ALexer.g4', 'AParser.g4']
+        assert build('--force') == ['ALexer.g4', 'AParser.g4'] * 2
+
+        os.remove(join('parser', 'AParser.py'))
+        assert build()[4:] == ['AParser.g4']
+
+        write_grammar('AParser.g4', 'parser grammar AParser;\noptions { tokenVocab = ALexer; }\na: A A;\n')
+        assert build()[5:] == ['AParser.g4']
+
+        write_grammar('ALexer.g4', 'lexer grammar ALexer;\nA: \'a\';\nB: \'b\';\n')
+        assert build()[6:] == ['ALexer.g4', 'AParser.g4']
+
+        write_grammar(join('parser', 'AParser.py'), '# modified\n')
+        assert build()[8:] == ['AParser.g4']
+
+
+@pytest.mark.parametrize('link', [False, True])
+def test_build_antlr_cache(tmpdir, link):
+    """
+    Test whether ``build_antlr`` restores the outputs of commands from the
+    artifact cache (even across projects) instead of running the tool.
+    """
+    java = mock_antlr_java(tmpdir)
+    cache_dir = join(str(tmpdir), 'cache')
+
+    def build(project, *args):
+        with tmpdir.join(project).as_cwd():
+            if isfile('mock_antlr_output.txt'):
+                os.remove('mock_antlr_output.txt')
+            dist = Distribution({
+                'name': 'pkg',
+                'packages': [],
+                'script_name': 'setup.py',
+                'script_args': ['build_antlr', *args],
+                'options': {
+                    'build_antlr': {
+                        'commands': '''
+                            file:antlr.jar ALexer.g4 -o lexer
+                            file:antlr.jar AParser.g4 -o parser -lib lexer
+                        ''',
+                        'java': java,
+                        'cache_dir': cache_dir,
+                        'cache_link': link,
+                    },
+                },
+            })
+            dist.parse_command_line()
+            dist.run_commands()
+            if not isfile('mock_antlr_output.txt'):
+                return []
+            return [cmd.split()[2] for _, _, cmd in read_mock_antlr_output()]
+
+    for project in ['p1', 'p2']:
+        write_grammar(join(str(tmpdir), project, 'ALexer.g4'), 'lexer grammar ALexer;\nA: \'a\';\n')
+        write_grammar(join(str(tmpdir), project, 'AParser.g4'), 'parser grammar AParser;\noptions { tokenVocab = ALexer; }\na: A;\n')
+
+    assert build('p1') == ['ALexer.g4', 'AParser.g4']
+    assert build('p2') == []
+    lexer_file = join('lexer', 'ALexer.py')
+    for f in [lexer_file, join('lexer', 'ALexer.tokens'), join('parser', 'AParser.py')]:
+        assert tmpdir.join('p1', f).read() == tmpdir.join('p2', f).read()
+    if link and not is_windows:
+        assert os.stat(join(str(tmpdir), 'p2', lexer_file)).st_nlink == 2
+
+    write_grammar(join(str(tmpdir), 'p2', 'AParser.g4'), 'parser grammar AParser;\noptions { tokenVocab = ALexer; }\na: A A;\n')
+    assert build('p2') == ['AParser.g4']
+    assert build('p2') == []
+
+    # forced builds run the tool but must not overwrite cached files in place
+    # (staged builds leave unchanged files alone, direct builds unlink them)
+    assert build('p2', '--force') == ['ALexer.g4', 'AParser.g4']
+    if link and not is_windows:
+        assert os.stat(join(str(tmpdir), 'p2', lexer_file)).st_nlink == 2
+    assert build('p2', '--force', '--no-staging') == ['ALexer.g4', 'AParser.g4']
+    assert os.stat(join(str(tmpdir), 'p2', lexer_file)).st_nlink == 1
+
+    # eviction is done only after the cache may have grown
+    assert build('p1', '--cache-size=0') == []
+    assert [f for f in os.listdir(cache_dir) if f != 'tmp']
+    assert build('p1', '--force', '--cache-size=0') == ['ALexer.g4', 'AParser.g4']
+    assert not [f for f in os.listdir(cache_dir) if f != 'tmp']
+
+
+def test_build_antlr_jvm_args(tmpdir, monkeypatch):
+    """
+    Test whether ``build_antlr`` passes the Java VM options of the selected
+    profile, the global options, and the per-command options to java, and
+    whether it creates and then uses an AppCDS archive in the cache directory.
+    """
+    home = str(tmpdir.join('home'))
+    monkeypatch.setenv('ANTLERINATOR_HOME', home)
+    with tmpdir.as_cwd():
+        write_grammar('A.g4', 'grammar A;\na: \'a\';\n')
+        write_grammar('B.g4', 'grammar B;\nb: \'b\';\n')
+        with open('antlr.jar', 'wb') as f:
+            f.write(fake_jar('4.0-fake'))
+
+        def build(*args):
+            if isfile('mock_antlr_output.txt'):
+                os.remove('mock_antlr_output.txt')
+            dist = Distribution({
+                'name': 'pkg',
+                'packages': [],
+                'script_name': 'setup.py',
+                'script_args': ['build_antlr', '--force', '--jvm-profile=fast-startup', '--jvm-args=-Xmx1g', *args],
+                'options': {
+                    'build_antlr': {
+                        'commands': '''
+                            file:antlr.jar A.g4 -o a -J-Dmock=a
+                            file:antlr.jar B.g4 -o b
+                        ''',
+                        'java': mock_antlr_java(tmpdir),
+                    },
+                },
+            })
+            dist.parse_command_line()
+            dist.run_commands()
+            return sorted(cmd.split(' -jar ')[0].split() for _, _, cmd in read_mock_antlr_output())
+
+        fast_startup = ['-XX:TieredStopAtLevel=1', '-XX:+UseSerialGC', '-XX:-UsePerfData', '-Xss16m']
+        assert build() == [fast_startup + ['-Xmx1g'], fast_startup + ['-Xmx1g', '-Dmock=a']]
+
+        # the first invocation of each Java VM configuration dumps the archive
+        jvm_args = build('--cds')
+        dumps = [arg for args in jvm_args for arg in args if arg.startswith('-XX:ArchiveClassesAtExit=')]
+        assert len(dumps) == 2
+        archives = sorted(join(home, 'cds', f) for f in os.listdir(join(home, 'cds')) if f.endswith('.jsa'))
+        assert len(archives) == 2
+        assert not [f for f in os.listdir(join(home, 'cds')) if f.endswith('.tmp')]
+        assert not [f for f in os.listdir('.') if f.endswith('.jsa')]
+
+        jvm_args = build('--cds')
+        assert sorted(arg for args in jvm_args for arg in args if arg.startswith('-XX:SharedArchiveFile=')) == \
+            [f'-XX:SharedArchiveFile={archive}' for archive in archives]
+
+
+@pytest.mark.parametrize('profile_format', ['json', 'chrome'])
+def test_build_antlr_profile(tmpdir, profile_format):
+    """
+    Test whether ``build_antlr`` can report the time spent in its phases and in
+    the tool invocations.
+    """
+    with tmpdir.as_cwd():
+        write_grammar('A.g4', 'grammar A;\na: \'a\';\n')
+        write_grammar('B.g4', 'grammar B;\nb: \'b\';\n')
+
+        def build(*args):
+            dist = Distribution({
+                'name': 'pkg',
+                'packages': [],
+                'script_name': 'setup.py',
+                'script_args': ['build_antlr', '--profile', f'--profile-output={join("prof", "build.json")}',
+                                f'--profile-format={profile_format}', *args],
+                'options': {
+                    'build_antlr': {
+                        'commands': '''
+                            file:antlr.jar A.g4 -o a
+                            file:antlr.jar B.g4 -o b
+                        ''',
+                        'java': mock_antlr_java(tmpdir),
+                    },
+                },
+            })
+            dist.parse_command_line()
+            dist.run_commands()
+            with open(join('prof', 'build.json')) as f:
+                return json.load(f)
+
+        for jobs in ['1', '2']:
+            if os.path.exists('build'):
+                shutil.rmtree('build')
+
+            data = build(f'--jobs={jobs}')
+            if profile_format == 'chrome':
+                assert {event['ph'] for event in data['traceEvents']} == {'X'}
+                names = [event['name'] for event in data['traceEvents']]
+            else:
+                names = [event['name'] for event in data['events']]
+                assert [stats['status'] for stats in data['commands']] == ['ran', 'ran']
+                if hasattr(os, 'wait4'):
+                    assert all(stats['user'] >= 0 and stats['maxrss'] > 0 for stats in data['commands'])
+            assert names.count('execute') == 2
+            assert {'finalize_options', 'resolve', 'analyze', 'check', 'record', 'save'} <= set(names)
+
+            data = build(f'--jobs={jobs}')
+            if profile_format == 'json':
+                assert [stats['status'] for stats in data['commands']] == ['up-to-date', 'up-to-date']
+
+
+def test_build_antlr_watch(tmpdir):
+    """
+    Test whether ``build_antlr --watch`` re-runs only the commands affected by
+    the changes of grammar files.
+    """
+    with tmpdir.as_cwd():
+        write_grammar('ALexer.g4', 'lexer grammar ALexer;\nA: \'a\';\n')
+        write_grammar('AParser.g4', 'parser grammar AParser;\noptions { tokenVocab = ALexer; }\na: A;\n')
+        write_grammar('B.g4', 'grammar B;\nb: \'b\';\n')
+        with open('setup.py', 'w') as f:
+            f.write(f"""from setuptools import setup
+setup(name='pkg', packages=[], options={{'build_antlr': {{
+    'commands': ['file:antlr.jar ALexer.g4 -o lexer', 'file:antlr.jar AParser.g4 -o parser -lib lexer', 'file:antlr.jar B.g4 -o b'],
+    'java': {mock_antlr_java(tmpdir)!r},
+}}}})
+""")
+
+        def wait_for_output(count):
+            deadline = time.monotonic() + 30
+            while not (isfile('mock_antlr_output.txt') and len(read_mock_antlr_output()) >= count):
+                assert time.monotonic() < deadline, 'timed out waiting for the mock ANTLR tool'
+                time.sleep(0.05)
+            # give unexpected invocations a chance to show up
+            time.sleep(0.5)
+            return [cmd.split()[2] for _, _, cmd in read_mock_antlr_output()]
+
+        with subprocess.Popen([sys.executable, 'setup.py', 'build_antlr', '--watch', '--no-daemon', '--no-batch', '--watch-debounce=0.2']) as proc:
+            try:
+                assert wait_for_output(3) == ['ALexer.g4', 'AParser.g4', 'B.g4']
+
+                write_grammar('B.g4', 'grammar B;\nb: \'b\' \'b\';\n')
+                assert wait_for_output(4)[3:] == ['B.g4']
+
+                write_grammar('ALexer.g4', 'lexer grammar ALexer;\nA: \'a\';\nB: \'b\';\n')
+                assert wait_for_output(6)[4:] == ['ALexer.g4', 'AParser.g4']
+            finally:
+                if is_windows:
+                    proc.terminate()
+                else:
+                    proc.send_signal(signal.SIGINT)
+                proc.wait(timeout=30)
+        if not is_windows:
+            assert proc.returncode == 0
+
+
+def test_build_antlr_watch_unstaged(tmpdir):
+    """
+    Test whether ``build_antlr --watch`` keeps watching a grammar edited right
+    before a rebuild of an invocation that cannot be staged (as its grammars
+    are in different directories).
+    """
+    with tmpdir.as_cwd():
+        write_grammar(join('a', 'A.g4'), 'grammar A;\na: \'a\';\n')
+        write_grammar(join('b', 'B.g4'), 'grammar B;\nb: \'b\';\n')
+        with open('setup.py', 'w') as f:
+            f.write(f"""from setuptools import setup
+setup(name='pkg', packages=[], options={{'build_antlr': {{
+    'commands': ['file:antlr.jar a/A.g4', 'file:antlr.jar b/B.g4'],
+    'java': {mock_antlr_java(tmpdir)!r},
+}}}})
+""")
+
+        def wait_for_output(count):
+            deadline = time.monotonic() + 30
+            while not (isfile('mock_antlr_output.txt') and len(read_mock_antlr_output()) >= count):
+                assert time.monotonic() < deadline, 'timed out waiting for the mock ANTLR tool'
+                time.sleep(0.05)
+            time.sleep(0.5)
+            return len(read_mock_antlr_output())
+
+        with subprocess.Popen([sys.executable, 'setup.py', 'build_antlr', '--watch', '--no-daemon', '--watch-debounce=0.2']) as proc:
+            try:
+                assert wait_for_output(1) == 1
+
+                write_grammar(join('a', 'A.g4'), 'grammar A;\na: \'a\' \'a\';\n')
+                assert wait_for_output(2) == 2
+
+                write_grammar(join('a', 'A.g4'), 'grammar A;\na: \'a\' \'a\' \'a\';\n')
+                assert wait_for_output(3) == 3
+            finally:
+                if is_windows:
+                    proc.terminate()
+                else:
+                    proc.send_signal(signal.SIGINT)
+                proc.wait(timeout=30)
+
+        with open(join('build', 'antlr', 'state.json'), 'r') as f:
+            outputs = [f for entry in json.load(f)['commands'].values() for f in entry['outputs']]
+        assert outputs and not [f for f in outputs if f.endswith('.g4')]
+
+
+@pytest.mark.skipif(not shutil.which('java'), reason='java unavailable')
+def test_build_antlr_daemon(tmpdir):
+    """
+    Test whether ``build_antlr`` can run the ANTLR tool in a resident Java VM.
+    """
+    with tmpdir.as_cwd():
+        makedirs('grammars')
+        shutil.copy(join(resources_dir, 'Hello.g4'), 'grammars')
+        shutil.copy(join(resources_dir, 'Bello.g4'), 'grammars')
+
+        dist = Distribution({
+            'name': 'pkg',
+            'packages': [],
+            'script_name': 'setup.py',
+            'script_args': ['build_antlr', '--daemon', '--daemon-idle-timeout=10', '--no-batch'],
+            'options': {
+                'build_antlr': {
+                    'commands': f'''
+                        antlerinator:{tested_antlr_version} {join("grammars", "Hello.g4")} -Dlanguage=Python3 -o gen
+                        antlerinator:{tested_antlr_version} {join("grammars", "Bello.g4")} -Dlanguage=Python3 -o {join("gen", "bello")} -Xexact-output-dir
+                    ''',
+                },
+            },
+        })
+
+        dist.parse_command_line()
+        dist.run_commands()
+
+        assert isfile(join('gen', 'grammars', 'HelloLexer.py'))
+        assert isfile(join('gen', 'grammars', 'HelloParser.py'))
+        assert isfile(join('gen', 'bello', 'BelloLexer.py'))
+        assert isfile(join('gen', 'bello', 'BelloParser.py'))
+
+
+@pytest.mark.parametrize('hang', [False, True])
+def test_build_antlr_daemon_fallback(tmpdir, monkeypatch, hang):
+    """
+    Test whether ``build_antlr`` falls back to running java directly if the
+    resident Java VM cannot be started (in time).
+    """
+    monkeypatch.setenv('ANTLERINATOR_HOME', str(tmpdir.join('home')))
+    if hang:
+        monkeypatch.setenv('MOCK_ANTLR_DAEMON_SLEEP', '60')
+        monkeypatch.setattr(antlerinator.daemon, '_start_timeout', 0.5)
+    start = time.monotonic()
+    with tmpdir.as_cwd():
+        write_grammar('A.g4', 'grammar A;\na: \'a\';\n')
+
+        dist = Distribution({
+            'name': 'pkg',
+            'packages': [],
+            'script_name': 'setup.py',
+            'script_args': ['build_antlr', '--daemon'],
+            'options': {
+                'build_antlr': {
+                    'commands': 'file:antlr.jar A.g4 -o gen',
+                    'java': mock_antlr_java(tmpdir),
+                },
+            },
+        })
+
+        dist.parse_command_line()
+        dist.run_commands()
+
+        assert isfile(join('gen', 'AParser.py'))
+    assert time.monotonic() - start < 30
+
+
+def test_daemon_timeout(tmpdir, monkeypatch):
+    """
+    Test whether ``run_tool`` gives up on a daemon that does not respond.
+    """
+    monkeypatch.setenv('ANTLERINATOR_HOME', str(tmpdir.join('home')))
+    java, jar = mock_antlr_java(tmpdir), join(str(tmpdir), 'antlr.jar')
+    state_path = antlerinator.daemon._state_path(java, jar, ())  # pylint: disable=protected-access
+    makedirs(dirname(state_path))
+    with socket.create_server(('127.0.0.1', 0)) as server:
+        with open(state_path, 'w') as f:
+            json.dump({'pid': os.getpid(), 'port': server.getsockname()[1], 'token': 'token'}, f)
+
+        start = time.monotonic()
+        with pytest.raises(OSError):
+            antlerinator.daemon.run_tool(java, jar, ['A.g4'], timeout=0.5)
+        assert time.monotonic() - start < 30
+
+
+def test_build_antlr_atn_cache(tmpdir, monkeypatch):
+    """
+    Test whether ``build_antlr`` precomputes the ATNs of generated Python
+    lexers/parsers, and whether the precomputed ATNs are part of the outputs.
+    """
+    pytest.importorskip('antlr4')
+    from antlr4.xpath import XPathLexer  # pylint: disable=import-outside-toplevel
+
+    monkeypatch.setenv('MOCK_ANTLR_MODULE', XPathLexer.__file__)
+    with tmpdir.as_cwd():
+        write_grammar('A.g4', 'grammar A;\na: \'a\';\n')
+
+        def run(cmd, *args):
+            dist = Distribution({
+                'name': 'pkg',
+                'packages': [],
+                'script_name': 'setup.py',
+                'script_args': [cmd, *args],
+                'options': {
+                    'build_antlr': {
+                        'commands': 'file:antlr.jar A.g4 -o gen',
+                        'java': mock_antlr_java(tmpdir),
+                    },
+                },
+            })
+            dist.parse_command_line()
+            dist.run_commands()
+
+        run('build_antlr', '--atn-cache')
+        for name in ['ALexer', 'AParser']:
+            assert isfile(join('gen', f'{name}.atn'))
+            with open(join('gen', f'{name}.py')) as f:
+                assert '_load_atn(__file__, serializedATN, ' in f.read()
+
+        run('clean_antlr')
+        assert not isfile(join('gen', 'ALexer.atn'))
+        assert not isfile(join('gen', 'AParser.py'))
+
+
+@pytest.mark.parametrize('invalidation_mode, flags', [
+    ('timestamp', 0b00),
+    ('checked-hash', 0b11),
+])
+def test_build_antlr_compile(tmpdir, invalidation_mode, flags):
+    """
+    Test whether ``build_antlr`` byte-compiles the generated Python files (only
+    once), and whether ``clean_antlr`` removes their bytecode.
+    """
+    with tmpdir.as_cwd():
+        write_grammar('A.g4', 'grammar A;\na: \'a\';\n')
+        write_grammar('B.g4', 'grammar B;\nb: \'b\';\n')
+
+        def run(cmd, *args):
+            dist = Distribution({
+                'name': 'pkg',
+                'packages': [],
+                'script_name': 'setup.py',
+                'script_args': [cmd, *args],
+                'options': {
+                    'build_antlr': {
+                        'commands': 'file:antlr.jar A.g4 B.g4 -o gen',
+                        'java': mock_antlr_java(tmpdir),
+                    },
+                },
+            })
+            dist.parse_command_line()
+            dist.run_commands()
+
+        run('build_antlr', '--compile', f'--invalidation-mode={invalidation_mode}', '-j', '2')
+        pycs = [importlib.util.cache_from_source(join('gen', f'{name}.py')) for name in ['ALexer', 'AParser', 'BLexer', 'BParser']]
+        for pyc in pycs:
+            with open(pyc, 'rb') as f:
+                assert int.from_bytes(f.read(8)[4:], 'little') == flags
+        stamps = [os.stat(pyc).st_mtime_ns for pyc in pycs]
+
+        run('build_antlr', '--compile', f'--invalidation-mode={invalidation_mode}')
+        assert [os.stat(pyc).st_mtime_ns for pyc in pycs] == stamps
+
+        if invalidation_mode == 'checked-hash':
+            # regenerated but identical files keep their hash-based bytecode
+            run('build_antlr', '--compile', f'--invalidation-mode={invalidation_mode}', '--force')
+            assert [os.stat(pyc).st_mtime_ns for pyc in pycs] == stamps
+
+        run('clean_antlr')
+        assert not os.path.exists(join('gen', '__pycache__'))
+
+
+def test_build_antlr_compile_spawn(tmpdir):
+    """
+    Test whether ``build_antlr`` can byte-compile in parallel from an unguarded
+    ``setup.py`` when new processes are spawned (the default on macOS and
+    Windows), and whether it reports the files that fail to compile.
+    """
+    with tmpdir.as_cwd():
+        write_grammar('A.g4', 'grammar A;\na: \'a\';\n')
+        with open('setup.py', 'w') as f:
+            f.write('import multiprocessing\n'
+                    'from setuptools import setup\n'
+                    'multiprocessing.set_start_method("spawn", force=True)\n'
+                    f'setup(name="pkg", packages=[], options={{"build_antlr": {{"commands": "file:antlr.jar A.g4 -o gen", "java": {mock_antlr_java(tmpdir)!r}}}}})\n')
+
+        subprocess.run([sys.executable, 'setup.py', 'build_antlr', '--compile', '-j', '2'], check=True)
+        assert os.listdir(join('gen', '__pycache__'))
+
+        write_grammar(join('gen', 'Broken.py'), 'def broken(:\n')
+        proc = subprocess.run([sys.executable, 'setup.py', 'build_antlr', '--compile', '-j', '2', '--output=gen/*.py'],
+                              stdout=subprocess.PIPE, stderr=subprocess.STDOUT, check=False)
+        assert proc.returncode != 0
+        assert b'Broken.py' in proc.stdout
+
+
+@pytest.mark.parametrize('staging', [True, False], ids=['staging', 'no-staging'])
+def test_build_antlr_relative_headers(tmpdir, staging):
+    """
+    Test whether ``build_antlr`` replaces only the generated files whose content
+    changed, and whether it rewrites the absolute grammar paths in the headers
+    of the generated files to relative ones.
+    """
+    with tmpdir.as_cwd():
+        write_grammar(join('grammars', 'A.g4'), 'grammar A;\na: \'a\';\n')
+        write_grammar(join('grammars', 'B.g4'), 'grammar B;\nb: \'b\';\n')
+
+        def build(*args):
+            dist = Distribution({
+                'name': 'pkg',
+                'packages': [],
+                'script_name': 'setup.py',
+                'script_args': ['build_antlr', '--relative-headers', *args] + ([] if staging else ['--no-staging']),
+                'options': {
+                    'build_antlr': {
+                        'commands': f'file:antlr.jar {join(str(tmpdir), "grammars", "A.g4")} {join(str(tmpdir), "grammars", "B.g4")} -o gen',
+                        'java': mock_antlr_java(tmpdir),
+                    },
+                },
+            })
+            dist.parse_command_line()
+            dist.run_commands()
+            return {name: os.stat(join('gen', name)) for name in os.listdir('gen')}
+
+        stats = build()
+        assert sorted(stats) == ['ALexer.py', 'ALexer.tokens', 'AParser.py', 'BLexer.py', 'BLexer.tokens', 'BParser.py']
+        assert tmpdir.join('gen', 'AParser.py').read() == '# Generated from grammars/A.g4 by ANTLR mock\n'
+        if not staging:
+            return
+
+        # identical outputs of a forced build are not replaced
+        assert {name: (st.st_ino, st.st_mtime_ns) for name, st in build('--force').items()} == {name: (st.st_ino, st.st_mtime_ns) for name, st in stats.items()}
+
+        time.sleep(0.01)
+        write_grammar(join('grammars', 'A.g4'), 'grammar A;\na: A;\nA: \'a\';\n')
+        changed = sorted(name for name, st in build().items() if st.st_mtime_ns != stats[name].st_mtime_ns)
+        assert changed == ['ALexer.tokens']
+
+
 def test_build(tmpdir):
     """
     Test whether lexer/parser generation happens when the general ``build``
@@ -175,6 +961,35 @@ def test_editable_wheel(tmpdir):
         assert isfile(join('pkg', 'HelloParser.py'))
 
 
+@pytest.mark.parametrize('options, config_file, config', [
+    (None, None, None),
+    (None, 'setup.cfg', '[metadata]\nname = pkg\n'),
+    (None, 'pyproject.toml', '[project]\nname = "pkg"\n'),
+    ({'build_antlr': {'commands': ''}}, None, None),
+    (None, 'setup.cfg', '[build_antlr]\ncommands =\n'),
+    (None, 'pyproject.toml', '[tool.distutils.build_antlr]\ncommands = []\n'),
+])
+def test_register(tmpdir, options, config_file, config):
+    """
+    Test whether the command classes of a distribution are extended only if
+    it configures ``build_antlr``.
+    """
+    with tmpdir.as_cwd():
+        if config_file:
+            with open(config_file, 'w') as f:
+                f.write(config)
+
+        dist = Distribution({
+            'name': 'pkg',
+            'script_name': 'setup.py',
+            'options': options or {},
+        })
+
+        configured = bool(options) or 'build_antlr' in (config or '')
+        for cmd in ['build', 'develop', 'clean']:
+            assert (dist.get_command_class(cmd).__module__ == 'antlerinator.build_antlr') == configured
+
+
 def test_clean(tmpdir):
     """
     Test whether cleanup removes generated files.
@@ -207,6 +1022,85 @@ def test_clean(tmpdir):
         assert not isfile(join('pkg', 'DummyParser.py'))
 
 
+def test_clean_manifest(tmpdir):
+    """
+    Test whether cleanup removes exactly the files recorded by ``build_antlr``
+    (and not every file matching the ``output`` patterns).
+    """
+    with tmpdir.as_cwd():
+        write_grammar(join('pkg', 'A.g4'), 'grammar A;\na: \'a\';\n')
+        write_grammar(join('pkg', 'Handwritten.py'), '')
+
+        def run(cmd):
+            dist = Distribution({
+                'name': 'pkg',
+                'packages': [],
+                'script_name': 'setup.py',
+                'script_args': [cmd],
+                'options': {
+                    'build_antlr': {
+                        'commands': 'file:antlr.jar A.g4 -o gen',
+                        'output': join('pkg', '**', '*.py'),
+                        'java': mock_antlr_java(tmpdir),
+                    },
+                },
+            })
+            dist.parse_command_line()
+            dist.run_commands()
+
+        with tmpdir.join('pkg').as_cwd():
+            run('build_antlr')
+            assert isfile(join('gen', 'AParser.py'))
+            run('clean_antlr')
+            assert not isfile(join('gen', 'ALexer.py'))
+            assert not isfile(join('gen', 'AParser.py'))
+            assert not isfile(join('gen', 'A.tokens'))
+            assert isfile('Handwritten.py')
+
+        # without a build state, the 'output' patterns are used
+        run('clean_antlr')
+        assert not isfile(join('pkg', 'Handwritten.py'))
+
+
+@pytest.mark.parametrize('staging', [True, False])
+def test_clean_manifest_touched(tmpdir, staging):
+    """
+    Test whether cleanup keeps the grammars and the hand-written files that
+    were modified right before ``build_antlr`` (even if the tool writes its
+    output next to them).
+    """
+    with tmpdir.as_cwd():
+        write_grammar(join('a', 'A.g4'), 'grammar A;\na: \'a\';\n')
+        write_grammar(join('b', 'B.g4'), 'grammar B;\nb: \'b\';\n')
+        write_grammar(join('a', 'helper.py'), '')
+
+        def run(cmd):
+            dist = Distribution({
+                'name': 'pkg',
+                'packages': [],
+                'script_name': 'setup.py',
+                'script_args': [cmd] + (['--no-staging'] if cmd == 'build_antlr' and not staging else []),
+                'options': {
+                    'build_antlr': {
+                        'commands': ['file:antlr.jar a/A.g4', 'file:antlr.jar b/B.g4'],
+                        'java': mock_antlr_java(tmpdir),
+                    },
+                },
+            })
+            dist.parse_command_line()
+            dist.run_commands()
+
+        run('build_antlr')
+        assert isfile(join('a', 'AParser.py'))
+        assert isfile(join('b', 'BParser.py'))
+        run('clean_antlr')
+        assert not isfile(join('a', 'AParser.py'))
+        assert not isfile(join('b', 'BParser.py'))
+        assert isfile(join('a', 'A.g4'))
+        assert isfile(join('b', 'B.g4'))
+        assert isfile(join('a', 'helper.py'))
+
+
 def test_sdist(tmpdir):
     """
     Test whether generated files can be excluded from the sdist using
@@ -0,0 +1,143 @@
+# Copyright (c) 2025 Renata Hodovan, Akos Kiss.
+#
+# Licensed under the BSD 3-Clause License
+# <LICENSE.rst or https://opensource.org/licenses/BSD-3-Clause>.
+# This file may not be copied, modified, or distributed except
+# according to those terms.
+
+import os
+import subprocess
+import sys
+import time
+
+from os.path import basename, dirname, exists, join
+
+from conftest import download_module
+
+import antlerinator
+
+from antlerinator.cache import LocalArtifactCache, jar_entries, prune_jars
+
+
+def run_cache(*args):
+    return subprocess.run([sys.executable, '-c', 'from antlerinator.cache import execute; execute()', *args],
+                          check=False, stdout=subprocess.PIPE, universal_newlines=True)
+
+
+def test_jar_cache(jar_server, tmpdir, monkeypatch):  # pylint: disable=unused-argument
+    """
+    Test whether downloaded jars are recorded in the index of the cache
+    directory (given by ``ANTLERINATOR_HOME``), and whether they are listed,
+    verified, and pruned in least recently used order.
+    """
+    home = str(tmpdir.join('home'))
+    monkeypatch.setenv('ANTLERINATOR_HOME', home)
+    versions = ['4.1-fake', '4.2-fake', '4.3-fake']
+    paths = antlerinator.download_all(versions)
+    assert paths == [join(home, f'antlr-{v}-complete.jar') for v in versions]
+
+    with download_module._update_index(home) as index:  # pylint: disable=protected-access
+        for i, version in enumerate(['4.2-fake', '4.1-fake', '4.3-fake']):
+            index['jars'][f'antlr-{version}-complete.jar']['last_used'] = time.time() - (3 - i) * 24 * 3600
+    archive = f'{download_module._cds_archive_prefix(download_module._read_stamp(paths[1]))}.0123456789abcdef.jsa'  # pylint: disable=protected-access
+    os.makedirs(dirname(archive))
+    with open(archive, 'wb') as f:
+        f.write(b'\0' * 1024)
+
+    entries = jar_entries()
+    assert [entry[0] for entry in entries] == ['4.2-fake', '4.1-fake', '4.3-fake']
+    assert entries[0][4] == [paths[1], f'{paths[1]}.sha256', archive]
+    assert entries[0][2] == sum(os.stat(f).st_size for f in entries[0][4])
+
+    result = run_cache('list')
+    assert result.returncode == 0
+    assert [line.split()[0] for line in result.stdout.splitlines()] == ['4.3-fake', '4.1-fake', '4.2-fake']
+
+    assert run_cache('verify').returncode == 0
+    with open(paths[2], 'r+b') as f:
+        f.write(b'garbage')
+    result = run_cache('verify')
+    assert result.returncode == 1
+    assert result.stdout.splitlines()[-1].split() == ['CORRUPTED', paths[2]]
+
+    # prune by age (dry run first), then by size
+    removed = prune_jars(older_than=time.time() - 2.5 * 24 * 3600, dry_run=True)
+    assert [entry[0] for entry in removed] == ['4.2-fake']
+    assert exists(paths[1])
+    assert run_cache('prune', '--older-than', '2.5').returncode == 0
+    assert not [f for f in os.listdir(home) if f.startswith(basename(paths[1])) and not f.endswith('.lock')]
+    assert not exists(archive)
+    assert [entry[0] for entry in jar_entries()] == ['4.1-fake', '4.3-fake']
+    assert 'antlr-4.2-fake-complete.jar' not in download_module._read_index(home)['jars']  # pylint: disable=protected-access
+
+    removed = prune_jars(max_size=os.stat(paths[2]).st_size + 100)
+    assert [entry[0] for entry in removed] == ['4.1-fake']
+    assert [entry[0] for entry in jar_entries()] == ['4.3-fake']
+
+
+def test_jar_cache_lazy_use(jar_server, tmpdir, monkeypatch):  # pylint: disable=unused-argument
+    """
+    Test whether lazy lookups of downloaded jars update the index at most once
+    a day.
+    """
+    home = str(tmpdir.join('home'))
+    monkeypatch.setenv('ANTLERINATOR_HOME', home)
+    monkeypatch.setattr(download_module, '_recorded_uses', set())
+    path = antlerinator.download('4.1-fake')
+    last_used = download_module._read_index(home)['jars'][basename(path)]['last_used']  # pylint: disable=protected-access
+    index_stamp = os.stat(join(home, 'index.json')).st_mtime_ns
+
+    download_module._recorded_uses.clear()  # pylint: disable=protected-access
+    assert antlerinator.download('4.1-fake', lazy=True) == path
+    assert os.stat(join(home, 'index.json')).st_mtime_ns == index_stamp
+
+    two_days_ago = time.time() - 2 * 24 * 3600
+    os.utime(f'{path}.sha256', (two_days_ago, two_days_ago))
+    download_module._recorded_uses.clear()  # pylint: disable=protected-access
+    assert antlerinator.download('4.1-fake', lazy=True) == path
+    assert download_module._read_index(home)['jars'][basename(path)]['last_used'] > last_used  # pylint: disable=protected-access
+    assert os.stat(f'{path}.sha256').st_mtime > two_days_ago + 24 * 3600
+
+
+def test_artifact_cache_prune(tmpdir):
+    """
+    Test whether ``LocalArtifactCache.prune`` removes entries by age and size.
+    """
+    cache = LocalArtifactCache(str(tmpdir.join('cache')))
+    src_dir = str(tmpdir.join('src'))
+    os.makedirs(src_dir)
+    with open(join(src_dir, 'A.py'), 'w') as f:
+        f.write('#' * 1000)
+
+    now = time.time_ns()
+    for i, key in enumerate(['aa' * 32, 'bb' * 32, 'cc' * 32]):
+        cache.put(key, src_dir, ['A.py'])
+        manifest = join(cache.location, key[:2], key, 'manifest.json')
+        os.utime(manifest, ns=(now - (3 - i) * 10**9, now - (3 - i) * 10**9))
+
+    assert cache.prune(older_than=now - int(2.5e9), dry_run=True) == ['aa' * 32]
+    assert len(cache.entries()) == 3
+    assert cache.prune(older_than=now - int(2.5e9)) == ['aa' * 32]
+    assert cache.prune(max_size=sum(size for _, size, _ in cache.entries()) - 1) == ['bb' * 32]
+    assert [key for key, _, _ in cache.entries()] == ['cc' * 32]
+
+
+def test_artifact_cache_readonly(tmpdir, monkeypatch):
+    """
+    Test whether ``LocalArtifactCache.get`` hits even if the time of last use
+    of the entry cannot be updated (e.g., in a read-only shared cache).
+    """
+    cache = LocalArtifactCache(str(tmpdir.join('cache')))
+    src_dir = str(tmpdir.join('src'))
+    os.makedirs(src_dir)
+    with open(join(src_dir, 'A.py'), 'w') as f:
+        f.write('# A\n')
+    cache.put('aa' * 32, src_dir, ['A.py'])
+
+    def utime(*args, **kwargs):
+        raise PermissionError(13, 'Permission denied')
+
+    monkeypatch.setattr(os, 'utime', utime)
+    dst_dir = str(tmpdir.join('dst'))
+    assert cache.get('aa' * 32, dst_dir) == [join(dst_dir, 'A.py')]
+    assert tmpdir.join('dst', 'A.py').read() == '# A\n'
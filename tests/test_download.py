@@ -5,12 +5,22 @@
 # This file may not be copied, modified, or distributed except
 # according to those terms.
 
+import asyncio
+import glob
+import hashlib
 import os
+import pathlib
 import subprocess
 import sys
+import time
+
+from concurrent.futures import ThreadPoolExecutor
 
 import pytest
 
+from conftest import download_module
+from fake_antlr import fake_jar
+
 import antlerinator
 
 
@@ -72,3 +82,353 @@ class TestDownload:
             antlerinator.download(**kwargs)
         assert jar_path_force == jar_path_lazy
         run_antlr(jar_path_force)
+
+
+@pytest.mark.usefixtures('jar_server')
+def test_download_stream(tmpdir):
+    """
+    Test whether the jar is streamed to the output path with progress reported.
+    """
+    jar_path = os.path.join(str(tmpdir), 'sub', 'antlr.jar')
+    reports = []
+
+    assert antlerinator.download('4.0-fake', jar_path, progress=lambda done, total: reports.append((done, total))) == jar_path
+
+    with open(jar_path, 'rb') as f:
+        content = f.read()
+    assert content == fake_jar('4.0-fake')
+    assert reports[0] == (0, len(content))
+    assert reports[-1] == (len(content), len(content))
+    assert len(reports) > 2
+    assert sorted(os.listdir(os.path.dirname(jar_path))) == ['antlr.jar', 'antlr.jar.lock', 'antlr.jar.sha256']
+
+
+def test_download_failure(jar_server, tmpdir, monkeypatch):
+    """
+    Test whether a failed download leaves no (partial) jar behind.
+    """
+    monkeypatch.setenv('ANTLERINATOR_MIRRORS', jar_server.url + 'missing/')
+    jar_path = os.path.join(str(tmpdir), 'antlr.jar')
+
+    with pytest.raises(OSError):
+        antlerinator.download('4.0-fake', jar_path)
+
+    assert os.listdir(str(tmpdir)) == ['antlr.jar.lock']
+
+
+def test_download_no_version(jar_server, tmpdir, monkeypatch):
+    """
+    Test whether downloading to a given path without a version and without an
+    installed runtime is rejected before any request is made.
+    """
+    monkeypatch.setattr(download_module, '_antlr_version', lambda: None)
+    jar_path = os.path.join(str(tmpdir), 'antlr.jar')
+
+    with pytest.raises(ValueError):
+        antlerinator.download(path=jar_path)
+
+    assert not os.listdir(str(tmpdir))
+    assert not jar_server.requests
+
+
+def test_download_concurrent(jar_server, tmpdir):
+    """
+    Test whether concurrent lazy downloads of the same jar result in a single
+    transfer and all of them see the complete jar.
+    """
+    jar_server.delay = 0.5
+    jar_path = os.path.join(str(tmpdir), 'antlr.jar')
+
+    def lazy_download():
+        path = antlerinator.download('4.0-fake', jar_path, lazy=True)
+        with open(path, 'rb') as f:
+            return f.read()
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        contents = list(executor.map(lambda _: lazy_download(), range(4)))
+
+    assert contents == [fake_jar('4.0-fake')] * 4
+    assert len(jar_server.requests) == 1
+
+
+def test_download_verify(jar_server, tmpdir):
+    """
+    Test whether lazy downloads replace corrupted jars, and trust the sidecar
+    stamp of unchanged jars.
+    """
+    jar_path = os.path.join(str(tmpdir), 'antlr.jar')
+    content = fake_jar('4.0-fake')
+
+    antlerinator.download('4.0-fake', jar_path)
+    assert len(jar_server.requests) == 1
+
+    # truncated jar (e.g., left behind by an interrupted copy) is replaced
+    with open(jar_path, 'wb') as f:
+        f.write(content[:1000])
+    antlerinator.download('4.0-fake', jar_path, lazy=True)
+    assert len(jar_server.requests) == 2
+    with open(jar_path, 'rb') as f:
+        assert f.read() == content
+
+    # unchanged jar (as far as its stat is concerned) is not rehashed
+    st = os.stat(jar_path)
+    with open(jar_path, 'r+b') as f:
+        f.write(b'X' * 1000)
+    os.utime(jar_path, ns=(st.st_atime_ns, st.st_mtime_ns))
+    antlerinator.download('4.0-fake', jar_path, lazy=True)
+    assert len(jar_server.requests) == 2
+
+    # mismatching digest is detected once the stamp is out of date
+    os.utime(jar_path, ns=(st.st_atime_ns, st.st_mtime_ns + 1))
+    antlerinator.download('4.0-fake', jar_path, lazy=True, sha256=hashlib.sha256(content).hexdigest())
+    assert len(jar_server.requests) == 3
+
+
+def test_download_stamp_readonly(jar_server, tmpdir):
+    """
+    Test whether jars are found in lazy mode even if their sidecar stamp cannot
+    be written (e.g., in a read-only directory).
+    """
+    jar_path = os.path.join(str(tmpdir), 'antlr.jar')
+    with open(jar_path, 'wb') as f:
+        f.write(fake_jar('4.0-fake'))
+    # a directory in place of the stamp makes writing the stamp fail even for
+    # privileged users
+    os.makedirs(f'{jar_path}.sha256')
+
+    assert antlerinator.download('4.0-fake', jar_path, lazy=True) == jar_path
+    assert antlerinator.download('4.0-fake', jar_path, lazy=True) == jar_path
+    assert not jar_server.requests
+    assert not [f for f in os.listdir(str(tmpdir)) if f.endswith('.tmp')]
+
+
+@pytest.mark.usefixtures('jar_server')
+def test_download_sha256_mismatch(tmpdir):
+    """
+    Test whether a download with unexpected digest is rejected.
+    """
+    jar_path = os.path.join(str(tmpdir), 'antlr.jar')
+
+    with pytest.raises(OSError):
+        antlerinator.download('4.0-fake', jar_path, sha256='0' * 64)
+    assert not os.path.exists(jar_path)
+
+    assert antlerinator.download('4.0-fake', jar_path, sha256=hashlib.sha256(fake_jar('4.0-fake')).hexdigest()) == jar_path
+
+
+def test_download_resume(jar_server, tmpdir):
+    """
+    Test whether dropped connections are retried and continued with range
+    requests.
+    """
+    jar_server.drops = [100 * 1024, 50 * 1024]
+    jar_path = os.path.join(str(tmpdir), 'antlr.jar')
+
+    antlerinator.download('4.0-fake', jar_path, retries=2, backoff=0)
+
+    with open(jar_path, 'rb') as f:
+        assert f.read() == fake_jar('4.0-fake')
+    assert jar_server.ranges == [None, f'bytes={100 * 1024}-', f'bytes={150 * 1024}-']
+    assert not glob.glob(f'{jar_path}.*part')
+
+
+def test_download_resume_later(jar_server, tmpdir):
+    """
+    Test whether a download that failed after all retries leaves a partial file
+    behind that a later download continues.
+    """
+    jar_server.drops = [100 * 1024]
+    jar_path = os.path.join(str(tmpdir), 'antlr.jar')
+
+    with pytest.raises(OSError):
+        antlerinator.download('4.0-fake', jar_path, retries=0)
+    assert not os.path.exists(jar_path)
+    assert [os.path.getsize(f) for f in glob.glob(f'{jar_path}.*.part')] == [100 * 1024]
+
+    antlerinator.download('4.0-fake', jar_path, lazy=True)
+    with open(jar_path, 'rb') as f:
+        assert f.read() == fake_jar('4.0-fake')
+    assert jar_server.ranges == [None, f'bytes={100 * 1024}-']
+
+
+def test_download_resume_other_url(jar_server, tmpdir):
+    """
+    Test whether a partial file left behind by the download of a different
+    version (i.e., from a different URL) is not continued, and whether it is
+    removed once the jar is downloaded.
+    """
+    jar_server.drops = [100 * 1024]
+    jar_path = os.path.join(str(tmpdir), 'antlr.jar')
+
+    with pytest.raises(OSError):
+        antlerinator.download('4.0-fake', jar_path, retries=0)
+
+    antlerinator.download('4.1-fake', jar_path, lazy=True)
+    with open(jar_path, 'rb') as f:
+        assert f.read() == fake_jar('4.1-fake')
+    assert jar_server.ranges == [None, None]
+    assert not glob.glob(f'{jar_path}.*part')
+
+
+def test_download_invalid_jar(jar_server, tmpdir):
+    """
+    Test whether a downloaded file without a known digest is rejected if it is
+    not a valid jar.
+    """
+    mirror_dir = os.path.join(str(tmpdir), 'mirror')
+    os.makedirs(mirror_dir)
+    with open(os.path.join(mirror_dir, 'antlr-4.0-fake-complete.jar'), 'wb') as f:
+        f.write(b'<html>not found</html>')
+    jar_path = os.path.join(str(tmpdir), 'antlr.jar')
+
+    with pytest.raises(OSError, match='not a valid jar'):
+        antlerinator.download('4.0-fake', jar_path, mirrors=[mirror_dir])
+    assert not os.path.exists(jar_path)
+    assert not glob.glob(f'{jar_path}.*part')
+    assert not jar_server.requests
+
+
+def test_download_mirrors(jar_server, tmpdir):
+    """
+    Test whether mirrors are tried in order.
+    """
+    mirrors = [jar_server.url + 'missing/', jar_server.url + '{file}']
+
+    antlerinator.download('4.0-fake', os.path.join(str(tmpdir), 'antlr1.jar'), mirrors=mirrors)
+    assert jar_server.requests == ['/missing/antlr-4.0-fake-complete.jar', '/antlr-4.0-fake-complete.jar']
+
+    antlerinator.download('4.0-fake', os.path.join(str(tmpdir), 'antlr2.jar'), mirrors=mirrors)
+    assert jar_server.requests[2:] == ['/missing/antlr-4.0-fake-complete.jar', '/antlr-4.0-fake-complete.jar']
+
+
+def test_download_maven_mirror(jar_server, tmpdir):
+    """
+    Test whether jars can be downloaded from a local Maven repository layout.
+    """
+    repo_dir = os.path.join(str(tmpdir), 'repo', 'org', 'antlr', 'antlr4', '4.0-fake')
+    os.makedirs(repo_dir)
+    with open(os.path.join(repo_dir, 'antlr4-4.0-fake-complete.jar'), 'wb') as f:
+        f.write(fake_jar('4.0-fake'))
+    jar_path = os.path.join(str(tmpdir), 'antlr.jar')
+
+    mirrors = ['maven+' + pathlib.Path(str(tmpdir), 'repo').as_uri()]
+    antlerinator.download('4.0-fake', jar_path, mirrors=mirrors)
+
+    with open(jar_path, 'rb') as f:
+        assert f.read() == fake_jar('4.0-fake')
+    assert not jar_server.requests
+
+    # the digests published next to the jar are checked (SHA-256 first)
+    with open(os.path.join(repo_dir, 'antlr4-4.0-fake-complete.jar.sha1'), 'w') as f:
+        f.write(hashlib.sha1(fake_jar('4.0-fake')).hexdigest())
+    antlerinator.download('4.0-fake', jar_path, mirrors=mirrors, force=True)
+    with open(os.path.join(repo_dir, 'antlr4-4.0-fake-complete.jar.sha256'), 'w') as f:
+        f.write(f'{"0" * 64}  antlr4-4.0-fake-complete.jar\n')
+    with pytest.raises(OSError, match='SHA-256 digest mismatch'):
+        antlerinator.download('4.0-fake', jar_path, mirrors=mirrors, force=True)
+
+
+def test_download_offline(jar_server, tmpdir, monkeypatch):
+    """
+    Test whether offline mode uses local mirrors only and fails fast without
+    them.
+    """
+    monkeypatch.setenv('ANTLERINATOR_OFFLINE', '1')
+    jar_dir = os.path.join(str(tmpdir), 'jars')
+    os.makedirs(jar_dir)
+    with open(os.path.join(jar_dir, 'antlr-4.0-fake-complete.jar'), 'wb') as f:
+        f.write(fake_jar('4.0-fake'))
+
+    with pytest.raises(OSError):
+        antlerinator.download('4.0-fake', os.path.join(str(tmpdir), 'antlr1.jar'))
+
+    antlerinator.download('4.0-fake', os.path.join(str(tmpdir), 'antlr2.jar'), mirrors=[jar_server.url, jar_dir])
+    assert not jar_server.requests
+
+
+def test_download_all(jar_server, tmpdir, monkeypatch):
+    """
+    Test whether multiple versions are downloaded concurrently (via both the
+    API and the CLI).
+    """
+    monkeypatch.setenv('HOME', str(tmpdir))
+    monkeypatch.setenv('USERPROFILE', str(tmpdir))
+    jar_server.delay = 0.5
+    versions = ['4.1-fake', '4.2-fake', '4.3-fake', '4.1-fake']
+
+    start = time.monotonic()
+    paths = antlerinator.download_all(versions)
+    assert time.monotonic() - start < 1.5
+
+    assert paths == [antlerinator.default_antlr_jar_path(v) for v in versions]
+    for version, path in zip(versions, paths):
+        with open(path, 'rb') as f:
+            assert f.read() == fake_jar(version)
+    assert len(jar_server.requests) == 3
+
+    run_download(args=('--antlr-version', '4.1-fake', '4.4-fake', '--lazy'), exp_ok=True)
+    assert jar_server.requests[3:] == ['/antlr-4.4-fake-complete.jar']
+
+
+def test_resolve_antlr_jar(jar_server, tmpdir, monkeypatch):
+    """
+    Test whether ``resolve_antlr_jar`` remembers resolved paths (until
+    invalidated), honors ``ANTLERINATOR_JAR``, and validates jar versions.
+    """
+    monkeypatch.setenv('HOME', str(tmpdir))
+    monkeypatch.setenv('USERPROFILE', str(tmpdir))
+    monkeypatch.delenv('ANTLERINATOR_JAR', raising=False)
+    antlerinator.invalidate_resolved_antlr_jars()
+
+    path = antlerinator.resolve_antlr_jar('4.1-fake', validate=True)
+    assert path == antlerinator.default_antlr_jar_path('4.1-fake')
+    assert antlerinator.resolve_antlr_jar('4.1-fake') == path
+    assert len(jar_server.requests) == 1
+
+    # a remembered jar that has disappeared is resolved again
+    os.remove(path)
+    assert antlerinator.resolve_antlr_jar('4.1-fake') == path
+    assert len(jar_server.requests) == 2
+
+    # a remembered path is trusted until invalidated
+    monkeypatch.setenv('HOME', str(tmpdir.join('other')))
+    monkeypatch.setenv('USERPROFILE', str(tmpdir.join('other')))
+    assert antlerinator.resolve_antlr_jar('4.1-fake') == path
+    antlerinator.invalidate_resolved_antlr_jars()
+    assert antlerinator.resolve_antlr_jar('4.1-fake') == antlerinator.default_antlr_jar_path('4.1-fake') != path
+
+    jar_path = os.path.join(str(tmpdir), 'antlr.jar')
+    with open(jar_path, 'wb') as f:
+        f.write(fake_jar('4.2-fake'))
+    monkeypatch.setenv('ANTLERINATOR_JAR', jar_path)
+    assert antlerinator.resolve_antlr_jar('4.1-fake') == jar_path
+    assert antlerinator.resolve_antlr_jar('4.2-fake', validate=True) == jar_path
+    with pytest.raises(ValueError):
+        antlerinator.resolve_antlr_jar('4.1-fake', validate=True)
+    assert len(jar_server.requests) == 3
+    antlerinator.invalidate_resolved_antlr_jars()
+
+
+def test_download_async(jar_server, tmpdir):
+    """
+    Test whether ``download_async`` does not block the event loop.
+    """
+    jar_server.delay = 0.5
+    ticks = []
+
+    async def tick():
+        while True:
+            ticks.append(time.monotonic())
+            await asyncio.sleep(0.05)
+
+    async def main():
+        ticker = asyncio.ensure_future(tick())
+        paths = await asyncio.gather(*(antlerinator.download_async('4.0-fake', os.path.join(str(tmpdir), 'antlr.jar'), lazy=True)
+                                       for _ in range(2)))
+        ticker.cancel()
+        return paths
+
+    paths = asyncio.run(main())
+    assert paths == [os.path.join(str(tmpdir), 'antlr.jar')] * 2
+    assert len(jar_server.requests) == 1
+    assert len(ticks) >= 5
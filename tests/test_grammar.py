@@ -0,0 +1,94 @@
+# Copyright (c) 2025 Renata Hodovan, Akos Kiss.
+#
+# Licensed under the BSD 3-Clause License
+# <LICENSE.rst or https://opensource.org/licenses/BSD-3-Clause>.
+# This file may not be copied, modified, or distributed except
+# according to those terms.
+
+from os import makedirs
+from os.path import dirname, join
+
+import pytest
+
+from antlerinator.grammar import GrammarGraph, _scan_header, _tokens, scan_grammar
+
+
+def write_grammar(path, src):
+    makedirs(dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(src)
+
+
+@pytest.mark.parametrize('src, expected', [
+    ('grammar A;\na: \'a\';\n', ('combined', 'A', [], None)),
+    ('/** grammar X; */\n// lexer grammar Y;\nlexer grammar ALexer;\nA: \'a\';\n', ('lexer', 'ALexer', [], None)),
+    ('parser grammar AParser;\noptions { superClass = \'x.Base\'; tokenVocab = ALexer; }\na: A;\n', ('parser', 'AParser', [], 'ALexer')),
+    ('grammar A;\nimport B, L = C;\ntokens { T }\na: \'a\';\nimport D;\n', ('combined', 'A', ['B', 'C'], None)),
+    # imports and options in actions and rules are not part of the header
+    ('grammar A;\n@header { import java.util.*; String s = "}"; }\n@parser::members { char c = \'{\'; }\n'
+     'a: \'import\' b;\nb options { tokenVocab = X; }: \'b\';\n', ('combined', 'A', [], None)),
+    ('grammar A\na: \'a\';\n', None),
+    ('a: \'a\';\n', None),
+])
+def test_scan_grammar(tmpdir, src, expected):
+    """
+    Test whether ``scan_grammar`` extracts the information from the header of
+    grammars only.
+    """
+    path = join(str(tmpdir), 'A.g4')
+    write_grammar(path, src)
+    info = scan_grammar(path)
+    if expected is None:
+        assert info is None
+    else:
+        assert (info.type, info.name, info.imports, info.token_vocab) == expected
+
+
+def test_scan_grammar_header_only(tmpdir):
+    """
+    Test whether scanning stops reading at the first rule of a grammar.
+    """
+    path = join(str(tmpdir), 'A.g4')
+    with open(path, 'w') as f:
+        f.write('grammar A;\noptions { tokenVocab = L; }\na: \'a\';\n')
+        f.write('b: \'b\';\n' * 1_000_000)
+
+    with open(path, 'r') as f:
+        info = _scan_header(path, _tokens(f))
+        assert info.token_vocab == 'L'
+        assert f.tell() <= 64 * 1024
+
+
+def test_grammar_graph(tmpdir):
+    """
+    Test whether ``GrammarGraph`` resolves imports (in the directory of the
+    importing grammar and in the library directory) and ``tokenVocab``
+    options, and whether it computes dependents and topological orders.
+    """
+    with tmpdir.as_cwd():
+        write_grammar('PParser.g4', 'parser grammar PParser;\noptions { tokenVocab = LLexer; }\nimport Common;\np: A;\n')
+        write_grammar(join('lib', 'Common.g4'), 'parser grammar Common;\nc: A;\n')
+        write_grammar('LLexer.g4', 'lexer grammar LLexer;\nimport Chars;\nA: \'a\';\n')
+        write_grammar('Chars.g4', 'lexer grammar Chars;\nC: \'c\';\n')
+        write_grammar('U.g4', 'grammar U;\nu: \'u\';\n')
+
+        graph = GrammarGraph()
+        for g in ('PParser.g4', 'U.g4', 'LLexer.g4'):
+            graph.add(g, 'lib')
+
+        p, common, lexer, chars, u = (str(tmpdir.join(path)) for path in ('PParser.g4', join('lib', 'Common.g4'), 'LLexer.g4', 'Chars.g4', 'U.g4'))
+        assert len(graph) == 5
+        assert graph.info('PParser.g4').token_vocab == 'LLexer'
+        assert graph.dependencies(p) == [common, lexer]
+        assert graph.dependencies(lexer) == [chars]
+        assert graph.imports(['PParser.g4', 'LLexer.g4']) == [common, chars]
+        assert not graph.imports([u])
+
+        assert graph.dependents([chars]) == {chars, lexer, p}
+        assert graph.dependents([common]) == {common, p}
+        assert graph.dependents([u]) == {u}
+
+        order = graph.topological_order()
+        assert sorted(order) == sorted([p, common, lexer, chars, u])
+        for g in graph:
+            assert all(order.index(dep) < order.index(g) for dep in graph.dependencies(g))
@@ -0,0 +1,66 @@
+# Copyright (c) 2025 Renata Hodovan, Akos Kiss.
+#
+# Licensed under the BSD 3-Clause License
+# <LICENSE.rst or https://opensource.org/licenses/BSD-3-Clause>.
+# This file may not be copied, modified, or distributed except
+# according to those terms.
+
+import json
+import os
+import platform
+import subprocess
+import sys
+
+import pytest
+
+
+# modules that importing antlerinator (or loading its setuptools extension)
+# must not pull in
+expensive_modules = [
+    'argparse',
+    'concurrent.futures',
+    'http.client',
+    'importlib.metadata',
+    'inators',
+    'ssl',
+    'urllib.request',
+    'zipfile',
+]
+
+# import time budget of antlerinator in microseconds
+import_budget = int(os.environ.get('ANTLERINATOR_IMPORT_BUDGET_US', '50000'))
+
+
+def new_modules(setup, stmt):
+    """
+    Get the modules imported by ``stmt`` in a fresh interpreter (after running
+    ``setup``).
+    """
+    code = f'import sys, json; {setup}; base = set(sys.modules); {stmt}; print(json.dumps(sorted(set(sys.modules) - base)))'
+    return set(json.loads(subprocess.run([sys.executable, '-c', code], check=True, stdout=subprocess.PIPE).stdout))
+
+
+@pytest.mark.parametrize('setup, stmt', [
+    ('pass', 'import antlerinator'),
+    ('import setuptools', 'import antlerinator.build_antlr'),
+])
+def test_import_modules(setup, stmt):
+    """
+    Test whether importing antlerinator avoids expensive modules.
+    """
+    assert not new_modules(setup, stmt) & set(expensive_modules)
+
+
+@pytest.mark.skipif(platform.python_implementation() != 'CPython', reason='import time is measured on CPython only')
+def test_import_time():
+    """
+    Test whether importing antlerinator stays within its time budget (as
+    measured by ``python -X importtime``).
+    """
+    # warm up bytecode caches
+    subprocess.run([sys.executable, '-c', 'import antlerinator'], check=True)
+
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import antlerinator'],
+                            check=True, stderr=subprocess.PIPE, universal_newlines=True).stderr
+    cumulative = [int(line.split('|')[1]) for line in stderr.splitlines() if line.split('|')[-1].strip() == 'antlerinator']
+    assert cumulative and cumulative[0] <= import_budget
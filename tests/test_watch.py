@@ -0,0 +1,69 @@
+# Copyright (c) 2025 Renata Hodovan, Akos Kiss.
+#
+# Licensed under the BSD 3-Clause License
+# <LICENSE.rst or https://opensource.org/licenses/BSD-3-Clause>.
+# This file may not be copied, modified, or distributed except
+# according to those terms.
+
+import os
+import threading
+import time
+
+from os.path import join
+
+import pytest
+
+from antlerinator.watch import Watcher
+
+
+@pytest.mark.parametrize('polling', [False, True])
+def test_watcher(tmpdir, polling):
+    """
+    Test whether ``Watcher`` reports a burst of changes (including the
+    replacement of a file by renaming) as a single notification.
+    """
+    a, b, c = (join(str(tmpdir), name) for name in ('A.g4', 'B.g4', 'C.g4'))
+    with open(a, 'w') as f:
+        f.write('grammar A;\n')
+
+    def edit():
+        time.sleep(0.1)
+        with open(a, 'w') as f:
+            f.write('grammar A;\na: \'a\';\n')
+        time.sleep(0.1)
+        with open(b + '.tmp', 'w') as f:
+            f.write('grammar B;\n')
+        os.replace(b + '.tmp', b)
+
+    with Watcher([a, b, c], poll_interval=0.05, polling=polling) as watcher:
+        assert watcher.wait(timeout=0.2) == set()
+
+        thread = threading.Thread(target=edit)
+        thread.start()
+        changed = watcher.wait(debounce=0.5, timeout=10)
+        thread.join()
+
+    assert changed == {os.path.normcase(a), os.path.normcase(b)}
+
+
+@pytest.mark.parametrize('polling', [False, True])
+def test_watcher_missing_dir(tmpdir, polling):
+    """
+    Test whether ``Watcher`` reports the creation of a file in a directory that
+    did not exist when the watching started.
+    """
+    a = join(str(tmpdir), 'grammars', 'A.g4')
+
+    def create():
+        time.sleep(0.1)
+        os.makedirs(os.path.dirname(a))
+        with open(a, 'w') as f:
+            f.write('grammar A;\n')
+
+    with Watcher([a], poll_interval=0.05, polling=polling) as watcher:
+        thread = threading.Thread(target=create)
+        thread.start()
+        changed = watcher.wait(debounce=0.2, timeout=10)
+        thread.join()
+
+    assert changed == {os.path.normcase(a)}